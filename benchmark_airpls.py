@@ -0,0 +1,146 @@
+# Banco de pruebas de airPLS: compara el motor en bandas con el original
+# (spsolve disperso) en espectros sintéticos de UV-Vis.
+# Uso: python benchmark_airpls.py [--sizes 1000 10000 100000] [--repeat 3] [--stack 500]
+# Con --stack compara también airPLS en lote y el arranque en caliente, y con
+# --multires 200000 500000 mide airPLS de gruesa a fina frente al exacto.
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from src.data_loader import default_workers
+from src.data_processor import _airpls_stack
+from src.pybaselines_local import (airpls, airpls_batch, airpls_multires, airpls_sparse, penalty_bands,
+                                   _difference_matrix, _whittaker_smooth, _whittaker_smooth_banded)
+
+
+def synthetic_baseline(n_points):
+    """La línea base real de synthetic_spectrum, para medir el error de cada método."""
+    x = np.linspace(200, 900, n_points)
+    return 0.2 + 0.3 * np.exp(-(x - 200) / 250) + 1e-4 * (x - 550)
+
+
+def synthetic_spectrum(n_points, seed=0):
+    """Bandas gaussianas sobre una línea base curva con ruido, entre 200 y 900 nm."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(200, 900, n_points)
+    baseline = synthetic_baseline(n_points)
+    peaks = sum(h * np.exp(-0.5 * ((x - c) / s) ** 2)
+                for c, s, h in ((280, 12, 0.8), (420, 25, 0.5), (615, 40, 0.35)))
+    return baseline + peaks + rng.normal(0, 0.005, n_points)
+
+
+def best_time(func, data, repeat, **params):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(data, **params)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara los motores de airPLS.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--lam', type=float, default=1e7)
+    parser.add_argument('--p', type=float, default=0.01)
+    parser.add_argument('--stack', type=int, default=0,
+                        help="Si es mayor que 0, compara también airPLS en lote sobre tantos espectros de 1000 puntos.")
+    parser.add_argument('-j', '--workers', type=int, default=default_workers())
+    parser.add_argument('--multires', type=int, nargs='*', metavar='PUNTOS',
+                        help="Compara airPLS multirresolución con el exacto en espectros de esos tamaños.")
+    parser.add_argument('--factor', type=int, default=0, help="Factor de decimación de --multires (0 = automático).")
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    # Las diferencias se dan relativas al rango de la señal:
+    #  - "resolución": un paso de Whittaker con pesos uniformes en los dos motores
+    #    (la exactitud del motor en sí);
+    #  - "5 iter.": airPLS cortado a 5 iteraciones;
+    #  - "final" y "original ±1e-13": la reponderación exp(i·r/Σ|r-|) amplifica
+    #    el redondeo en las últimas iteraciones, así que el resultado final del
+    #    motor original ya cambia si se perturba la señal en 1e-13. El motor en
+    #    bandas no puede parecerse al original más que el original a sí mismo.
+    print(f"{'puntos':>8} {'disperso (s)':>13} {'bandas (s)':>11} {'aceleración':>12} "
+          f"{'resolución':>11} {'5 iter.':>9} {'final':>9} {'original ±1e-13':>16}")
+    for n_points in args.sizes:
+        data = synthetic_spectrum(n_points)
+        scale = np.ptp(data)
+        params = {'lam': args.lam, 'p': args.p}
+
+        t_sparse, (baseline_sparse, _) = best_time(airpls_sparse, data, args.repeat, **params)
+        t_banded, (baseline_banded, _) = best_time(airpls, data, args.repeat, **params)
+
+        w = np.ones(n_points)
+        solve_diff = np.max(np.abs(_whittaker_smooth(data, args.lam, _difference_matrix(n_points), w)
+                                   - _whittaker_smooth_banded(data, penalty_bands(n_points, args.lam), w))) / scale
+        short_diff = np.max(np.abs(airpls(data, max_iter=5, **params)[0] - airpls_sparse(data, max_iter=5, **params)[0])) / scale
+        final_diff = np.max(np.abs(baseline_banded - baseline_sparse)) / scale
+        self_diff = np.max(np.abs(airpls_sparse(data * (1 + 1e-13), **params)[0] - baseline_sparse)) / scale
+
+        print(f"{n_points:>8} {t_sparse:>13.4f} {t_banded:>11.4f} {t_sparse / t_banded:>11.1f}x "
+              f"{solve_diff:>11.1e} {short_diff:>9.1e} {final_diff:>9.1e} {self_diff:>16.1e}")
+
+    if args.stack > 0:
+        stack = np.array([synthetic_spectrum(1000, seed=s) for s in range(args.stack)])
+        params = {'lam': args.lam, 'p': args.p}
+        start = time.perf_counter()
+        reference = np.array([airpls(row, **params)[0] for row in stack])
+        t_loop = time.perf_counter() - start
+        start = time.perf_counter()
+        batch, info = airpls_batch(stack, **params)
+        t_batch = time.perf_counter() - start
+        start = time.perf_counter()
+        parallel = _airpls_stack(stack, params, args.workers)[0]
+        t_parallel = time.perf_counter() - start
+        same = np.array_equal(reference, batch) and np.array_equal(reference, parallel)
+        print(f"\nPila de {args.stack} espectros x 1000 puntos (iteraciones: media {info['iterations'].mean():.1f}, "
+              f"máx. {info['iterations'].max()}):")
+        print(f"  uno a uno: {t_loop:.3f} s | en lote: {t_batch:.3f} s | "
+              f"en lote con {args.workers} procesos: {t_parallel:.3f} s | resultados idénticos: {'sí' if same else 'no'}")
+
+        # Arranque en caliente: se retoca lam como haría el usuario y se compara
+        # partir de pesos uniformes con partir de los pesos convergidos de antes.
+        print(f"\nArranque en caliente desde lam={args.lam:g} (iteraciones medias, mismo tol):")
+        for factor in (1.2, 2.0, 0.5):
+            retuned = {'lam': args.lam * factor, 'p': args.p}
+            start = time.perf_counter()
+            _, cold = airpls_batch(stack, **retuned)
+            t_cold = time.perf_counter() - start
+            start = time.perf_counter()
+            _, warm = airpls_batch(stack, weights=info['weights'], **retuned)
+            t_warm = time.perf_counter() - start
+            print(f"  lam={retuned['lam']:g}: en frío {cold['iterations'].mean():.1f} ({t_cold:.3f} s) | "
+                  f"en caliente {warm['iterations'].mean():.1f} ({t_warm:.3f} s)")
+
+    if args.multires:
+        multires_report(args.multires, args.lam, args.p, args.factor, args.repeat)
+
+
+def multires_report(sizes, lam, p, factor, repeat):
+    """
+    Exactitud frente a velocidad de airPLS multirresolución. Como el propio
+    airPLS exacto es sensible al redondeo, además de la diferencia entre ambos
+    se da el error de cada uno frente a la línea base real del espectro sintético.
+    Todo relativo al rango de la señal.
+    """
+    print(f"\nMultirresolución frente a airPLS exacto (lam={lam:g}, p={p:g}, factor={factor or 'auto'}):")
+    print(f"{'puntos':>8} {'exacto (s)':>11} {'multirres. (s)':>15} {'aceleración':>12} "
+          f"{'dif. exacto':>12} {'error exacto':>13} {'error multirres.':>17}")
+    for n_points in sizes:
+        data = synthetic_spectrum(n_points)
+        true_baseline = synthetic_baseline(n_points)
+        scale = np.ptp(data)
+        t_exact, (exact, _) = best_time(airpls, data, repeat, lam=lam, p=p)
+        t_multi, (multi, _) = best_time(airpls_multires, data, repeat, lam=lam, p=p, factor=factor)
+        print(f"{n_points:>8} {t_exact:>11.3f} {t_multi:>15.3f} {t_exact / t_multi:>11.1f}x "
+              f"{np.max(np.abs(multi - exact)) / scale:>12.1e} "
+              f"{np.max(np.abs(exact - true_baseline)) / scale:>13.1e} "
+              f"{np.max(np.abs(multi - true_baseline)) / scale:>17.1e}")
+
+
+if __name__ == "__main__":
+    main()
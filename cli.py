@@ -0,0 +1,8 @@
+# Entrada headless de Spectra Converter: python cli.py <carpeta> [opciones]
+# Ejecuta `python cli.py --help` para ver todas las opciones.
+
+import sys
+from src.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
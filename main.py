@@ -26,6 +26,7 @@ from PIL import Image, ImageTk
 
 # --- INICIO DEL CÓDIGO DE TUFUP ---
 import os
+import multiprocessing
 import tempfile
 from tufup.client import Client
 from version import __version__
@@ -129,6 +130,9 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Necesario para que el pool de procesos de carga funcione en el .exe congelado.
+    multiprocessing.freeze_support()
+
     # Solo comprobamos si es un .exe para no hacerlo en desarrollo
     if getattr(sys, 'frozen', False):
         try:
@@ -0,0 +1,178 @@
+# spectraconverter_v4/src/archive_loader.py
+
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+
+import numpy as np
+
+from . import data_parser
+from .data_loader import SPECTRUM_EXTENSIONS, default_workers
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Miembros de un .zip que lee cada tarea del pool: suficientes para amortizar
+# la apertura del archivo y pocos para repartir bien el trabajo.
+ZIP_CHUNK_SIZE = 32
+
+
+def is_archive(path):
+    """True si la ruta es un archivo .zip o .tar(.gz/.bz2/.xz) que sabemos leer."""
+    return os.path.isfile(path) and path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _is_spectrum_member(name):
+    """Aplica la regla de extensiones .txt/.asc, ignorando los metadatos de macOS."""
+    basename = name.rsplit('/', 1)[-1]
+    if name.startswith('__MACOSX/') or basename.startswith('._'):
+        return False
+    return basename.lower().endswith(SPECTRUM_EXTENSIONS)
+
+
+def count_members(archive_path):
+    """
+    Número de espectros del archivo si se puede saber sin descomprimirlo
+    (los .zip tienen un índice central), o None para los .tar.
+    """
+    if not zipfile.is_zipfile(archive_path):
+        return None
+    return len(_list_zip_members(archive_path))
+
+
+def _list_zip_members(archive_path):
+    with zipfile.ZipFile(archive_path) as zf:
+        return [info.filename for info in zf.infolist() if not info.is_dir() and _is_spectrum_member(info.filename)]
+
+
+def _iter_tar_members(archive_path):
+    """Recorre un .tar en modo flujo (una sola pasada) y devuelve (nombre, bytes)."""
+    with tarfile.open(archive_path, 'r|*') as tf:
+        for member in tf:
+            if member.isfile() and _is_spectrum_member(member.name):
+                yield member.name, tf.extractfile(member).read()
+
+
+def _parse_zip_chunk(archive_path, names, dialect, roi=None, dtype=np.float64):
+    """Tarea del pool: descomprime y parsea un bloque de miembros de un .zip."""
+    results = []
+    with zipfile.ZipFile(archive_path) as zf:
+        for name in names:
+            try:
+                raw_bytes = zf.read(name)
+            except (OSError, zipfile.BadZipFile) as e:
+                print(f"Error al leer {name} del archivo comprimido: {e}")
+                results.append(None)
+                continue
+            results.append(data_parser.parse_spectrum_channels_bytes(raw_bytes, name, dialect=dialect, roi=roi, dtype=dtype))
+    return results
+
+
+def _parse_member(raw_bytes, name, dialect, roi=None, dtype=np.float64):
+    """Tarea del pool: parsea un miembro ya descomprimido."""
+    return data_parser.parse_spectrum_channels_bytes(raw_bytes, name, dialect=dialect, roi=roi, dtype=dtype)
+
+
+def iter_load_archive(archive_path, max_workers=None, cancel_event=None, roi=None, dtype=np.float64):
+    """
+    Parsea los espectros de un .zip o .tar sin extraerlos a disco.
+
+    En los .zip cada proceso abre el archivo y descomprime su propio bloque de
+    miembros, así que descompresión y parseo van en paralelo. Los .tar
+    comprimidos solo se pueden leer de forma secuencial: este hilo los
+    descomprime en flujo mientras el pool parsea los miembros ya leídos.
+
+    Yields:
+        tuple: (índice en el orden del archivo, nombre del miembro, resultado), con el
+               mismo resultado que data_loader.iter_load_files.
+    """
+    if max_workers is None:
+        max_workers = default_workers()
+
+    if zipfile.is_zipfile(archive_path):
+        yield from _iter_load_zip(archive_path, max_workers, cancel_event, roi, dtype)
+    else:
+        yield from _iter_load_tar(archive_path, max_workers, cancel_event, roi, dtype)
+
+
+def _iter_load_zip(archive_path, max_workers, cancel_event, roi=None, dtype=np.float64):
+    names = _list_zip_members(archive_path)
+    if not names:
+        return
+
+    with zipfile.ZipFile(archive_path) as zf:
+        dialect = data_parser.sniff_dialect_bytes(zf.read(names[0]))
+
+    if max_workers <= 1 or len(names) <= ZIP_CHUNK_SIZE:
+        for offset in range(0, len(names), ZIP_CHUNK_SIZE):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            chunk = names[offset:offset + ZIP_CHUNK_SIZE]
+            for i, parsed in enumerate(_parse_zip_chunk(archive_path, chunk, dialect, roi, dtype)):
+                yield offset + i, chunk[i], parsed
+        return
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(_parse_zip_chunk, archive_path, names[offset:offset + ZIP_CHUNK_SIZE], dialect, roi, dtype): offset
+            for offset in range(0, len(names), ZIP_CHUNK_SIZE)
+        }
+        for future in as_completed(futures):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            offset = futures[future]
+            chunk = names[offset:offset + ZIP_CHUNK_SIZE]
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"Error al parsear un bloque de {os.path.basename(archive_path)} en segundo plano: {e}")
+                results = [None] * len(chunk)
+            for i, parsed in enumerate(results):
+                yield offset + i, chunk[i], parsed
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_load_tar(archive_path, max_workers, cancel_event, roi=None, dtype=np.float64):
+    dialect = None
+
+    if max_workers <= 1:
+        for index, (name, raw_bytes) in enumerate(_iter_tar_members(archive_path)):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if index == 0:
+                dialect = data_parser.sniff_dialect_bytes(raw_bytes)
+            yield index, name, _parse_member(raw_bytes, name, dialect, roi, dtype)
+        return
+
+    def collect(future):
+        index, name = pending.pop(future)
+        try:
+            return index, name, future.result()
+        except Exception as e:
+            print(f"Error al parsear {name} en segundo plano: {e}")
+            return index, name, None
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    pending = {}
+    try:
+        for index, (name, raw_bytes) in enumerate(_iter_tar_members(archive_path)):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if index == 0:
+                dialect = data_parser.sniff_dialect_bytes(raw_bytes)
+            pending[executor.submit(_parse_member, raw_bytes, name, dialect, roi, dtype)] = (index, name)
+
+            # Limitamos los miembros en vuelo para no acumular el archivo entero en memoria.
+            if len(pending) >= max_workers * 4:
+                wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in [f for f in pending if f.done()]:
+                yield collect(future)
+
+        for future in as_completed(list(pending)):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            yield collect(future)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
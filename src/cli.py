@@ -0,0 +1,223 @@
+# spectraconverter_v4/src/cli.py
+#
+# Punto de entrada por línea de comandos. No importa tkinter ni ningún backend
+# gráfico, así que puede ejecutarse en servidores sin pantalla (cron, ssh...).
+
+import argparse
+import os
+import sys
+
+from . import archive_loader
+from . import data_loader
+from . import data_processor
+from . import data_exporter
+from . import figure_export
+from . import parameter_sweep
+from . import precision
+from . import resampling
+from .parse_cache import ParseCache
+from .roi import normalize_roi, format_crop_stats
+from .spectra_collection import SpectraCollection
+
+EXPORT_FORMATS = ('excel', 'scidavis')
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog='spectraconverter',
+        description="Convierte y procesa una carpeta de espectros (.txt/.asc) sin interfaz gráfica."
+    )
+    parser.add_argument('input_folder', help="Carpeta con los archivos de espectro, o un .zip/.tar(.gz) que los contenga.")
+    parser.add_argument('-o', '--output', help="Ruta base de los archivos de salida "
+                        "(por defecto <carpeta>/Resultados_Espectros).")
+    parser.add_argument('-f', '--format', dest='formats', action='append', choices=EXPORT_FORMATS,
+                        help="Formato de salida; se puede repetir. Por defecto, todos.")
+    parser.add_argument('-j', '--workers', type=int, default=data_loader.default_workers(),
+                        help="Número de procesos para parsear (por defecto: %(default)s).")
+    parser.add_argument('--no-cache', action='store_true', help="No usar la caché de parseo.")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Solo muestra errores.")
+    parser.add_argument('--roi', nargs=2, type=float, metavar=('MIN', 'MAX'),
+                        help="Región de interés en nm: solo se cargan, procesan y exportan esos puntos.")
+    parser.add_argument('--precision', choices=tuple(precision.STORAGE_DTYPES), default='float64',
+                        help="Precisión con la que se guardan los espectros en memoria y en la caché; "
+                             "float32 ocupa la mitad (por defecto: %(default)s).")
+    parser.add_argument('--resample', choices=resampling.GRID_MODES,
+                        help="Remuestrea todos los espectros a un eje común antes de procesar: la unión "
+                             "de los rangos o solo el tramo que cubren todos (intersection).")
+    parser.add_argument('--resample-step', type=float, metavar='NM',
+                        help="Con --resample, eje regular con este paso en nm en lugar de los puntos originales.")
+
+    processing = parser.add_argument_group("procesamiento")
+    processing.add_argument('--normalize', action='store_true', help="Normaliza al máximo (0 a 1).")
+    processing.add_argument('--method', choices=('min', 'airpls', 'airpls_multires', 'moving_average', 'savgol'),
+                            help="Corrección de línea base o suavizado.")
+    processing.add_argument('--lam', type=float, default=1e7, help="airPLS: suavidad λ (por defecto: %(default)g).")
+    processing.add_argument('--p', type=float, default=0.01, help="airPLS: asimetría p (por defecto: %(default)g).")
+    processing.add_argument('--window', type=int, help="Ventana del promedio móvil (5) o de Savitzky-Golay (11).")
+    processing.add_argument('--order', type=int, default=2, help="Savitzky-Golay: orden del polinomio (por defecto: %(default)s).")
+    processing.add_argument('--step', dest='steps', action='append', metavar='PASO[:param=valor,...]',
+                            help="Añade un paso a la cadena, en orden; se puede repetir. Pasos: "
+                                 f"{', '.join(data_processor.PIPELINE_STEPS)}. "
+                                 "Ej.: --step airpls:lam=1e5 --step savgol:window=21 --step normalize. "
+                                 "No se combina con --normalize/--method.")
+
+    sweep = parser.add_argument_group("barrido de parámetros de airPLS")
+    sweep.add_argument('--sweep-lam', type=float, nargs='+', metavar='LAM',
+                       help="Prueba airPLS con estos valores de λ sobre todos los espectros, muestra los "
+                            "mejores y termina sin exportar.")
+
+    images = parser.add_argument_group("imágenes para informes")
+    images.add_argument('--images', metavar='CARPETA',
+                        help="Guarda además una imagen de cada espectro en CARPETA (procesado si se procesa).")
+    images.add_argument('--image-format', choices=figure_export.IMAGE_FORMATS, default='png',
+                        help="Formato de las imágenes (por defecto: %(default)s).")
+    images.add_argument('--image-dpi', type=int, default=figure_export.FIGURE_DPI,
+                        help="Resolución de los PNG (por defecto: %(default)s).")
+    images.add_argument('--image-groups', nargs='?', const='', metavar='PATRÓN',
+                        help="Añade una imagen por grupo con sus espectros superpuestos. Sin PATRÓN, se "
+                             "agrupan los canales de cada archivo; con él, los nombres que comparten lo que "
+                             "encaja con la expresión regular (o su primer grupo de captura).")
+    return parser
+
+
+def processing_steps_from_args(args):
+    """
+    Traduce los argumentos a la misma cadena de procesamiento que construye la interfaz.
+
+    Raises:
+        ValueError: Si algún paso o parámetro no es válido.
+    """
+    if args.steps:
+        if args.normalize or args.method:
+            raise ValueError("--step no se puede combinar con --normalize ni --method.")
+        return data_processor.ProcessingPipeline.from_spec(args.steps)
+
+    processing_steps = {}
+    if args.normalize:
+        processing_steps['normalize'] = True
+    if args.method:
+        processing_steps['method'] = args.method
+        if args.method in ('airpls', 'airpls_multires'):
+            processing_steps['params'] = {'lam': args.lam, 'p': args.p}
+        elif args.method == 'moving_average':
+            processing_steps['params'] = {'window': args.window or 5}
+        elif args.method == 'savgol':
+            processing_steps['params'] = {'window': args.window or 11, 'order': args.order}
+    return data_processor.ProcessingPipeline.from_processing_steps(processing_steps)
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+
+    def info(message):
+        if not args.quiet:
+            print(message)
+
+    is_archive = archive_loader.is_archive(args.input_folder)
+    if not is_archive and not os.path.isdir(args.input_folder):
+        parser.error(f"'{args.input_folder}' no es una carpeta ni un archivo comprimido válido.")
+    if args.workers < 1:
+        parser.error("--workers debe ser al menos 1.")
+
+    try:
+        roi = normalize_roi(args.roi)
+    except ValueError as e:
+        parser.error(str(e))
+    dtype = precision.storage_dtype(args.precision)
+    if args.resample_step is not None and not args.resample:
+        parser.error("--resample-step requiere --resample.")
+    try:
+        pipeline = processing_steps_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.image_groups is not None:
+        if not args.images:
+            parser.error("--image-groups requiere --images.")
+        try:
+            figure_export.group_indices([], pattern=args.image_groups or None)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.image_dpi < 1:
+        parser.error("--image-dpi debe ser al menos 1.")
+
+    if is_archive:
+        info(f"Parseando {os.path.basename(args.input_folder)} con {args.workers} procesos...")
+        results = sorted(archive_loader.iter_load_archive(args.input_folder, args.workers, roi=roi, dtype=dtype), key=lambda r: r[0])
+        loaded = [(name, parsed) for _, name, parsed in results if parsed is not None]
+        failed = [name for _, name, parsed in results if parsed is None]
+    else:
+        file_paths = data_loader.list_spectrum_files(args.input_folder)
+        if not file_paths:
+            print("Aviso: No se encontraron archivos .txt o .asc.", file=sys.stderr)
+            return 1
+
+        info(f"Parseando {len(file_paths)} archivos con {args.workers} procesos...")
+        cache = ParseCache(enabled=not args.no_cache, dtype=dtype)
+        loaded, failed = data_loader.load_files(file_paths, args.workers, cache=cache, roi=roi, dtype=dtype)
+        loaded = [(os.path.basename(file_path), parsed) for file_path, parsed in loaded]
+    if failed:
+        print(f"Aviso: No se pudieron cargar {len(failed)} archivos: "
+              f"{', '.join(os.path.basename(p) for p in failed)}", file=sys.stderr)
+    if not loaded:
+        print("Error: No se pudo extraer ningún espectro válido.", file=sys.stderr)
+        return 1
+
+    spectra = SpectraCollection(dtype)
+    for name, parsed in loaded:
+        # Cada canal de un archivo multicanal se registra como un espectro propio.
+        spectra.add_channels(name, *parsed)
+    info(f"Se cargaron {len(spectra)} espectros de {len(loaded)} archivos.")
+    if spectra.rows_dropped:
+        info(format_crop_stats(spectra.rows_dropped, spectra.bytes_saved))
+    if args.resample:
+        try:
+            spectra = resampling.align_collection(spectra, args.resample, args.resample_step, roi)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        info(f"Remuestreados a un eje común de {len(spectra.shared_wavelength)} puntos.")
+    info(precision.memory_report(spectra) + ".")
+
+    if args.sweep_lam:
+        info(f"Barrido de airPLS: {len(args.sweep_lam)} valores de λ sobre {len(spectra)} espectros...")
+        points, _ = parameter_sweep.sweep_airpls(
+            parameter_sweep.collection_sweep_inputs(spectra, range(len(spectra))), args.sweep_lam, roi=roi,
+            max_workers=args.workers)
+        if not points:
+            print("Error: Ningún espectro tiene puntos suficientes para el barrido.", file=sys.stderr)
+            return 1
+        print(parameter_sweep.format_sweep_table(points, 10))
+        print(f"Mejor valor: --lam {points[0].lam:g}")
+        return 0
+
+    if pipeline:
+        info(f"Aplicando procesamiento: {pipeline.describe()}...")
+        data_processor.process_collection(spectra, pipeline, roi=roi, max_workers=args.workers)
+
+    default_dir = os.path.dirname(os.path.abspath(args.input_folder)) if is_archive else args.input_folder
+    base_path = args.output or os.path.join(default_dir, 'Resultados_Espectros')
+    base_path = os.path.splitext(base_path)[0]
+    formats = args.formats or EXPORT_FORMATS
+    try:
+        if 'excel' in formats:
+            data_exporter.export_to_excel(spectra, base_path + ".xlsx", roi=roi)
+            info(f"Guardado: {base_path}.xlsx")
+        if 'scidavis' in formats:
+            data_exporter.export_to_scidavis(spectra, base_path + "_SciDAVis.tsv", roi=roi)
+            info(f"Guardado: {base_path}_SciDAVis.tsv")
+        if args.images:
+            groups = None
+            if args.image_groups is not None:
+                groups = figure_export.group_indices(spectra.filenames, pattern=args.image_groups or None)
+            info(f"Dibujando imágenes {args.image_format.upper()} con {args.workers} procesos...")
+            paths = figure_export.render_images(spectra, args.images, args.image_format,
+                                                use_processed=bool(pipeline), roi=roi, groups=groups,
+                                                dpi=args.image_dpi, max_workers=args.workers)
+            info(f"Guardadas {len(paths)} imágenes en {args.images}"
+                 + (f" ({len(groups)} de grupos)." if groups is not None else "."))
+    except Exception as e:
+        print(f"Error durante la exportación: {e}", file=sys.stderr)
+        return 1
+
+    return 0
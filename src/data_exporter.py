@@ -1,54 +1,62 @@
 # spectraconverter_v4/src/data_exporter.py
 
+import numpy as np
 import pandas as pd
 import os
 import re
 from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.chart import ScatterChart, Reference, Series
 from openpyxl.styles import Alignment, Font
 
-def export_to_excel(spectra_data, output_path):
+from .resampling import resample_collection
+from .roi import crop, roi_index
+
+def _write_spectrum_block(ws, col_index, title, wavelength, intensity):
+    """
+    Escribe un espectro en dos columnas a partir de col_index: el título
+    combinado en la fila 1, la cabecera en la fila 2 y los datos desde la fila 3.
+    """
+    ws.merge_cells(start_row=1, start_column=col_index, end_row=1, end_column=col_index + 1)
+    title_cell = ws.cell(row=1, column=col_index, value=title)
+    title_cell.font = Font(bold=True, name='Calibri')
+    title_cell.alignment = Alignment(horizontal='center', vertical='center')
+
+    ws.cell(row=2, column=col_index, value='wavelength')
+    ws.cell(row=2, column=col_index + 1, value='intensity')
+    for row, (x, y) in enumerate(zip(wavelength.tolist(), intensity.tolist()), start=3):
+        ws.cell(row=row, column=col_index, value=x)
+        ws.cell(row=row, column=col_index + 1, value=y)
+
+
+def export_to_excel(spectra, output_path, indices=None, roi=None):
     """
     Exporta los datos crudos y procesados a un archivo Excel con un gráfico.
+
+    Args:
+        spectra (SpectraCollection): Los espectros cargados.
+        output_path (str): Ruta del archivo .xlsx.
+        indices (list): Índices de los espectros a exportar; por defecto, todos.
+        roi (tuple): Región de interés (mínimo, máximo); solo se exportan esos puntos.
     """
+    if indices is None:
+        indices = range(len(spectra))
+
     wb = Workbook()
     
     ws_proc = wb.active
     ws_proc.title = "Datos Procesados"
     
     col_index = 1
-    for spec in spectra_data:
-        df_to_write = spec['processed_dataframe'] if spec['processed_dataframe'] is not None else spec['dataframe']
-        ws_proc.merge_cells(start_row=1, start_column=col_index, end_row=1, end_column=col_index + 1)
-        title_cell = ws_proc.cell(row=1, column=col_index, value=spec['filename'])
-        title_cell.font = Font(bold=True, name='Calibri')
-        title_cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        for r in dataframe_to_rows(df_to_write, index=False, header=True):
-            ws_proc.append(r)
-        
-        last_row = ws_proc.max_row
-        first_row = last_row - len(df_to_write)
-        ws_proc.move_range(f"A{first_row}:{ws_proc.cell(row=last_row, column=2).column_letter}{last_row}", 
-                           rows=-(first_row - 2), cols=col_index - 1)
-
+    for index in indices:
+        _write_spectrum_block(ws_proc, col_index, spectra.filenames[index],
+                              *crop(spectra.wavelength(index), spectra.intensity(index, use_processed=True), roi))
         col_index += 3
 
     ws_raw = wb.create_sheet("Datos Crudos")
     col_index = 1
-    for spec in spectra_data:
-        df_to_write = spec['dataframe']
-        ws_raw.merge_cells(start_row=1, start_column=col_index, end_row=1, end_column=col_index + 1)
-        title_cell = ws_raw.cell(row=1, column=col_index, value=spec['filename'])
-        title_cell.font = Font(bold=True, name='Calibri')
-        title_cell.alignment = Alignment(horizontal='center', vertical='center')
-        for r in dataframe_to_rows(df_to_write, index=False, header=True):
-            ws_raw.append(r)
-        last_row = ws_raw.max_row
-        first_row = last_row - len(df_to_write)
-        ws_raw.move_range(f"A{first_row}:{ws_raw.cell(row=last_row, column=2).column_letter}{last_row}", 
-                           rows=-(first_row - 2), cols=col_index - 1)
+    for index in indices:
+        _write_spectrum_block(ws_raw, col_index, spectra.filenames[index],
+                              *crop(spectra.wavelength(index), spectra.raw(index), roi))
         col_index += 3
 
     chart = ScatterChart()
@@ -57,7 +65,7 @@ def export_to_excel(spectra_data, output_path):
     chart.y_axis.title = "Intensidad / Absorbancia"
     chart.legend.position = 'b'
 
-    for i, spec in enumerate(spectra_data):
+    for i in range(len(indices)):
         col = i * 3 + 1
         x_ref = Reference(ws_proc, min_col=col, min_row=3, max_row=ws_proc.max_row)
         y_ref = Reference(ws_proc, min_col=col + 1, min_row=2, max_row=ws_proc.max_row)
@@ -70,31 +78,50 @@ def export_to_excel(spectra_data, output_path):
     wb.save(output_path)
 
 
-def export_to_scidavis(spectra_data, output_path):
+def export_to_scidavis(spectra, output_path, indices=None, roi=None):
     """
     Exporta los datos procesados a un archivo .tsv (tab-separated) para SciDAVis/Origin.
+
+    Args:
+        spectra (SpectraCollection): Los espectros cargados.
+        output_path (str): Ruta del archivo .tsv.
+        indices (list): Índices de los espectros a exportar; por defecto, todos.
+        roi (tuple): Región de interés (mínimo, máximo); solo se exportan esos puntos.
     """
-    if not spectra_data:
+    if indices is None:
+        indices = list(range(len(spectra)))
+    if not len(indices):
         return
 
     def sanitize_header(fname):
         """Limpia un nombre de archivo para que sea una cabecera de columna segura."""
-        name_without_ext = os.path.splitext(fname)[0]
+        # Los canales de un archivo multicanal llevan el sufijo " [canal k]" tras la extensión.
+        match = re.match(r'^(.*) \[canal (\d+)\]$', fname)
+        channel_suffix = ''
+        if match:
+            fname, channel_suffix = match.group(1), f"_canal{match.group(2)}"
+        name_without_ext = os.path.splitext(fname)[0] + channel_suffix
         sanitized_name = re.sub(r'[^a-zA-Z0-9_]', '_', name_without_ext)
         return sanitized_name
 
-    base_spec = spectra_data[0]
-    df_final = base_spec['processed_dataframe'] if base_spec['processed_dataframe'] is not None else base_spec['dataframe']
-    df_final = df_final.rename(columns={'intensity': sanitize_header(base_spec['filename'])})
-
-    for spec in spectra_data[1:]:
-        df_to_merge = spec['processed_dataframe'] if spec['processed_dataframe'] is not None else spec['dataframe']
-        df_to_merge = df_to_merge.rename(columns={'intensity': sanitize_header(spec['filename'])})
-        df_final = pd.merge(df_final, df_to_merge, on='wavelength', how='outer')
-
-    df_final = df_final.sort_values(by='wavelength').reset_index(drop=True)
-    df_final = df_final.interpolate(method='linear', limit_direction='both', axis=0)
-    df_final.fillna(0, inplace=True)
+    if spectra.is_aligned:
+        # Todos comparten eje: no hace falta fusionar ni interpolar, basta con
+        # ordenar el eje una vez y colocar las columnas al lado.
+        order = np.argsort(spectra.shared_wavelength, kind='stable')
+        order = order[roi_index(spectra.shared_wavelength[order], roi)]
+        columns = {'wavelength': spectra.shared_wavelength[order]}
+        for index in indices:
+            columns[sanitize_header(spectra.filenames[index])] = spectra.intensity(index, use_processed=True)[order]
+        df_final = pd.DataFrame(columns)
+    else:
+        # Ejes distintos: todos se interpolan a la unión de sus ejes en una sola
+        # pasada (fuera de su rango, cada espectro se prolonga con su extremo).
+        grid, matrix = resample_collection(spectra, indices, 'union', use_processed=True, roi=roi)
+        columns = {'wavelength': grid}
+        for index, row in zip(indices, matrix):
+            columns[sanitize_header(spectra.filenames[index])] = row
+        df_final = pd.DataFrame(columns)
+        df_final.fillna(0, inplace=True)
     
     # Exportamos con coma decimal, que es lo más compatible para importación manual en sistemas en español.
     df_final.to_csv(
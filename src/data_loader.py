@@ -0,0 +1,151 @@
+# spectraconverter_v4/src/data_loader.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from . import data_parser
+from .parse_cache import ParseCache
+
+# Extensiones que se consideran archivos de espectro al recorrer una carpeta.
+SPECTRUM_EXTENSIONS = ('.txt', '.asc')
+
+
+def default_workers():
+    """
+    Número de procesos por defecto: todos los núcleos menos uno, para que
+    la interfaz siga respondiendo mientras se parsea.
+    """
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def list_spectrum_files(folder_path):
+    """
+    Devuelve las rutas completas de los archivos .txt/.asc de una carpeta,
+    ordenadas por nombre para que el orden de carga sea siempre el mismo.
+    """
+    filenames = sorted(f for f in os.listdir(folder_path) if f.lower().endswith(SPECTRUM_EXTENSIONS))
+    return [os.path.join(folder_path, f) for f in filenames]
+
+
+def _load_one(file_path, cache_settings=None, dialect=None, roi=None, dtype=np.float64):
+    """
+    Tarea que se ejecuta en cada proceso del pool: parsea un único archivo
+    (todos sus canales) y, si hay caché, guarda el resultado para la próxima vez.
+    Convertir a la precisión de almacenamiento aquí también reduce lo que se
+    envía de vuelta al proceso principal.
+    """
+    parsed = data_parser.parse_spectrum_channels(file_path, dialect=dialect, roi=roi, dtype=dtype)
+    if cache_settings is not None:
+        ParseCache(**cache_settings).put(file_path, parsed, roi)
+    return parsed
+
+
+def iter_load_files(file_paths, max_workers=None, cancel_event=None, cache=None, detect_dialect=True, roi=None,
+                    dtype=np.float64):
+    """
+    Parsea una lista de archivos en un pool de procesos y va devolviendo los
+    resultados a medida que terminan.
+
+    Args:
+        file_paths (list): Rutas de los archivos a parsear.
+        max_workers (int): Número de procesos. Con 1 se parsea en el propio proceso.
+        cancel_event (threading.Event): Si se activa, se descartan las tareas pendientes.
+        cache (ParseCache): Caché de parseo opcional. Los aciertos se devuelven
+                            directamente y solo los fallos pasan por el pool.
+        detect_dialect (bool): Si es True, el formato se detecta una sola vez con el
+                               primer archivo pendiente y se reutiliza en todos.
+        roi (tuple): Región de interés (mínimo, máximo) que se aplica al parsear.
+        dtype: Precisión de almacenamiento de los resultados (float64 o float32).
+
+    Yields:
+        tuple: (índice en file_paths, ruta, resultado). El resultado es la tupla
+               (wavelength, intensities, rows_dropped) de data_parser.parse_spectrum_channels,
+               o None si el parseo falló. El orden es el de finalización; el
+               índice permite reordenar.
+    """
+    if max_workers is None:
+        max_workers = default_workers()
+    if cache is not None and cache.dtype != np.dtype(dtype):
+        # Las entradas de la caché llevan su precisión en la clave: usamos las de esta.
+        cache = ParseCache(**{**cache.settings(), 'dtype': np.dtype(dtype).name})
+    cache_settings = cache.settings() if cache is not None and cache.enabled else None
+
+    # 1. Primero servimos todo lo que ya está en caché: solo cuesta un stat y una lectura pequeña.
+    pending = []
+    for index, file_path in enumerate(file_paths):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        parsed = cache.get(file_path, roi) if cache_settings is not None else None
+        if parsed is not None:
+            yield index, file_path, parsed
+        else:
+            pending.append(index)
+
+    # 2. Detectamos el formato una vez; los archivos que no lo cumplan se leen sin él.
+    dialect = None
+    if detect_dialect and len(pending) > 1:
+        dialect = data_parser.sniff_dialect(file_paths[pending[0]])
+
+    try:
+        # 3. El resto se parsea, en el propio proceso si no compensa crear un pool.
+        if max_workers <= 1 or len(pending) <= 1:
+            for index in pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                yield index, file_paths[index], _load_one(file_paths[index], cache_settings, dialect, roi, dtype)
+            return
+
+        executor = ProcessPoolExecutor(max_workers=min(max_workers, len(pending)))
+        try:
+            futures = {executor.submit(_load_one, file_paths[index], cache_settings, dialect, roi, dtype): index for index in pending}
+            for future in as_completed(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                index = futures[future]
+                try:
+                    parsed = future.result()
+                except Exception as e:
+                    # El parser ya captura sus errores; esto cubre fallos del propio pool.
+                    print(f"Error al parsear {os.path.basename(file_paths[index])} en segundo plano: {e}")
+                    parsed = None
+                yield index, file_paths[index], parsed
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    finally:
+        if cache_settings is not None and pending:
+            cache.enforce_limit()
+
+
+def load_files(file_paths, max_workers=None, progress_callback=None, cancel_event=None, cache=None, roi=None,
+               dtype=np.float64):
+    """
+    Versión bloqueante de iter_load_files que devuelve los resultados en el
+    mismo orden que file_paths.
+
+    Args:
+        progress_callback (callable): Se llama como progress_callback(completados, total)
+                                      cada vez que termina un archivo.
+
+    Returns:
+        tuple: (lista de (ruta, (wavelength, intensities, rows_dropped)) válidos en orden,
+                lista de rutas que fallaron).
+    """
+    results = [None] * len(file_paths)
+    finished = [False] * len(file_paths)
+    completed = 0
+    for index, file_path, parsed in iter_load_files(file_paths, max_workers, cancel_event, cache, roi=roi, dtype=dtype):
+        results[index] = parsed
+        finished[index] = True
+        completed += 1
+        if progress_callback:
+            progress_callback(completed, len(file_paths))
+
+    loaded, failed = [], []
+    for file_path, parsed, done in zip(file_paths, results, finished):
+        if parsed is not None:
+            loaded.append((file_path, parsed))
+        elif done:
+            failed.append(file_path)
+    return loaded, failed
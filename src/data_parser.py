@@ -1,96 +1,398 @@
 # spectraconverter_v4/src/data_parser.py
 
+import numpy as np
 import pandas as pd
+import csv
+import io
 import os
+from collections import namedtuple
 
-def _find_data_start(file_path):
+from .precision import storage_axis
+
+# Número de líneas de datos que se examinan para deducir el formato de una carpeta.
+SNIFF_SAMPLE_LINES = 20
+
+# Filas por bloque al leer con región de interés: solo se conserva en memoria
+# la parte de cada bloque que cae dentro de la ROI.
+ROI_CHUNK_ROWS = 20000
+
+def _first_data_line(lines):
+    """
+    Recorre un iterable de líneas de texto y devuelve el índice de la primera
+    que contiene datos numéricos de al menos dos columnas, o -1 si no hay ninguna.
     """
-    Función auxiliar que examina un archivo para encontrar la primera línea
-    que contiene datos numéricos de al menos dos columnas.
+    for i, line in enumerate(lines):
+        # Ignoramos líneas vacías o que solo contengan espacios
+        if not line.strip():
+            continue
+        
+        # Dividimos la línea por cualquier espacio en blanco y filtramos partes vacías
+        parts = [part for part in line.strip().split() if part]
+        
+        # Si hay al menos dos "palabras" o columnas en la línea...
+        if len(parts) >= 2:
+            try:
+                # ... intentamos convertir las dos primeras a números.
+                float(parts[0].replace(',', '.')) # Reemplazamos comas por puntos (decimal europeo)
+                float(parts[1].replace(',', '.'))
+                # Si tiene éxito, hemos encontrado el inicio de los datos.
+                return i
+            except (ValueError, IndexError):
+                # Si falla la conversión, es una línea de texto, así que continuamos.
+                continue
     
+    # Si recorremos todo el archivo y no encontramos datos, devolvemos -1.
+    return -1
+
+
+def _is_data_line(line):
+    """
+    Devuelve True si la línea (texto) contiene al menos dos columnas numéricas.
+    Es la misma regla que usa _first_data_line.
+    """
+    parts = line.split()
+    if len(parts) < 2:
+        return False
+    try:
+        float(parts[0].replace(',', '.'))
+        float(parts[1].replace(',', '.'))
+        return True
+    except ValueError:
+        return False
+
+
+def _locate_data_block(raw_bytes):
+    """
+    Localiza el inicio del bloque numérico dentro del contenido ya leído del archivo.
+
     Args:
-        file_path (str): La ruta al archivo a analizar.
+        raw_bytes (bytes): El contenido completo del archivo.
 
     Returns:
-        int: El número de la línea donde comienzan los datos (0-indexed),
-             o -1 si no se encuentran datos válidos.
+        tuple: (número de línea, desplazamiento en bytes) del inicio de los datos,
+               o (-1, -1) si no hay datos válidos.
+    """
+    offset = 0
+    line_number = 0
+    total = len(raw_bytes)
+    while offset < total:
+        end = raw_bytes.find(b'\n', offset)
+        if end == -1:
+            end = total
+        line = raw_bytes[offset:end].decode('utf-8', errors='ignore')
+        if line.strip() and _is_data_line(line):
+            return line_number, offset
+        offset = end + 1
+        line_number += 1
+    return -1, -1
+
+
+class Dialect(namedtuple('Dialect', ['separator', 'decimal', 'header_lines', 'n_columns'])):
+    """
+    Formato de los archivos de un mismo instrumento: separador de columnas,
+    marca decimal, número de líneas de encabezado y número de columnas.
+
+    Se detecta una vez por carpeta con sniff_dialect y se reutiliza para todos
+    los archivos, que así se leen sin volver a analizarse.
+    """
+    __slots__ = ()
+
+    def read_csv_options(self):
+        """
+        Argumentos de pd.read_csv para leer el bloque numérico con este formato:
+        las n_columns columnas (la longitud de onda y cada canal). Las filas
+        con más campos (un pie de texto, una columna suelta) no hacen fallar
+        la lectura: lo que sobra se ignora.
+        """
+        return {
+            'header': None,
+            'sep': self.separator,
+            'engine': 'c',
+            'decimal': self.decimal,
+            'quoting': csv.QUOTE_NONE,
+            'encoding': 'utf-8',
+            'encoding_errors': 'ignore',
+            'usecols': range(self.n_columns),
+        }
+
+
+# Formato genérico que usa la ruta rápida cuando no hay dialecto: cualquier
+# espacio en blanco como separador y coma decimal tolerada.
+_GENERIC_DIALECT = Dialect(r'\s+', ',', 0, 2)
+
+
+def _count_columns(line):
+    """Número de columnas de una línea de datos (separadas por espacios o tabuladores)."""
+    return len(line.split())
+
+
+def _line_at(raw_bytes, offset):
+    """Texto de la línea que empieza en el desplazamiento dado."""
+    end = raw_bytes.find(b'\n', offset)
+    return raw_bytes[offset:end if end != -1 else len(raw_bytes)].decode('utf-8', errors='ignore')
+
+
+def _sample_data_lines(raw_bytes, offset, max_lines):
+    """Devuelve hasta max_lines líneas no vacías (texto) a partir del desplazamiento dado."""
+    lines = []
+    total = len(raw_bytes)
+    while offset < total and len(lines) < max_lines:
+        end = raw_bytes.find(b'\n', offset)
+        if end == -1:
+            end = total
+        line = raw_bytes[offset:end].decode('utf-8', errors='ignore').strip()
+        if line:
+            lines.append(line)
+        offset = end + 1
+    return lines
+
+
+def _line_layout(line):
+    """
+    Describe una línea de datos: (separador, marca decimal, número de columnas).
+    El separador es el tabulador si la línea está tabulada limpiamente y
+    cualquier espacio en blanco en otro caso.
+    """
+    parts = line.split()
+    tab_parts = line.split('\t')
+    separator = '\t' if len(tab_parts) == len(parts) and all(p.strip() == p and p for p in tab_parts) else r'\s+'
+    decimal = ',' if any(',' in p for p in parts) else '.'
+    return separator, decimal, len(parts)
+
+
+def sniff_dialect(file_path):
+    """
+    Analiza un archivo representativo y deduce su formato.
+
+    Args:
+        file_path (str): Un archivo de la carpeta.
+
+    Returns:
+        Dialect: El formato detectado, o None si el archivo no tiene datos
+                 o sus primeras líneas no tienen un formato homogéneo.
     """
     try:
-        # Usamos 'errors=ignore' para evitar problemas con caracteres extraños en los encabezados
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            for i, line in enumerate(f):
-                # Ignoramos líneas vacías o que solo contengan espacios
-                if not line.strip():
-                    continue
-                
-                # Dividimos la línea por cualquier espacio en blanco y filtramos partes vacías
-                parts = [part for part in line.strip().split() if part]
-                
-                # Si hay al menos dos "palabras" o columnas en la línea...
-                if len(parts) >= 2:
-                    try:
-                        # ... intentamos convertir las dos primeras a números.
-                        float(parts[0].replace(',', '.')) # Reemplazamos comas por puntos (decimal europeo)
-                        float(parts[1].replace(',', '.'))
-                        # Si tiene éxito, hemos encontrado el inicio de los datos.
-                        return i
-                    except (ValueError, IndexError):
-                        # Si falla la conversión, es una línea de texto, así que continuamos.
-                        continue
-    except Exception as e:
+        with open(file_path, 'rb') as f:
+            raw_bytes = f.read()
+    except OSError as e:
         print(f"Error al leer el archivo {file_path}: {e}")
-    
-    # Si recorremos todo el archivo y no encontramos datos, devolvemos -1.
-    return -1
+        return None
+    return sniff_dialect_bytes(raw_bytes)
+
+
+def sniff_dialect_bytes(raw_bytes):
+    """Igual que sniff_dialect, pero sobre el contenido ya leído (p. ej. de un archivo comprimido)."""
+    start_line, offset = _locate_data_block(raw_bytes)
+    if start_line == -1:
+        return None
+
+    sample = [line for line in _sample_data_lines(raw_bytes, offset, SNIFF_SAMPLE_LINES) if _is_data_line(line)]
+    layouts = {_line_layout(line) for line in sample}
+    if len(layouts) != 1:
+        # Mezcla de separadores o decimales: mejor no fijar un formato.
+        return None
+    separator, decimal, n_columns = layouts.pop()
+    return Dialect(separator, decimal, start_line, n_columns)
 
 
-def parse_spectrum_file(file_path):
+def _match_dialect(raw_bytes, dialect):
     """
-    Parsea un archivo de espectro, detectando automáticamente el inicio de los datos.
+    Comprueba, sin analizar el archivo entero, que sigue el dialecto: la línea
+    header_lines debe ser la primera de datos y tener la misma disposición.
+
+    Returns:
+        int: Desplazamiento en bytes del bloque de datos, o None si no coincide.
+    """
+    offset = 0
+    for _ in range(dialect.header_lines):
+        offset = raw_bytes.find(b'\n', offset) + 1
+        if offset == 0:
+            return None
+
+    first_line = _line_at(raw_bytes, offset).strip()
+    if not _is_data_line(first_line) or _line_layout(first_line) != (dialect.separator, dialect.decimal, dialect.n_columns):
+        return None
+
+    if dialect.header_lines > 0:
+        # La línea anterior no puede ser también de datos (encabezado más corto).
+        previous_start = raw_bytes.rfind(b'\n', 0, offset - 1) + 1
+        previous_line = raw_bytes[previous_start:offset].decode('utf-8', errors='ignore').strip()
+        if previous_line and _is_data_line(previous_line):
+            return None
+    return offset
+
+
+def _read_block(source, options, roi=None):
+    """
+    Lee el bloque numérico con pd.read_csv. Con una ROI se lee por bloques de
+    ROI_CHUNK_ROWS filas y de cada uno se guardan solo las filas cuya primera
+    columna cae dentro de ella (o no es numérica, para que la limpieza y las
+    comprobaciones de formato sigan viéndolas).
+
+    Returns:
+        tuple: (DataFrame, número de filas descartadas por la ROI).
+    """
+    if roi is None:
+        return pd.read_csv(source, **options), 0
+
+    kept = []
+    rows_dropped = 0
+    with pd.read_csv(source, chunksize=ROI_CHUNK_ROWS, **options) as reader:
+        for chunk in reader:
+            wavelength = pd.to_numeric(chunk.iloc[:, 0], errors='coerce')
+            outside = wavelength.notna() & ~wavelength.between(roi[0], roi[1])
+            n_outside = int(outside.sum())
+            if n_outside:
+                rows_dropped += n_outside
+                chunk = chunk[~outside.to_numpy()]
+            kept.append(chunk)
+    return pd.concat(kept, ignore_index=True), rows_dropped
+
+
+def _parse_fast_bytes(raw_bytes, dialect=None, roi=None):
+    """
+    Ruta rápida: localiza el final del encabezado en memoria y parsea el
+    bloque numérico con el motor C de pandas.
+
+    Si se pasa un dialecto y el archivo lo cumple, se usa directamente su plan
+    de lectura; si no lo cumple, se detecta el inicio de datos como siempre.
+
+    Returns:
+        tuple: (DataFrame o None, filas descartadas por la ROI).
+    """
+    if dialect is not None:
+        offset = _match_dialect(raw_bytes, dialect)
+        if offset is not None:
+            try:
+                df, rows_dropped = _read_block(io.BytesIO(raw_bytes[offset:]), dialect.read_csv_options(), roi)
+            except Exception:
+                df = None
+            # Si alguna columna no sale numérica, el cuerpo no sigue el dialecto
+            # (p. ej. un pie de texto); en ese caso usamos la lectura genérica.
+            # Enteros (ejes o cuentas sin decimales) también valen.
+            if df is not None and all(df[col].dtype.kind in 'iuf' for col in df.columns):
+                return df.astype(float), rows_dropped
+
+    start_line, offset = _locate_data_block(raw_bytes)
+    if start_line == -1:
+        return None, 0
+
+    # Se leen tantas columnas como tenga la primera línea de datos.
+    generic = _GENERIC_DIALECT._replace(n_columns=_count_columns(_line_at(raw_bytes, offset)))
+    return _read_block(io.BytesIO(raw_bytes[offset:]), generic.read_csv_options(), roi)
+
+
+def _line_number(lines, index):
+    """Línea número index de un iterable de líneas de texto."""
+    for i, line in enumerate(lines):
+        if i == index:
+            return line
+    return ''
+
+
+def _parse_legacy_bytes(raw_bytes, roi=None):
+    """
+    Ruta clásica: detecta el inicio de datos línea a línea y lee con el
+    motor 'python' de pandas, con saltos de línea universales. Más lenta
+    pero más tolerante.
+
+    Returns:
+        tuple: (DataFrame o None, filas descartadas por la ROI).
+    """
+    text = io.StringIO(raw_bytes.decode('utf-8', errors='ignore'), newline=None)
+    start_line = _first_data_line(text)
+    if start_line == -1:
+        return None, 0
+    text.seek(0)
+    n_columns = _count_columns(_line_number(text, start_line))
+    text.seek(0)
+
+    options = {
+        'skiprows': start_line,
+        'header': None,
+        'sep': r'\s+',
+        'engine': 'python',
+        'decimal': ',',
+        'usecols': range(n_columns),
+    }
+    return _read_block(text, options, roi)
+
+
+def _frame_to_channels(df, name, rows_dropped=0, dtype=np.float64):
+    """
+    Convierte un DataFrame con todas las columnas en arrays NumPy: la primera
+    columna es el eje y cada una de las demás, un canal. Las intensidades se
+    devuelven en dtype y el eje según precision.storage_axis.
+
+    Returns:
+        tuple: (wavelength 1D, intensidades 2D de forma (n_canales, n_puntos),
+               filas descartadas por la ROI), o None si no queda ningún dato útil.
+    """
+    if df is None:
+        print(f"Aviso: No se encontraron datos numéricos válidos en {name}")
+        return None
+
+    df = df.apply(pd.to_numeric, errors='coerce')
+    # Columnas totalmente vacías (p. ej. por un separador al final de cada línea).
+    df = df.dropna(axis=1, how='all')
+    df = df.dropna()
+    if df.empty or df.shape[1] < 2:
+        if rows_dropped:
+            print(f"Aviso: Ningún punto de {name} cae dentro de la región de interés.")
+        else:
+            print(f"Aviso: El DataFrame está vacío después de limpiar {name}")
+        return None
+
+    values = df.to_numpy(dtype=np.float64)
+    # Una única copia contigua por canal (una fila por canal), sin DataFrames intermedios.
+    return storage_axis(values[:, 0].copy(), dtype), np.ascontiguousarray(values[:, 1:].T, dtype=dtype), rows_dropped
+
+
+def parse_spectrum_channels(file_path, fast=True, dialect=None, roi=None, dtype=np.float64):
+    """
+    Parsea un archivo multicanal (una columna de longitud de onda y N columnas
+    de intensidad) leyendo todas las columnas en una sola pasada.
 
     Args:
         file_path (str): La ruta completa al archivo .txt o .asc.
+        fast (bool): Si es True (por defecto) se usa la lectura en una sola pasada
+                     con el motor C, y solo se recurre a la ruta clásica si falla.
+        dialect (Dialect): Formato ya detectado para la carpeta (ver sniff_dialect).
+                           Los archivos que no lo cumplan se leen sin él.
+        roi (tuple): Región de interés (mínimo, máximo) en nm. Las filas de fuera
+                     se descartan mientras se lee y nunca llegan a guardarse.
+        dtype: Precisión de almacenamiento (float64 o float32, ver precision.py).
 
     Returns:
-        pd.DataFrame: Un DataFrame con columnas 'wavelength' e 'intensity' si tiene éxito,
-                      o None si el archivo no se puede parsear.
+        tuple: (wavelength, intensities, rows_dropped) con intensities de forma
+               (n_canales, n_puntos) y rows_dropped el número de filas que quedaron
+               fuera de la ROI; un archivo de dos columnas da un único canal.
+               None si no se puede parsear.
     """
-    # 1. Realizamos el trabajo de detective para encontrar la primera línea de datos.
-    start_line = _find_data_start(file_path)
-    
-    # 2. Si no se encontraron datos, devolvemos None para indicar el fallo.
-    if start_line == -1:
-        print(f"Aviso: No se encontraron datos numéricos válidos en {os.path.basename(file_path)}")
+    try:
+        with open(file_path, 'rb') as f:
+            raw_bytes = f.read()
+    except OSError as e:
+        print(f"Error al leer el archivo {file_path}: {e}")
         return None
-        
+    return parse_spectrum_channels_bytes(raw_bytes, os.path.basename(file_path), fast, dialect, roi, dtype)
+
+
+def parse_spectrum_channels_bytes(raw_bytes, name, fast=True, dialect=None, roi=None, dtype=np.float64):
+    """Igual que parse_spectrum_channels, pero sobre el contenido ya leído."""
+    df = None
+    rows_dropped = 0
+    if fast:
+        try:
+            df, rows_dropped = _parse_fast_bytes(raw_bytes, dialect, roi=roi)
+        except Exception:
+            df = None
+
     try:
-        # 3. Usamos pandas para leer el archivo de forma eficiente, saltando el encabezado.
-        df = pd.read_csv(
-            file_path,
-            skiprows=start_line,
-            header=None,
-            sep=r'\s+',  # Forma moderna y robusta de manejar espacios/tabs como separadores
-            usecols=[0, 1],
-            names=['wavelength', 'intensity'],
-            engine='python', # El motor 'python' es más lento pero mejor manejando separadores complejos
-            decimal=','      # Intentamos manejar la coma como decimal si existe
-        )
-        
-        # 4. Limpieza final: nos aseguramos de que todo sea numérico y eliminamos filas malas.
-        #    'coerce' convertirá en NaN (Not a Number) cualquier cosa que no pueda ser un número.
-        df['wavelength'] = pd.to_numeric(df['wavelength'], errors='coerce')
-        df['intensity'] = pd.to_numeric(df['intensity'], errors='coerce')
-        
-        # Eliminamos cualquier fila que tenga NaN en cualquiera de las dos columnas.
-        df.dropna(inplace=True)
-        
-        # Si después de la limpieza el DataFrame está vacío, no es útil.
-        if df.empty:
-            print(f"Aviso: El DataFrame está vacío después de limpiar {os.path.basename(file_path)}")
-            return None
-            
-        return df
-        
+        if df is None:
+            df, rows_dropped = _parse_legacy_bytes(raw_bytes, roi=roi)
+        return _frame_to_channels(df, name, rows_dropped, dtype)
+
     except Exception as e:
-        print(f"Error al parsear {os.path.basename(file_path)} con pandas: {e}")
-        return None
\ No newline at end of file
+        print(f"Error al parsear {name} con pandas: {e}")
+        return None
@@ -1,15 +1,43 @@
 # spectraconverter_v4/src/data_plotter.py
 
+import time
 import tkinter as tk
-import matplotlib.pyplot as plt
+from collections import deque
+
+import numpy as np
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
 
+from .plot_lod import CollectionLine, DecimatedLine, DecimatedLineCollection
+from .plot_style import FIGURE_DPI, FIGURE_SIZE, X_LABEL, line_color, style_grid, y_label, y_magnitudes
+from .roi import crop
+
+# Número de tiempos de dibujo que se guardan para el informe.
+FRAME_TIME_HISTORY = 100
+# A partir de estos espectros se dibujan todos en un solo LineCollection.
+LINE_COLLECTION_MIN_SPECTRA = 200
+
+
+def _same_data(old, new):
+    return old is new or (old.shape == new.shape and np.array_equal(old, new))
+
+
 class SpectraPlotter:
+    """
+    Gráfica de espectros en Tk.
+
+    Las líneas y la leyenda son artistas "animados": el redibujado completo
+    (zoom, cambio de tamaño, datos nuevos) pinta solo ejes, rejilla y
+    etiquetas, y en el evento draw_event se guarda ese fondo y se componen
+    encima líneas y leyenda. Al mostrar u ocultar espectros basta con
+    restaurar el fondo, dibujar las líneas visibles y pegar la leyenda, que se
+    guarda ya rasterizada: es lo caro de dibujar con cientos de entradas.
+    """
+
     def __init__(self, parent_frame):
-        self.fig = Figure(figsize=(7, 5), dpi=100)
+        self.fig = Figure(figsize=FIGURE_SIZE, dpi=FIGURE_DPI)
         self.ax = self.fig.add_subplot(111)
-        self.ax.grid(True, linestyle='--', alpha=0.6)
+        style_grid(self.ax)
         
         self.canvas = FigureCanvasTkAgg(self.fig, master=parent_frame)
         
@@ -20,50 +48,274 @@ class SpectraPlotter:
         self.toolbar.update()
         
         self.plotted_lines = {}
+        self.use_processed = False
+        self.roi = None
+        # Con muchos espectros, todas las líneas van en un solo LineCollection.
+        self._collection = None
+        # Lo que determina los márgenes de tight_layout la última vez que se aplicó.
+        self._layout_key = None
+
+        # Capas guardadas en el último redibujado completo (ver _on_draw).
+        self._background = None
+        self._legend = None
+        self._legend_layer = None
+        self._legend_handles = {}
+        # Redibujados pedidos y aún no hechos: se agrupan en uno por ciclo de eventos.
+        self._after_idle = self.canvas.get_tk_widget().after_idle
+        self._full_draw_pending = False
+        self._refresh_job = None
+        # Hay cambios de visibilidad que aún no se han mostrado.
+        self._visibility_dirty = False
+        # Tiempos de dibujo recientes: ('completo' | 'parcial', segundos).
+        self.frame_times = deque(maxlen=FRAME_TIME_HISTORY)
+        self._full_draw_start = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
 
-    def plot_spectra(self, spectra_data, use_processed=False):
+    def plot_spectra(self, spectra, use_processed=False, roi=None):
         """
         Dibuja los espectros. Esta es la función que se encarga del renderizado final.
+
+        Si son los mismos espectros que ya hay dibujados (aplicar o deshacer un
+        procesamiento, cambiar la ROI...), se conservan líneas, leyenda y
+        rejilla y solo se cambian los datos de los que han cambiado.
+
+        Args:
+            spectra (SpectraCollection): Los espectros cargados.
+            use_processed (bool): Si es True, se dibujan los datos procesados cuando existan.
+            roi (tuple): Región de interés (mínimo, máximo); solo se dibujan esos puntos.
         """
+        self.use_processed = use_processed
+        self.roi = roi
+        data = [crop(spectra.wavelength(index), spectra.intensity(index, use_processed), roi)
+                for index in range(len(spectra))]
+
+        if self.plotted_lines and list(self.plotted_lines) == list(spectra.filenames):
+            for line, (x, y) in zip(self.plotted_lines.values(), data):
+                if not all(_same_data(old, new) for old, new in zip(line.get_full_data(), (x, y))):
+                    line.set_full_data(x, y)
+        else:
+            self.clear()
+            if len(data) >= LINE_COLLECTION_MIN_SPECTRA:
+                self._collection = DecimatedLineCollection(animated=True)
+                self.ax.add_collection(self._collection, autolim=False)
+            for filename, (x, y) in zip(spectra.filenames, data):
+                self._add_line(filename, x, y)
+            self.ax.set_xlabel(X_LABEL)
+            self._make_legend()
+
+        self.ax.set_ylabel(y_label(use_processed))
+        # Como al recrear la gráfica: la vista vuelve a abarcar todos los datos.
+        self.ax.set_autoscale_on(True)
+        self._rescale()
+        self._update_layout()
+        self.request_draw()
+
+    def clear(self):
+        """Vacía la gráfica (sin espectros) y pide redibujarla."""
         self.ax.clear()
+        style_grid(self.ax)
         self.plotted_lines.clear()
+        self._collection = None
+        self.request_draw()
 
-        y_label = "Intensidad (procesado)" if use_processed else "Intensidad (crudo)"
+    def _add_line(self, filename, x, y):
+        # Las líneas guardan todos los puntos y dibujan solo los que se ven a
+        # resolución de pantalla; el color sigue el mismo ciclo que ax.plot.
+        color = line_color(len(self.plotted_lines))
+        if self._collection is not None:
+            line = CollectionLine(self._collection, x, y, filename, color)
+        else:
+            line = DecimatedLine(x, y, label=filename, animated=True, color=color)
+            self.ax.add_line(line)
+        self.plotted_lines[filename] = line
+        return line
 
-        for spectrum in spectra_data:
-            filename = spectrum['filename']
-            df_to_plot = spectrum['processed_dataframe'] if use_processed and spectrum['processed_dataframe'] is not None else spectrum['dataframe']
-            y_col_name = 'intensity'
-            
-            line, = self.ax.plot(df_to_plot['wavelength'], df_to_plot[y_col_name], label=filename)
-            self.plotted_lines[filename] = line
-        
-        self.ax.set_xlabel("Longitud de onda (nm)")
-        self.ax.set_ylabel(y_label)
-        self.ax.legend()
-        self.ax.grid(True, linestyle='--', alpha=0.6)
-        
-        # Llamamos a tight_layout() justo ANTES de dibujar
+    def _make_legend(self):
+        handles = [getattr(line, 'legend_proxy', line) for line in self.plotted_lines.values()]
+        legend = self.ax.legend(handles=handles)
+        legend.set_animated(True)
+        return legend
+
+    def _rescale(self):
+        """Ajusta la vista a los datos visibles (relim no tiene en cuenta los LineCollection)."""
+        self.ax.relim(visible_only=True)
+        if self._collection is not None:
+            limits = self._collection.data_limits()
+            if limits is not None:
+                self.ax.update_datalim([limits[:2], limits[2:]])
+        self.ax.autoscale_view()
+
+    def _update_layout(self):
+        """
+        Aplica tight_layout solo si ha cambiado algo que mueva los márgenes:
+        la leyenda, el tamaño de la figura o el orden de magnitud de los
+        valores del eje Y (la anchura de sus marcas). El texto de la etiqueta
+        Y no cuenta: va girada y su anchura no depende de él.
+        """
+        key = (tuple(self.plotted_lines), tuple(self.fig.get_size_inches()), y_magnitudes(self.ax))
+        if key == self._layout_key:
+            return
+        self._layout_key = key
         try:
             self.fig.tight_layout()
         except Exception as e:
             print(f"Advertencia de Matplotlib: No se pudo aplicar tight_layout. {e}")
 
-        self.canvas.draw()
+    def request_draw(self):
+        """
+        Pide un redibujado completo. draw_idle agrupa todas las peticiones
+        hechas en el mismo ciclo de eventos en un solo dibujo.
+        """
+        if self._full_draw_start is None:
+            self._full_draw_start = time.perf_counter()
+        self._full_draw_pending = True
+        self.canvas.draw_idle()
+
+    def update_spectra(self, updates):
+        """
+        Actualiza o añade líneas sin borrar ni recrear el resto del gráfico
+        (modo de vigilancia de carpeta).
+
+        Args:
+            updates (list): Tuplas (filename, wavelength, intensity). Si el nombre
+                            ya tiene línea se sustituyen sus datos; si no, se crea.
+        """
+        added = False
+        for filename, wavelength, intensity in updates:
+            wavelength, intensity = crop(wavelength, intensity, self.roi)
+            if filename in self.plotted_lines:
+                self.plotted_lines[filename].set_full_data(wavelength, intensity)
+            else:
+                self._add_line(filename, wavelength, intensity)
+                added = True
+
+        self._rescale()
+        if added:
+            self._make_legend()
+        self.request_draw()
+
+    def preview_spectra(self, updates):
+        """
+        Sustituye solo los datos de líneas ya dibujadas (vista previa en vivo):
+        no se recrea nada y el redibujado se agrupa con los demás.
+
+        Args:
+            updates (list): Tuplas (filename, wavelength, intensity) sin recortar a la ROI.
+        """
+        for filename, wavelength, intensity in updates:
+            line = self.plotted_lines.get(filename)
+            if line is None:
+                continue
+            line.set_full_data(*crop(wavelength, intensity, self.roi))
+
+        self._rescale()
+        self.request_draw()
 
     def toggle_spectrum_visibility(self, filename, is_visible):
         """
-        Cambia la visibilidad de una línea de forma eficiente, SIN redibujar el gráfico.
+        Cambia la visibilidad de una línea (y de su muestra en la leyenda) de
+        forma eficiente, SIN redibujar el gráfico: después hay que llamar a
+        refresh_visibility.
         """
         if filename in self.plotted_lines:
             line = self.plotted_lines[filename]
             line.set_visible(is_visible)
+            self._visibility_dirty = True
+            handle = self._legend_handles.get(filename)
+            if handle is not None:
+                handle.set_visible(is_visible)
+
+    def refresh_visibility(self):
+        """
+        Muestra los cambios de visibilidad con blitting: fondo guardado, líneas
+        visibles y leyenda ya rasterizada. Se agrupa con las demás peticiones
+        del mismo ciclo de eventos.
+        """
+        if self._refresh_job is None:
+            self._refresh_job = self._after_idle(self._refresh_now)
+
+    def _refresh_now(self):
+        self._refresh_job = None
+        if self._full_draw_pending or not self._visibility_dirty:
+            return  # El redibujado completo (pendiente o ya hecho) compone las líneas tal como están.
+        if self._background is None or self.ax.get_legend() is not self._legend:
+            self.request_draw()
+            return
+        start = time.perf_counter()
+        self.canvas.restore_region(self._background)
+        self._draw_layers()
+        self.canvas.blit(self.fig.bbox)
+        self._visibility_dirty = False
+        self.frame_times.append(('parcial', time.perf_counter() - start))
 
     def redraw_legend_and_canvas(self):
         """
-        Redibuja la leyenda y el canvas. Se debe llamar UNA VEZ después de
-        todos los cambios de visibilidad.
+        Muestra la leyenda y el canvas tras varios cambios de visibilidad. Se
+        debe llamar UNA VEZ después de todos ellos. La leyenda ya no se recrea:
+        toggle_spectrum_visibility actualiza solo las entradas que cambian.
+        """
+        self.refresh_visibility()
+
+    def _on_draw(self, event):
+        """
+        Tras cada redibujado completo (que no incluye los artistas animados):
+        guarda el fondo, rasteriza la leyenda en una capa transparente y
+        compone encima líneas y leyenda.
         """
-        # La forma más segura de actualizar la leyenda es recrearla
-        self.ax.legend()
-        self.canvas.draw()
\ No newline at end of file
+        if event is not None and event.canvas is not self.canvas or self.canvas.is_saving():
+            return  # Al guardar a archivo, matplotlib ya dibuja los artistas animados.
+        self._full_draw_pending = False
+        self._visibility_dirty = False
+        renderer = self.canvas.get_renderer()
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+        # La leyenda se pinta sola sobre el lienzo vacío, sin las muestras de
+        # línea (se dibujan en cada fotograma, porque cambian con la visibilidad).
+        self._legend = self.ax.get_legend()
+        self._legend_layer = None
+        self._legend_handles = {}
+        if self._legend is not None:
+            handles = self._legend.legend_handles
+            labels = [text.get_text() for text in self._legend.get_texts()]
+            self._legend_handles = {label: handle for label, handle in zip(labels, handles) if handle is not None}
+            visible = [handle.get_visible() for handle in self._legend_handles.values()]
+            for handle in self._legend_handles.values():
+                handle.set_visible(False)
+            renderer.clear()
+            self._legend.draw(renderer)
+            # copy_from_bbox da las filas de arriba abajo; draw_image las espera de abajo arriba.
+            self._legend_layer = np.array(self.canvas.copy_from_bbox(self.fig.bbox))[::-1]
+            for handle, is_visible in zip(self._legend_handles.values(), visible):
+                handle.set_visible(is_visible)
+            self.canvas.restore_region(self._background)
+
+        self._draw_layers()
+        self.canvas.blit(self.fig.bbox)
+        if self._full_draw_start is not None:
+            self.frame_times.append(('completo', time.perf_counter() - self._full_draw_start))
+            self._full_draw_start = None
+
+    def _draw_layers(self):
+        """Dibuja sobre el fondo las líneas visibles y la leyenda guardada."""
+        for artist in (*self.ax.get_lines(), *self.ax.collections):
+            if artist.get_animated():
+                self.ax.draw_artist(artist)
+        if self._legend_layer is not None:
+            renderer = self.canvas.get_renderer()
+            gc = renderer.new_gc()
+            renderer.draw_image(gc, 0, 0, self._legend_layer)
+            gc.restore()
+            for handle in self._legend_handles.values():
+                handle.draw(renderer)
+
+    def frame_time_report(self):
+        """Texto breve con los tiempos de dibujo recientes, para la barra de estado."""
+        parts = []
+        for kind in ('parcial', 'completo'):
+            times = [seconds for frame_kind, seconds in self.frame_times if frame_kind == kind]
+            if times:
+                parts.append(f"{kind}: último {times[-1] * 1000:.1f} ms, "
+                             f"mediana {np.median(times) * 1000:.1f} ms ({len(times)})")
+        if not parts:
+            return "Dibujo: todavía no hay tiempos medidos"
+        return "Dibujo " + "; ".join(parts)
\ No newline at end of file
@@ -1,45 +1,556 @@
 # spectraconverter_v4/src/data_processor.py
 
-import pandas as pd
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from scipy.signal import savgol_filter
-from .pybaselines_local import airpls
+from .pybaselines_local import airpls_batch, airpls_multires_batch
+from .data_loader import default_workers
+from .roi import roi_index
 import warnings
 
 warnings.filterwarnings("ignore", "overflow encountered in exp", RuntimeWarning)
 
-def process_spectrum(dataframe, processing_steps):
+# Tamaño de pila (espectros × puntos) a partir del cual compensa repartir
+# airPLS entre varios procesos; por debajo, arrancar el pool cuesta más.
+PARALLEL_AIRPLS_MIN_POINTS = 1_000_000
+
+# Memoria máxima que ocupan los resultados guardados en ResultCache.
+DEFAULT_RESULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Memoria máxima para los pesos de airPLS guardados en WarmStartCache.
+DEFAULT_WARM_START_BYTES = 128 * 1024 * 1024
+
+
+def _moving_average(intensities, window):
     """
-    Aplica una serie de pasos de procesamiento a un dataframe.
+    Media móvil centrada sobre cada fila, equivalente a
+    Series.rolling(window, center=True, min_periods=1).mean() de pandas.
+    """
+    n_points = intensities.shape[1]
+    cumulative = np.zeros((intensities.shape[0], n_points + 1))
+    np.cumsum(intensities, axis=1, out=cumulative[:, 1:])
+    positions = np.arange(n_points)
+    lower = np.maximum(positions - window // 2, 0)
+    upper = np.minimum(positions + (window - 1) // 2 + 1, n_points)
+    return (cumulative[:, upper] - cumulative[:, lower]) / (upper - lower)
+
+
+def _airpls_chunk(intensities, params, weights=None, batch=airpls_batch):
+    """Tarea del pool: airPLS sobre un bloque de filas de la pila."""
+    return batch(intensities, weights=weights, **params)
+
+
+def _airpls_stack(intensities, params, max_workers=None, weights=None, batch=airpls_batch):
+    """
+    airPLS sobre toda la pila. Las pilas grandes se reparten por bloques de
+    filas entre procesos; como cada espectro converge a su ritmo, se hacen
+    más bloques que procesos para equilibrar la carga.
+
+    Args:
+        weights (np.ndarray): Pesos de partida 2D, o None para pesos uniformes.
+        batch: airpls_batch, o airpls_multires_batch para la variante de gruesa a fina.
+
+    Returns:
+        tuple: (líneas base 2D, info de `batch` con las filas de todos los bloques,
+                p. ej. {'weights': pesos 2D, 'iterations': iteraciones por espectro})
+    """
+    if max_workers is None:
+        max_workers = default_workers()
+    n_spectra = len(intensities)
+    if max_workers <= 1 or n_spectra < 2 or intensities.size < PARALLEL_AIRPLS_MIN_POINTS:
+        return batch(intensities, weights=weights, **params)
+
+    n_chunks = min(n_spectra, max_workers * 4)
+    chunks = np.array_split(intensities, n_chunks)
+    weight_chunks = [None] * n_chunks if weights is None else np.array_split(weights, n_chunks)
+    with ProcessPoolExecutor(max_workers=min(max_workers, n_chunks)) as executor:
+        results = list(executor.map(_airpls_chunk, chunks, [params] * n_chunks, weight_chunks, [batch] * n_chunks))
+    return (np.vstack([baselines for baselines, _ in results]),
+            {key: np.concatenate([info[key] for _, info in results]) for key in results[0][1]})
+
+
+def _step_normalize(result, params, max_workers, warm=None):
+    max_intensity = result.max(axis=1, keepdims=True)
+    positive = max_intensity[:, 0] > 0
+    result[positive] /= max_intensity[positive]
+    return result
+
+
+def _step_min(result, params, max_workers, warm=None):
+    result -= result.min(axis=1, keepdims=True)
+    return result
+
+
+def _step_airpls(result, params, max_workers, warm=None, batch=airpls_batch):
+    if warm is None:
+        result -= _airpls_stack(result, params, max_workers, batch=batch)[0]
+        return result
+    warm_start, stage_key = warm
+    baselines, info = _airpls_stack(result, params, max_workers, warm_start.initial_weights(stage_key, result.shape),
+                                    batch)
+    # En la variante de gruesa a fina cuentan las iteraciones de las dos mallas.
+    warm_start.record(stage_key, info['weights'], info['iterations'] + info.get('coarse_iterations', 0))
+    result -= baselines
+    return result
+
+
+def _step_airpls_multires(result, params, max_workers, warm=None):
+    return _step_airpls(result, params, max_workers, warm, airpls_multires_batch)
+
+
+def _step_moving_average(result, params, max_workers, warm=None):
+    return _moving_average(result, params['window'])
+
+
+def _step_savgol(result, params, max_workers, warm=None):
+    return savgol_filter(result, window_length=params['window'], polyorder=params['order'], axis=1)
+
+
+def _positive(name, value, integer=False):
+    if integer and (isinstance(value, bool) or int(value) != value):
+        raise ValueError(f"'{name}' debe ser un número entero.")
+    if not value > 0:
+        raise ValueError(f"'{name}' debe ser mayor que 0.")
+
+
+def _validate_airpls(params):
+    _positive('lam', params['lam'])
+    if not 0 < params['p'] < 1:
+        raise ValueError("'p' debe estar entre 0 y 1.")
+    _positive('max_iter', params['max_iter'], integer=True)
+    _positive('tol', params['tol'])
+
+
+def _validate_airpls_multires(params):
+    _validate_airpls(params)
+    if int(params['factor']) != params['factor'] or params['factor'] < 0:
+        raise ValueError("'factor' debe ser un número entero no negativo (0 = automático).")
+    _positive('refine_iter', params['refine_iter'], integer=True)
+
+
+def _validate_moving_average(params):
+    _positive('window', params['window'], integer=True)
+
+
+def _validate_savgol(params):
+    _positive('window', params['window'], integer=True)
+    if int(params['order']) != params['order'] or params['order'] < 0:
+        raise ValueError("'order' debe ser un número entero no negativo.")
+    if params['window'] <= params['order']:
+        raise ValueError("En Savitzky-Golay, la ventana debe ser mayor que el orden del polinomio.")
+
+
+# Pasos disponibles: función vectorizada sobre la pila 2D, parámetros por defecto
+# (que son también los únicos admitidos) y validación. Las funciones reciben
+# (pila, parámetros, procesos, warm), donde warm es None o (WarmStart, clave de etapa).
+PIPELINE_STEPS = {
+    'normalize': (_step_normalize, {}, None),
+    'min': (_step_min, {}, None),
+    'airpls': (_step_airpls, {'lam': 1e7, 'p': 0.01, 'max_iter': 50, 'tol': 1e-3}, _validate_airpls),
+    'airpls_multires': (_step_airpls_multires,
+                        {'lam': 1e7, 'p': 0.01, 'max_iter': 50, 'tol': 1e-3, 'factor': 0, 'refine_iter': 3},
+                        _validate_airpls_multires),
+    'moving_average': (_step_moving_average, {'window': 5}, _validate_moving_average),
+    'savgol': (_step_savgol, {'window': 11, 'order': 2}, _validate_savgol),
+}
+
+
+class ProcessingPipeline:
+    """
+    Cadena ordenada de pasos de procesamiento, p. ej. airPLS, después
+    Savitzky-Golay y después normalizar.
+
+    Los parámetros se completan con sus valores por defecto y se validan una
+    sola vez al construir la cadena; al ejecutarla, cada paso trabaja sobre la
+    pila 2D completa (una fila por espectro) sin DataFrames intermedios. La
+    usan tanto la interfaz como la línea de comandos.
+    """
+
+    def __init__(self, steps=()):
+        """
+        Args:
+            steps (list): Nombres de paso o tuplas (nombre, dict de parámetros).
+
+        Raises:
+            ValueError: Si un paso no existe o sus parámetros no son válidos.
+        """
+        self.steps = []
+        for step in steps:
+            name, params = (step, {}) if isinstance(step, str) else step
+            if name not in PIPELINE_STEPS:
+                raise ValueError(f"Paso de procesamiento desconocido: '{name}'.")
+            _, defaults, validate = PIPELINE_STEPS[name]
+            unknown = set(params) - set(defaults)
+            if unknown:
+                raise ValueError(f"Parámetros no válidos para '{name}': {', '.join(sorted(unknown))}.")
+            params = {**defaults, **params}
+            if validate is not None:
+                validate(params)
+            self.steps.append((name, params))
+
+    @classmethod
+    def from_processing_steps(cls, processing_steps):
+        """
+        Construye la cadena equivalente al diccionario clásico
+        {'normalize': bool, 'method': str, 'params': dict}: primero la
+        normalización y después el método.
+        """
+        steps = []
+        if processing_steps.get('normalize'):
+            steps.append('normalize')
+        if processing_steps.get('method'):
+            steps.append((processing_steps['method'], dict(processing_steps.get('params', {}))))
+        return cls(steps)
+
+    @classmethod
+    def from_spec(cls, specs):
+        """
+        Construye la cadena a partir de textos "paso:parámetro=valor,...",
+        p. ej. ["airpls:lam=1e5", "savgol:window=21", "normalize"].
+        """
+        steps = []
+        for spec in specs:
+            name, _, param_text = spec.partition(':')
+            params = {}
+            for item in filter(None, param_text.split(',')):
+                key, sep, value = item.partition('=')
+                if not sep:
+                    raise ValueError(f"Parámetro mal escrito en '{spec}': usa nombre=valor.")
+                try:
+                    params[key.strip()] = int(value)
+                except ValueError:
+                    params[key.strip()] = float(value)
+            steps.append((name.strip(), params))
+        return cls(steps)
+
+    def __bool__(self):
+        return bool(self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __repr__(self):
+        return f"ProcessingPipeline({self.steps!r})"
+
+    def key(self):
+        """
+        Forma canónica e inmutable de la cadena: dos cadenas con los mismos pasos
+        y parámetros (aunque se hayan escrito como 1e5 o 100000) dan la misma clave.
+        """
+        return tuple((name, tuple(sorted((k, float(v)) for k, v in params.items())))
+                     for name, params in self.steps)
+
+    def describe(self):
+        """Resumen legible, p. ej. "airpls(lam=1e+07, p=0.01) → normalize"."""
+        parts = []
+        for name, params in self.steps:
+            shown = ', '.join(f"{k}={v:g}" for k, v in params.items())
+            parts.append(f"{name}({shown})" if shown else name)
+        return ' → '.join(parts)
+
+    def warm_stages(self):
+        """
+        Claves de las etapas airPLS (también airpls_multires) que admiten
+        arranque en caliente: los pasos que las preceden. No incluyen los
+        parámetros del propio airPLS, así que al retocar lam o p se siguen
+        reconociendo los pesos de la vez anterior; tampoco la variante, porque
+        las dos dejan pesos a resolución completa.
+        """
+        key = self.key()
+        return [key[:position] for position, (name, _) in enumerate(self.steps)
+                if name in ('airpls', 'airpls_multires')]
+
+    def run(self, intensities, max_workers=None, warm_start=None):
+        """
+        Ejecuta la cadena sobre una pila de espectros que comparten eje.
+
+        Args:
+            intensities (np.ndarray): Array 2D (n_espectros, n_puntos). No se modifica.
+            max_workers (int): Procesos para airPLS en pilas grandes.
+            warm_start (WarmStart): Pesos de partida de airPLS para estas filas;
+                                    recoge también los pesos convergidos.
+
+        Returns:
+            np.ndarray: Nuevo array 2D (float64) con los espectros procesados.
+        """
+        result = np.array(intensities, dtype=np.float64, ndmin=2)
+        key = self.key()
+        for position, (name, params) in enumerate(self.steps):
+            warm = None if warm_start is None else (warm_start, key[:position])
+            result = PIPELINE_STEPS[name][0](result, params, max_workers, warm)
+        return result
+
+
+class ResultCache:
     """
+    Resultados ya calculados, por espectro, con expulsión LRU limitada en memoria.
+
+    La clave combina la huella del contenido crudo del espectro
+    (SpectraCollection.content_key), la forma canónica de la cadena de
+    procesamiento y la ROI; volver a unos parámetros ya probados no recalcula nada.
+    Con dtype (p. ej. float32) los resultados se guardan en esa precisión.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_RESULT_CACHE_BYTES, dtype=None):
+        self.max_bytes = max_bytes
+        self.dtype = dtype
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Devuelve el resultado guardado (de solo lectura) o None."""
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key).nbytes
+        result = np.array(result, dtype=self.dtype)
+        if result.nbytes > self.max_bytes:
+            return
+        result.setflags(write=False)
+        self._entries[key] = result
+        self.nbytes += result.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+
+class WarmStart:
+    """
+    Pesos de partida de airPLS para las filas de una ejecución concreta, y los
+    pesos convergidos y las iteraciones que deja esa ejecución.
+
+    Lo prepara WarmStartCache.prepare en el hilo principal; después puede
+    usarse en un hilo auxiliar sin tocar la caché, y se devuelve a ella con
+    WarmStartCache.save.
+    """
+
+    def __init__(self, row_keys, seeds):
+        self.row_keys = list(row_keys)
+        self.seeds = seeds
+        self.converged = {}
+        self.iterations = []
+        self.seeded = 0
+
+    def rows(self, start, stop):
+        """WarmStart independiente para un tramo de filas (p. ej. un bloque o un espectro)."""
+        return WarmStart(self.row_keys[start:stop], {k: rows[start:stop] for k, rows in self.seeds.items()})
+
+    def initial_weights(self, stage_key, shape):
+        """Pesos 2D de partida (uniformes donde no hay pesos previos), o None si no hay ninguno."""
+        rows = self.seeds.get(stage_key)
+        if not rows or all(row is None for row in rows):
+            return None
+        weights = np.ones(shape)
+        for k, row in enumerate(rows):
+            # Con otra ROI u otro eje la longitud cambia y los pesos viejos no sirven.
+            if row is not None and row.shape == shape[1:]:
+                weights[k] = row
+                self.seeded += 1
+        return weights
+
+    def record(self, stage_key, weights, iterations):
+        self.converged[stage_key] = weights
+        self.iterations.append(iterations)
+
+
+def describe_iterations(warm_starts):
+    """
+    Resumen de las iteraciones de airPLS de una o varias ejecuciones, p. ej.
+    "airPLS: 12.4 iteraciones de media, 20 de 20 espectros con arranque en caliente",
+    o None si no se ejecutó airPLS.
+    """
+    iterations = [counts for warm_start in warm_starts for counts in warm_start.iterations]
+    if not iterations:
+        return None
+    iterations = np.concatenate(iterations)
+    seeded = sum(warm_start.seeded for warm_start in warm_starts)
+    return (f"airPLS: {iterations.mean():.1f} iteraciones de media, "
+            f"{seeded} de {len(iterations)} espectros con arranque en caliente")
+
+
+class WarmStartCache:
+    """
+    Pesos convergidos de airPLS por espectro, para que la siguiente ejecución
+    arranque desde ellos en lugar de desde pesos uniformes.
+
+    Al retocar lam o p la línea base cambia poco, así que partir de los pesos
+    anteriores ahorra buena parte de las iteraciones; el criterio de parada
+    (tol) es el mismo. La clave es la huella del espectro, la ROI y los pasos
+    previos al airPLS (ProcessingPipeline.warm_stages), y la memoria está
+    limitada con la misma expulsión LRU que ResultCache.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_WARM_START_BYTES, dtype=None):
+        self._weights = ResultCache(max_bytes, dtype)
+        # Resumen de iteraciones de la última llamada a process_collection (describe_iterations).
+        self.last_report = None
+
+    def __len__(self):
+        return len(self._weights)
+
+    @property
+    def nbytes(self):
+        return self._weights.nbytes
+
+    @property
+    def dtype(self):
+        return self._weights.dtype
+
+    @dtype.setter
+    def dtype(self, dtype):
+        self._weights.dtype = dtype
+
+    def prepare(self, content_keys, pipeline, roi=None):
+        """Reúne los pesos guardados de esas filas para las etapas airPLS de la cadena."""
+        row_keys = [(content_key, roi) for content_key in content_keys]
+        seeds = {stage_key: [self._weights.get((row_key, stage_key)) for row_key in row_keys]
+                 for stage_key in pipeline.warm_stages()}
+        return WarmStart(row_keys, seeds)
+
+    def save(self, warm_start):
+        """Guarda los pesos convergidos de una ejecución."""
+        for stage_key, weights in warm_start.converged.items():
+            for row_key, row in zip(warm_start.row_keys, weights):
+                self._weights.put((row_key, stage_key), row)
+
+    def clear(self):
+        self._weights.clear()
+
+
+def as_pipeline(processing_steps):
+    """Acepta una ProcessingPipeline o el diccionario clásico de pasos."""
+    if isinstance(processing_steps, ProcessingPipeline):
+        return processing_steps
+    return ProcessingPipeline.from_processing_steps(processing_steps)
+
+
+def process_array(intensities, processing_steps, max_workers=None, warm_start=None):
+    """
+    Aplica los pasos de procesamiento a una pila de espectros que comparten eje.
+
+    Args:
+        intensities (np.ndarray): Array 2D (n_espectros, n_puntos). No se modifica.
+        processing_steps: ProcessingPipeline, o el diccionario clásico de process_spectrum.
+        max_workers (int): Procesos para airPLS en pilas grandes; por defecto,
+                           todos los núcleos menos uno.
+        warm_start (WarmStart): Pesos de partida de airPLS para estas filas.
+
+    Returns:
+        np.ndarray: Nuevo array 2D (float64) con los espectros procesados.
+    """
+    return as_pipeline(processing_steps).run(intensities, max_workers, warm_start)
+
+
+def process_spectrum(dataframe, processing_steps, roi=None):
+    """
+    Aplica una serie de pasos de procesamiento a un dataframe (ProcessingPipeline
+    o el diccionario clásico {'normalize', 'method', 'params'}).
+    Con una región de interés (mínimo, máximo) solo se procesan y devuelven
+    las filas que caen dentro de ella.
+    """
+    if roi is not None:
+        dataframe = dataframe.iloc[roi_index(dataframe['wavelength'].to_numpy(), roi)]
     df = dataframe.copy()
+    df['intensity'] = process_array(df['intensity'].to_numpy()[np.newaxis, :], processing_steps)[0]
+    return df
+
+
+def process_stack(intensities, wavelength, processing_steps, roi=None, max_workers=None, warm_start=None):
+    """
+    Procesa una pila 2D de espectros que comparten el eje wavelength. Con una
+    ROI solo se procesan las columnas que caen dentro; el resto del resultado
+    queda a NaN (no se dibuja ni se exporta).
+    """
+    if roi is None:
+        return process_array(intensities, processing_steps, max_workers, warm_start)
+    selection = roi_index(wavelength, roi)
+    intensities = np.atleast_2d(intensities)
+    result = np.full(intensities.shape, np.nan)
+    inside = intensities[:, selection]
+    if inside.shape[1]:
+        result[:, selection] = process_array(inside, processing_steps, max_workers, warm_start)
+    return result
+
+
+def process_collection(collection, processing_steps, indices=None, roi=None, max_workers=None, cache=None,
+                       warm_start=None):
+    """
+    Procesa espectros de una SpectraCollection y guarda el resultado en ella.
+
+    Si la colección está alineada, todos los espectros se procesan de una vez
+    sobre el bloque 2D; si no, se procesa cada espectro por separado (sin
+    crear DataFrames).
+
+    Args:
+        collection (SpectraCollection): Los espectros cargados.
+        processing_steps: ProcessingPipeline, o el diccionario clásico de pasos.
+        indices (list): Índices a procesar; por defecto, todos.
+        roi (tuple): Región de interés (mínimo, máximo). Solo se procesan los
+                     puntos de dentro, lo que abarata mucho airPLS.
+        max_workers (int): Procesos para airPLS en pilas grandes.
+        cache (ResultCache): Si se pasa, los espectros ya procesados con la misma
+                             cadena y ROI se toman de ella y solo se calcula el resto.
+        warm_start (WarmStartCache): Si se pasa, airPLS arranca desde los pesos
+                                     convergidos de la ejecución anterior de cada
+                                     espectro y guarda los nuevos. El resumen de
+                                     iteraciones queda en warm_start.last_report.
+
+    Returns:
+        int: Número de espectros servidos desde la caché.
+    """
+    if indices is None:
+        indices = list(range(len(collection)))
+    if not len(indices):
+        return 0
+    pipeline = as_pipeline(processing_steps)
+
+    hits = 0
+    if cache is not None:
+        pipeline_key = (pipeline.key(), roi)
+        keys = {i: (collection.content_key(i), pipeline_key) for i in indices}
+        cached = [(i, cache.get(keys[i])) for i in indices]
+        cached = [(i, result) for i, result in cached if result is not None]
+        if cached:
+            hits = len(cached)
+            collection.set_processed([i for i, _ in cached], [result for _, result in cached])
+            done = {i for i, _ in cached}
+            indices = [i for i in indices if i not in done]
+        if not indices:
+            return hits
+
+    run = None
+    if warm_start is not None:
+        run = warm_start.prepare([collection.content_key(i) for i in indices], pipeline, roi)
+    if collection.is_aligned:
+        processed = process_stack(collection.raw_matrix()[indices], collection.shared_wavelength, pipeline, roi,
+                                  max_workers, run)
+        runs = [run]
+    else:
+        runs = [None if run is None else run.rows(k, k + 1) for k in range(len(indices))]
+        processed = [process_stack(collection.raw(i), collection.wavelength(i), pipeline, roi, warm_start=row_run)[0]
+                     for i, row_run in zip(indices, runs)]
+    collection.set_processed(indices, processed)
+    if warm_start is not None:
+        for row_run in runs:
+            warm_start.save(row_run)
+        warm_start.last_report = describe_iterations(runs)
 
-    # Primero aplicamos la normalización si se solicita (para Luminiscencia)
-    if processing_steps.get('normalize'):
-        max_intensity = df['intensity'].max()
-        if max_intensity > 0:
-            df['intensity'] = df['intensity'] / max_intensity
-
-    # Luego aplicamos el método principal (corrección o suavizado)
-    method = processing_steps.get('method')
-    params = processing_steps.get('params', {})
-
-    if method == 'min':
-        baseline = df['intensity'].min()
-        df['intensity'] -= baseline
-    
-    elif method == 'airpls':
-        intensity_array = df['intensity'].to_numpy()
-        baseline, _ = airpls(intensity_array, **params)
-        df['intensity'] -= baseline
-
-    elif method == 'moving_average':
-        df['intensity'] = df['intensity'].rolling(window=params.get('window', 5), center=True, min_periods=1).mean()
-
-    elif method == 'savgol':
-        # --- ARREGLO AQUÍ: Usamos los nombres de parámetro correctos ---
-        window_length = params.get('window', 11)
-        polyorder = params.get('order', 2)
-        if window_length > polyorder:
-            df['intensity'] = savgol_filter(df['intensity'], window_length=window_length, polyorder=polyorder)
-
-    return df
\ No newline at end of file
+    if cache is not None:
+        for i, result in zip(indices, processed):
+            cache.put(keys[i], result)
+    return hits
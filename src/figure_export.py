@@ -0,0 +1,222 @@
+# spectraconverter_v4/src/figure_export.py
+#
+# Imágenes de espectros para informes, sin pantalla: una figura PNG o SVG por
+# espectro y, si se piden, otras con los espectros de cada grupo superpuestos.
+# Se dibujan con Agg en procesos aparte, con el mismo aspecto que la gráfica
+# de la interfaz (plot_style) pero sin importar tkinter ni pyplot.
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from .data_loader import default_workers
+from .plot_lod import DecimatedLine
+from .plot_style import FIGURE_DPI, FIGURE_SIZE, line_color, style_axes, y_magnitudes
+from .roi import crop
+from .spectra_collection import SpectraCollection
+
+IMAGE_FORMATS = ('png', 'svg')
+
+# Tandas por proceso: figuras de más para repartir bien la carga, pero cada
+# tanda reutiliza la misma figura en todas sus imágenes.
+BATCHES_PER_WORKER = 4
+
+# Caracteres que no pueden ir en un nombre de archivo (Windows es el más estricto).
+_UNSAFE_CHARACTERS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def group_indices(filenames, indices=None, pattern=None):
+    """
+    Agrupa espectros para las imágenes superpuestas.
+
+    Args:
+        filenames (list): Nombres de todos los espectros.
+        indices (list): Espectros que se tienen en cuenta; por defecto, todos.
+        pattern (str): Expresión regular que se busca en cada nombre; la
+                       clave del grupo es su primer grupo de captura (o todo
+                       lo que encaja si no tiene). Los espectros que no
+                       encajan no van a ningún grupo. Sin patrón, se agrupan
+                       los canales de un mismo archivo.
+
+    Returns:
+        dict: Clave -> lista de índices, solo grupos de al menos dos espectros
+              (una superposición de uno repetiría su imagen individual).
+
+    Raises:
+        ValueError: Si el patrón no es una expresión regular válida.
+    """
+    if indices is None:
+        indices = range(len(filenames))
+    try:
+        regex = re.compile(pattern) if pattern else None
+    except re.error as e:
+        raise ValueError(f"Patrón de grupos no válido: {e}")
+    groups = {}
+    for index in indices:
+        if regex is None:
+            key = SpectraCollection.source_name(filenames[index])
+        else:
+            match = regex.search(filenames[index])
+            if match is None:
+                continue
+            key = match.group(1) if regex.groups else match.group(0)
+        groups.setdefault(key, []).append(index)
+    return {key: members for key, members in groups.items() if len(members) > 1}
+
+
+def image_filename(name, fmt, taken):
+    """Nombre de archivo seguro y no repetido (en `taken`, sin distinguir mayúsculas)."""
+    base = _UNSAFE_CHARACTERS.sub('_', name).strip(' .') or 'espectro'
+    candidate, n = f"{base}.{fmt}", 2
+    while candidate.lower() in taken:
+        candidate, n = f"{base}_{n}.{fmt}", n + 1
+    taken.add(candidate.lower())
+    return candidate
+
+
+def _render_batch(jobs, fmt, use_processed, dpi):
+    """
+    Tarea del pool: dibuja una tanda de imágenes reutilizando una sola figura.
+
+    Cada trabajo es (ruta, título, [(etiqueta, color, x, y), ...]). Entre
+    imagen e imagen solo se cambian líneas, leyenda y título: vaciar los ejes
+    obligaría a recrear todas las marcas. En PNG las líneas largas se diezman
+    a la resolución de la imagen (DecimatedLine, sin diferencia visible); en
+    SVG van completas, porque el vectorial se puede ampliar. tight_layout solo
+    se repite si cambia lo que mueve los márgenes.
+    """
+    fig = Figure(figsize=FIGURE_SIZE, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    style_axes(ax, use_processed)
+    layout_key = None
+    for path, title, lines in jobs:
+        for line in ax.get_lines():
+            line.remove()
+        for label, color, x, y in lines:
+            if fmt == 'png':
+                ax.add_line(DecimatedLine(x, y, label=label, color=color))
+            else:
+                ax.add_line(Line2D(x, y, label=label, color=color))
+        ax.relim()
+        ax.autoscale_view()
+        ax.set_title(title or '')
+        ax.legend()
+        key = (bool(title), y_magnitudes(ax))
+        if key != layout_key:
+            layout_key = key
+            try:
+                fig.tight_layout()
+            except Exception as e:
+                print(f"Advertencia de Matplotlib: No se pudo aplicar tight_layout. {e}")
+            # tight_layout deja un motor de composición que haría a savefig
+            # dibujar la figura dos veces; los márgenes ya están aplicados.
+            fig.set_layout_engine(None)
+        fig.savefig(path, format=fmt)
+    return len(jobs)
+
+
+def image_jobs(collection, output_dir, fmt='png', indices=None, use_processed=False, roi=None, groups=None,
+               single=True):
+    """
+    Imágenes que hay que dibujar, con copias de los datos: la colección puede
+    cambiar (vigilancia de carpeta) mientras se dibujan en otro hilo.
+
+    Args:
+        collection (SpectraCollection): Los espectros.
+        output_dir (str): Carpeta de destino.
+        fmt (str): 'png' o 'svg'.
+        indices (list): Espectros con imagen propia; por defecto, todos.
+        use_processed (bool): Dibujar los datos procesados cuando existan.
+        roi (tuple): Región de interés; solo se dibujan esos puntos.
+        groups (dict): Clave -> índices (p. ej. de group_indices): una imagen
+                       más por grupo con sus espectros superpuestos.
+        single (bool): Si es False, solo se dibujan las imágenes de grupo.
+
+    Returns:
+        list: Trabajos (ruta, título, [(etiqueta, color, x, y), ...]) para render_image_jobs.
+    """
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"Formato de imagen desconocido: '{fmt}'. Usa {' o '.join(IMAGE_FORMATS)}.")
+    if indices is None:
+        indices = range(len(collection))
+    indices = list(indices) if single else []
+    groups = groups or {}
+    data = {}
+    for index in set(indices).union(*groups.values()):
+        x, y = crop(collection.wavelength(index), collection.intensity(index, use_processed), roi)
+        data[index] = np.array(x), np.array(y)
+
+    # Mismos colores que en la gráfica de la interfaz: el índice del espectro
+    # en la imagen individual y el orden dentro del grupo en la superpuesta.
+    taken, jobs = set(), []
+    for index in indices:
+        name = collection.filenames[index]
+        jobs.append((os.path.join(output_dir, image_filename(name, fmt, taken)), None,
+                     [(name, line_color(index), *data[index])]))
+    for key, members in groups.items():
+        lines = [(collection.filenames[index], line_color(k), *data[index]) for k, index in enumerate(members)]
+        jobs.append((os.path.join(output_dir, image_filename(f"grupo_{key}", fmt, taken)), str(key), lines))
+    return jobs
+
+
+def render_image_jobs(jobs, fmt='png', use_processed=False, dpi=FIGURE_DPI, max_workers=None, progress_callback=None,
+                      cancel_event=None):
+    """
+    Dibuja y guarda los trabajos de image_jobs, repartidos en tandas entre procesos.
+
+    Args:
+        dpi (int): Resolución de los PNG.
+        max_workers (int): Procesos; por defecto, todos los núcleos menos uno.
+        progress_callback (callable): Se llama como progress_callback(guardadas, total).
+        cancel_event (threading.Event): Si se activa, se descartan las tandas pendientes.
+
+    Returns:
+        list: Rutas de las imágenes guardadas, o None si se canceló.
+    """
+    if max_workers is None:
+        max_workers = default_workers()
+    if not jobs:
+        return []
+    for directory in {os.path.dirname(path) for path, _, _ in jobs}:
+        os.makedirs(directory or '.', exist_ok=True)
+
+    n_batches = min(len(jobs), max_workers * BATCHES_PER_WORKER if max_workers > 1 else 1)
+    batches = [[jobs[i] for i in batch] for batch in np.array_split(np.arange(len(jobs)), n_batches)]
+    done = 0
+    if max_workers <= 1 or n_batches <= 1:
+        for batch in batches:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            done += _render_batch(batch, fmt, use_processed, dpi)
+            if progress_callback:
+                progress_callback(done, len(jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, n_batches)) as executor:
+            futures = [executor.submit(_render_batch, batch, fmt, use_processed, dpi) for batch in batches]
+            for future in as_completed(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return None
+                done += future.result()
+                if progress_callback:
+                    progress_callback(done, len(jobs))
+    return [path for path, _, _ in jobs]
+
+
+def render_images(collection, output_dir, fmt='png', indices=None, use_processed=False, roi=None, groups=None,
+                  single=True, dpi=FIGURE_DPI, max_workers=None, progress_callback=None, cancel_event=None):
+    """
+    Guarda imágenes de espectros de una SpectraCollection (image_jobs +
+    render_image_jobs; ver allí los argumentos).
+
+    Returns:
+        list: Rutas de las imágenes guardadas, o None si se canceló.
+    """
+    jobs = image_jobs(collection, output_dir, fmt, indices, use_processed, roi, groups, single)
+    return render_image_jobs(jobs, fmt, use_processed, dpi, max_workers, progress_callback, cancel_event)
@@ -0,0 +1,70 @@
+# spectraconverter_v4/src/folder_watcher.py
+
+import os
+
+from .data_loader import SPECTRUM_EXTENSIONS
+
+
+class FolderWatcher:
+    """
+    Vigila una carpeta por sondeo y detecta archivos de espectro nuevos o modificados.
+
+    Un archivo solo se da por listo cuando su tamaño y fecha de modificación no
+    han cambiado entre dos sondeos seguidos; así no se parsean archivos que el
+    espectrómetro todavía está escribiendo.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self._known = {}      # ruta -> (tamaño, mtime_ns) ya entregada
+        self._candidates = {}  # ruta -> (tamaño, mtime_ns) vista en el sondeo anterior
+
+    def _scan(self):
+        signatures = {}
+        try:
+            with os.scandir(self.folder_path) as it:
+                for entry in it:
+                    if not entry.name.lower().endswith(SPECTRUM_EXTENSIONS):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    signatures[entry.path] = (st.st_size, st.st_mtime_ns)
+        except OSError as e:
+            print(f"Aviso: No se pudo leer la carpeta vigilada {self.folder_path}: {e}")
+        return signatures
+
+    def prime(self, file_paths=None):
+        """
+        Marca como ya conocidos los archivos indicados (o todos los actuales),
+        normalmente los que se acaban de cargar.
+        """
+        signatures = self._scan()
+        if file_paths is not None:
+            wanted = {os.path.normcase(os.path.abspath(p)) for p in file_paths}
+            signatures = {p: s for p, s in signatures.items() if os.path.normcase(os.path.abspath(p)) in wanted}
+        self._known.update(signatures)
+        self._candidates.clear()
+
+    def poll(self):
+        """
+        Devuelve dos listas ordenadas: (rutas nuevas, rutas modificadas) que
+        están listas para parsear desde el último sondeo.
+        """
+        signatures = self._scan()
+        new_paths, modified_paths = [], []
+        candidates = {}
+        for path, signature in signatures.items():
+            if self._known.get(path) == signature:
+                continue
+            if self._candidates.get(path) == signature:
+                # Estable desde el sondeo anterior: lo entregamos.
+                (modified_paths if path in self._known else new_paths).append(path)
+                self._known[path] = signature
+            else:
+                candidates[path] = signature
+        self._candidates = candidates
+        return sorted(new_paths), sorted(modified_paths)
@@ -0,0 +1,170 @@
+# spectraconverter_v4/src/parameter_sweep.py
+#
+# Barrido de parámetros de airPLS: prueba una lista de valores de lam sobre
+# los espectros seleccionados y puntúa cada uno con una medida barata de los
+# residuos, para elegir la suavidad sin ir probando a mano. p no se barre: la
+# reponderación de airPLS (pybaselines_local._reweight) no lo usa.
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .data_loader import default_workers
+from .data_processor import ResultCache
+from .pybaselines_local import airpls_batch, penalty_bands
+from .resampling import distinct_axes
+from .roi import roi_index
+
+DEFAULT_LAMS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+# Peso de la rugosidad frente al desbordamiento en la puntuación: una línea
+# base suave (rugosidad ~1) pesa como un desbordamiento del 0.1 % del rango.
+DEFAULT_ROUGHNESS_WEIGHT = 1e-3
+
+# Un valor de lam con su puntuación media sobre los espectros (menor es
+# mejor) y las dos partes que la componen.
+SweepPoint = namedtuple('SweepPoint', ['lam', 'score', 'overshoot', 'roughness'])
+
+
+def parse_values(text):
+    """Interpreta una lista de valores escrita por el usuario, p. ej. "1e4 1e5, 1e6"."""
+    values = [float(v) for v in text.replace(';', ' ').replace(',', ' ').split()]
+    if not values:
+        raise ValueError("Escribe al menos un valor.")
+    return values
+
+
+def score_baselines(data, baselines):
+    """
+    Medida barata de la calidad de unas líneas base (una fila por espectro).
+
+    - Desbordamiento: RMS de la parte en que la línea base queda por encima
+      de la señal, relativo al rango de la señal. airPLS debería ir siempre
+      por debajo; crece si lam es tan grande que la base no sigue la curvatura.
+    - Rugosidad: curvatura RMS de la línea base con el eje reescalado a [0, 1]
+      y la intensidad al rango de la señal. Una curva suave que cruza el
+      espectro da valores del orden de 1; una base que sigue picos estrechos
+      (lam demasiado pequeño, se come los picos), de cientos o miles.
+
+    Returns:
+        np.ndarray: Array (2, n_espectros) con desbordamiento y rugosidad.
+    """
+    residual = data - baselines
+    scale = np.ptp(data, axis=1)
+    scale[scale == 0] = 1
+    overshoot = np.sqrt(np.mean(np.minimum(residual, 0) ** 2, axis=1)) / scale
+    # La segunda diferencia con paso 1/(n-1) es la curvatura por (n-1)².
+    n_points = data.shape[1]
+    roughness = np.sqrt(np.mean(np.diff(baselines, 2, axis=1) ** 2, axis=1)) * (n_points - 1) ** 2 / scale
+    return np.vstack((overshoot, roughness))
+
+
+def _sweep_task(stack, penalty, lam, max_iter, tol):
+    """Tarea del pool: airPLS con un valor de lam sobre una pila y sus puntuaciones."""
+    baselines, _ = airpls_batch(stack, lam, max_iter=max_iter, tol=tol, penalty=penalty)
+    return score_baselines(stack, baselines)
+
+
+def sweep_airpls(spectra, lams=DEFAULT_LAMS, roi=None, max_iter=50, tol=1e-3, max_workers=None,
+                 cache=None, roughness_weight=DEFAULT_ROUGHNESS_WEIGHT, cancel_event=None):
+    """
+    Evalúa airPLS con cada valor de lams sobre unos espectros.
+
+    Los espectros que comparten eje se resuelven juntos (airpls_batch) y la
+    penalización D'D de cada eje se calcula una vez y se reutiliza con todos
+    los valores, que se reparten entre procesos.
+
+    Args:
+        spectra (list): Tuplas (clave, wavelength, intensity); la clave
+                        identifica el contenido (SpectraCollection.content_key).
+        lams (list): Valores de lam a probar.
+        roi (tuple): Región de interés; solo se evalúan los puntos de dentro.
+        max_workers (int): Procesos; por defecto, todos los núcleos menos uno.
+        cache (ResultCache): Puntuaciones ya calculadas por espectro y valor de lam.
+                             Al añadir valores solo se calculan los nuevos.
+        roughness_weight (float): Peso de la rugosidad en la puntuación.
+        cancel_event (threading.Event): Si se activa, se devuelve None.
+
+    Returns:
+        tuple: (lista de SweepPoint ordenada de mejor a peor, número de
+                pares espectro-lam que hubo que calcular)
+    """
+    if max_workers is None:
+        max_workers = default_workers()
+    if cache is None:
+        cache = ResultCache()
+    lams = [float(lam) for lam in lams]
+
+    # Cada espectro se recorta a la ROI y se agrupa con los que comparten eje.
+    cropped = []
+    for key, wavelength, intensity in spectra:
+        selection = roi_index(wavelength, roi)
+        cropped.append((key, np.asarray(wavelength)[selection], np.asarray(intensity, dtype=np.float64)[selection]))
+    cropped = [item for item in cropped if len(item[1]) >= 3]
+    axes, owner = distinct_axes([wavelength for _, wavelength, _ in cropped])
+
+    def cache_key(key, lam):
+        return (key, roi, lam, max_iter, tol)
+
+    # Tareas: por cada eje y valor de lam, solo los espectros que no están en caché.
+    scores = {}
+    tasks = []
+    for group, axis in enumerate(axes):
+        rows = [i for i, g in enumerate(owner) if g == group]
+        penalty = penalty_bands(len(axis), 1.0)
+        for lam in lams:
+            missing = []
+            for i in rows:
+                key = cache_key(cropped[i][0], lam)
+                scores[key] = cache.get(key)
+                if scores[key] is None:
+                    missing.append(i)
+            if missing:
+                stack = np.array([cropped[i][2] for i in missing])
+                tasks.append((missing, lam, (stack, penalty, lam, max_iter, tol)))
+
+    n_computed = sum(len(missing) for missing, *_ in tasks)
+    if max_workers <= 1 or len(tasks) <= 1:
+        for missing, lam, args in tasks:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            _store(cache, scores, [cache_key(cropped[i][0], lam) for i in missing], _sweep_task(*args))
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+            futures = [(missing, lam, executor.submit(_sweep_task, *args)) for missing, lam, args in tasks]
+            for missing, lam, future in futures:
+                if cancel_event is not None and cancel_event.is_set():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return None
+                _store(cache, scores, [cache_key(cropped[i][0], lam) for i in missing], future.result())
+
+    points = []
+    for lam in lams:
+        point_scores = np.array([scores[cache_key(key, lam)] for key, _, _ in cropped])
+        if not len(point_scores):
+            continue
+        overshoot, roughness = point_scores.mean(axis=0)
+        points.append(SweepPoint(lam, overshoot + roughness_weight * roughness, overshoot, roughness))
+    points.sort(key=lambda point: point.score)
+    return points, n_computed
+
+
+def _store(cache, scores, keys, computed):
+    for key, column in zip(keys, computed.T):
+        scores[key] = column
+        cache.put(key, column)
+
+
+def collection_sweep_inputs(collection, indices):
+    """Entradas de sweep_airpls a partir de una SpectraCollection (copias de los datos crudos)."""
+    return [(collection.content_key(i), collection.wavelength(i), np.array(collection.raw(i))) for i in indices]
+
+
+def format_sweep_table(points, limit=None):
+    """Tabla de texto con los mejores valores, para la consola."""
+    lines = [f"{'lam':>10} {'puntuación':>11} {'desbordam.':>11} {'rugosidad':>10}"]
+    for point in points[:limit]:
+        lines.append(f"{point.lam:>10.3g} {point.score:>11.4g} "
+                     f"{point.overshoot:>11.3e} {point.roughness:>10.3e}")
+    return "\n".join(lines)
@@ -0,0 +1,146 @@
+# spectraconverter_v4/src/parse_cache.py
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# Cambiar este número invalida todas las entradas guardadas (p. ej. si cambia el parser).
+CACHE_VERSION = 4
+
+# Variable de entorno que, si tiene cualquier valor no vacío, desactiva la caché.
+DISABLE_ENV_VAR = 'SPECTRACONVERTER_NO_CACHE'
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+ENTRY_EXTENSION = '.npy'
+
+
+def default_cache_dir():
+    """
+    Carpeta de caché por usuario: %LOCALAPPDATA%\\SpectraConverter\\cache en Windows
+    y $XDG_CACHE_HOME/spectraconverter (o ~/.cache/spectraconverter) en el resto.
+    """
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+        return os.path.join(base, 'SpectraConverter', 'cache')
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'spectraconverter')
+
+
+class ParseCache:
+    """
+    Caché en disco de espectros ya parseados.
+
+    Cada archivo se identifica por su ruta absoluta, tamaño, fecha de modificación,
+    región de interés y precisión de almacenamiento; si cualquiera cambia, la
+    entrada deja de coincidir. Cada entrada es un archivo con tres arrays .npy
+    seguidos: la longitud de onda, las intensidades (n_canales, n) y el número
+    de filas que descartó la ROI, cada uno en la precisión con la que se guarda
+    en memoria (en float32 ocupan la mitad también en disco). La fecha de
+    modificación de cada entrada se actualiza al leerla, de modo que la
+    limpieza por tamaño elimina primero las menos usadas recientemente (LRU).
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, enabled=True, dtype=np.float64):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.enabled = enabled and not os.environ.get(DISABLE_ENV_VAR)
+        self.dtype = np.dtype(dtype)
+
+    def settings(self):
+        """Parámetros necesarios para reconstruir la caché en otro proceso."""
+        return {'cache_dir': self.cache_dir, 'max_bytes': self.max_bytes, 'enabled': self.enabled,
+                'dtype': self.dtype.name}
+
+    def _entry_path(self, file_path, stat_result, roi=None):
+        key_source = (f"{CACHE_VERSION}|{os.path.abspath(file_path)}|{stat_result.st_size}|"
+                      f"{stat_result.st_mtime_ns}|{roi!r}|{self.dtype.name}")
+        key = hashlib.sha1(key_source.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + ENTRY_EXTENSION)
+
+    def get(self, file_path, roi=None):
+        """
+        Devuelve (wavelength, intensities, rows_dropped) guardados para file_path
+        con esa ROI, o None si no está en caché (o si la caché está desactivada).
+        """
+        if not self.enabled:
+            return None
+        try:
+            entry_path = self._entry_path(file_path, os.stat(file_path), roi)
+            with open(entry_path, 'rb') as f:
+                wavelength = np.load(f, allow_pickle=False)
+                intensities = np.load(f, allow_pickle=False)
+                rows_dropped = int(np.load(f, allow_pickle=False))
+        except (OSError, ValueError):
+            return None
+
+        try:
+            # Marcamos la entrada como usada recientemente para la política LRU.
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return wavelength, intensities, rows_dropped
+
+    def put(self, file_path, parsed, roi=None):
+        """
+        Guarda el resultado de data_parser.parse_spectrum_channels, es decir
+        (wavelength, intensities, rows_dropped). Si no se puede escribir, solo se avisa.
+        """
+        if not self.enabled or parsed is None:
+            return
+        wavelength, intensities, rows_dropped = parsed
+        try:
+            entry_path = self._entry_path(file_path, os.stat(file_path), roi)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Escribimos en un temporal y lo renombramos para que otro proceso
+            # nunca pueda leer una entrada a medio escribir.
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, wavelength, allow_pickle=False)
+                np.save(f, np.asarray(intensities, dtype=self.dtype), allow_pickle=False)
+                np.save(f, np.int64(rows_dropped), allow_pickle=False)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            print(f"Aviso: No se pudo guardar {os.path.basename(file_path)} en la caché: {e}")
+
+    def _entries(self):
+        try:
+            with os.scandir(self.cache_dir) as it:
+                return [entry for entry in it if entry.name.endswith(ENTRY_EXTENSION) and entry.is_file()]
+        except OSError:
+            return []
+
+    def enforce_limit(self):
+        """Elimina las entradas menos usadas hasta que la caché quepa en max_bytes."""
+        if not self.enabled:
+            return
+        entries = []
+        total = 0
+        for entry in self._entries():
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+            total += st.st_size
+
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """Vacía la caché por completo."""
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,267 @@
+# spectraconverter_v4/src/plot_lod.py
+#
+# Nivel de detalle para dibujar espectros largos: en pantalla solo caben unos
+# cientos de columnas de píxeles, así que a Agg se le entregan solo los puntos
+# que determinan cómo se ve la línea en cada columna (el primero, el último,
+# el mínimo y el máximo, algoritmo M4). Así los picos se ven exactamente igual
+# a resolución de pantalla y se dibujan unos pocos miles de vértices por línea
+# en lugar de cientos de miles. Se recalcula al hacer zoom o desplazar la vista.
+
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+# Por debajo de estos puntos la línea se dibuja completa.
+LOD_MIN_POINTS = 5000
+# Solo se diezma si hay más de estos puntos por píxel en la vista (M4 deja
+# hasta 4 por subcolumna).
+LOD_POINTS_PER_COLUMN = 8
+# Columnas de diezmado por píxel. M4 es exacto para líneas de un píxel; con el
+# grosor por defecto (1.4 px a 100 ppp) el trazo de un punto descartado invade
+# la columna vecina. Con 2 por píxel esas diferencias quedan en píxeles sueltos
+# del borde de las zonas más densas (~0.1 % de la imagen); más subcolumnas
+# las reducen poco y encarecen el dibujo.
+LOD_SUBCOLUMNS = 2
+# Columnas de la versión inicial, antes de conocer el tamaño de la gráfica.
+OVERVIEW_COLUMNS = 2048
+
+
+def minmax_indices(pixel, y):
+    """
+    Índices de los puntos que fijan el aspecto de la línea en cada columna de
+    píxeles: primero, último, mínimo y máximo (algoritmo M4).
+
+    Args:
+        pixel (np.ndarray): Columna de cada punto, no decreciente.
+        y (np.ndarray): Valores, sin NaN.
+
+    Returns:
+        np.ndarray: Índices crecientes en pixel/y.
+    """
+    starts = np.flatnonzero(np.r_[True, pixel[1:] != pixel[:-1]])
+    ends = np.r_[starts[1:], len(pixel)] - 1
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(pixel)]))
+    arg_min = _first_in_group(y == np.minimum.reduceat(y, starts)[group], group)
+    arg_max = _first_in_group(y == np.maximum.reduceat(y, starts)[group], group)
+    # Las columnas van en orden: basta ordenar los cuatro índices de cada una.
+    indices = np.sort(np.column_stack((starts, arg_min, arg_max, ends)), axis=1).ravel()
+    return indices[np.r_[True, indices[1:] != indices[:-1]]]
+
+
+def _first_in_group(mask, group):
+    """Primer índice de cada grupo en que mask es cierto (los grupos son contiguos)."""
+    matches = np.flatnonzero(mask)
+    groups = group[matches]
+    return matches[np.r_[True, groups[1:] != groups[:-1]]]
+
+
+def _summary_indices(y, start, stop):
+    """Primero, último, mínimo y máximo de y[start:stop] (tramo fuera de la vista)."""
+    if stop <= start:
+        return np.empty(0, dtype=np.int64)
+    part = y[start:stop]
+    return np.array([start, stop - 1, start + np.argmin(part), start + np.argmax(part)])
+
+
+def decimate_for_view(x, y, view, pixel_bounds):
+    """
+    Índices de los puntos que hay que dibujar para una vista.
+
+    Dentro de la vista se conservan los puntos M4 de cada subcolumna de píxeles,
+    más el vecino de fuera a cada lado para que la línea llegue al borde.
+    Fuera de ella basta un resumen de cada lado (extremos, mínimo y máximo)
+    para que el autoescalado siga viendo todo el rango de datos.
+
+    Args:
+        x (np.ndarray): Eje creciente, sin NaN.
+        y (np.ndarray): Valores, sin NaN.
+        view (tuple): Límites del eje X visibles (pueden estar invertidos).
+        pixel_bounds (tuple): Posición en píxeles de pantalla de esos dos límites.
+
+    Returns:
+        np.ndarray: Índices crecientes en x/y.
+    """
+    n_points = len(x)
+    low, high = min(view), max(view)
+    first, last = np.searchsorted(x, low, 'left'), np.searchsorted(x, high, 'right')
+    start, stop = max(first - 1, 0), min(last + 1, n_points)
+    n_columns = abs(pixel_bounds[1] - pixel_bounds[0])
+    if high <= low or last - first <= LOD_POINTS_PER_COLUMN * max(n_columns, 1):
+        inside = np.arange(start, stop)
+    else:
+        scale = LOD_SUBCOLUMNS * (pixel_bounds[1] - pixel_bounds[0]) / (view[1] - view[0])
+        pixel = np.floor(LOD_SUBCOLUMNS * pixel_bounds[0] + (x[first:last] - view[0]) * scale).astype(np.int64)
+        if scale < 0:
+            pixel = -pixel  # Eje invertido: las columnas decrecen con x.
+        inside = np.concatenate((np.arange(start, first), first + minmax_indices(pixel, y[first:last]),
+                                 np.arange(last, stop)))
+    return np.unique(np.concatenate((_summary_indices(y, 0, start), inside, _summary_indices(y, stop, n_points))))
+
+
+def can_decimate(x, y):
+    """Solo se diezman líneas largas con eje creciente y sin NaN (lo normal en un espectro)."""
+    return (len(x) > LOD_MIN_POINTS and len(x) == len(y) and np.all(np.isfinite(x)) and np.all(np.isfinite(y))
+            and np.all(np.diff(x) >= 0))
+
+
+def overview_indices(x, y):
+    """Diezmado de todo el rango, antes de conocer el tamaño de la gráfica."""
+    return decimate_for_view(x, y, (x[0], x[-1]), (0, OVERVIEW_COLUMNS))
+
+
+def view_key(axes):
+    """Límites X visibles y su posición en píxeles, o None si la escala no es lineal."""
+    if axes.get_xscale() != 'linear':
+        return None
+    view = tuple(axes.get_xlim())
+    return view, tuple(axes.transData.transform([(view[0], 0), (view[1], 0)])[:, 0])
+
+
+class DecimatedLine(Line2D):
+    """
+    Línea que guarda todos sus puntos pero solo entrega al renderizador los
+    necesarios para la vista actual. El diezmado se recalcula al dibujar si
+    han cambiado los límites o el tamaño en píxeles de la gráfica.
+
+    Para cambiar los datos hay que usar set_full_data; get_xdata/get_ydata
+    devuelven los puntos diezmados.
+    """
+
+    def __init__(self, x, y, **kwargs):
+        super().__init__([], [], **kwargs)
+        self.set_full_data(x, y)
+
+    def set_full_data(self, x, y):
+        self._full_x, self._full_y = np.asarray(x), np.asarray(y)
+        self._lod_key = None
+        self._lod_enabled = can_decimate(self._full_x, self._full_y)
+        if self._lod_enabled:
+            self._set_decimated(overview_indices(self._full_x, self._full_y))
+        else:
+            super().set_data(self._full_x, self._full_y)
+
+    def get_full_data(self):
+        return self._full_x, self._full_y
+
+    def _set_decimated(self, indices):
+        super().set_data(self._full_x[indices], self._full_y[indices])
+
+    def _update_lod(self):
+        key = view_key(self.axes)
+        if key == self._lod_key:
+            return
+        self._lod_key = key
+        if key is None:
+            super().set_data(self._full_x, self._full_y)
+        else:
+            self._set_decimated(decimate_for_view(self._full_x, self._full_y, *key))
+
+    def draw(self, renderer):
+        if self._lod_enabled and self.axes is not None and self.get_visible():
+            self._update_lod()
+        super().draw(renderer)
+
+
+class DecimatedLineCollection(LineCollection):
+    """
+    Muchas líneas en un solo artista: con cientos de espectros, un
+    LineCollection se crea y se dibuja más deprisa que un Line2D por espectro.
+    Cada línea se diezma igual que DecimatedLine; las ocultas no se entregan
+    al renderizador. Se accede a cada línea con CollectionLine.
+    """
+
+    def __init__(self, **kwargs):
+        # Mismos remates que Line2D, para que las líneas se vean igual.
+        kwargs.setdefault('capstyle', rcParams['lines.solid_capstyle'])
+        kwargs.setdefault('joinstyle', rcParams['lines.solid_joinstyle'])
+        super().__init__([], **kwargs)
+        self._lines = []  # [x, y, diezmable, visible, color, límites]
+        self._lod_key = None
+        self._segments_valid = False
+
+    def add_line(self, x, y, color):
+        self._lines.append([None, None, False, True, color, None])
+        self.set_line_data(len(self._lines) - 1, x, y)
+        return len(self._lines) - 1
+
+    def set_line_data(self, index, x, y):
+        x, y = np.asarray(x), np.asarray(y)
+        limits = None
+        if len(x) and np.any(np.isfinite(x)) and np.any(np.isfinite(y)):
+            limits = (np.nanmin(x), np.nanmin(y), np.nanmax(x), np.nanmax(y))
+        self._lines[index][:3] = x, y, can_decimate(x, y)
+        self._lines[index][5] = limits
+        self._invalidate()
+
+    def line_data(self, index):
+        return self._lines[index][0], self._lines[index][1]
+
+    def set_line_visible(self, index, is_visible):
+        if self._lines[index][3] != is_visible:
+            self._lines[index][3] = is_visible
+            self._invalidate()
+
+    def line_visible(self, index):
+        return self._lines[index][3]
+
+    def data_limits(self):
+        """Límites (xmin, ymin, xmax, ymax) de las líneas visibles, o None si no hay ninguna."""
+        limits = np.array([line[5] for line in self._lines if line[3] and line[5] is not None])
+        if not len(limits):
+            return None
+        return (*limits[:, :2].min(axis=0), *limits[:, 2:].max(axis=0))
+
+    def _invalidate(self):
+        self._segments_valid = False
+        self.stale = True
+
+    def _update_segments(self):
+        key = view_key(self.axes)
+        if self._segments_valid and key == self._lod_key:
+            return
+        self._segments_valid, self._lod_key = True, key
+        segments, colors = [], []
+        for x, y, lod_enabled, is_visible, color, _ in self._lines:
+            if not is_visible:
+                continue
+            if lod_enabled and key is not None:
+                indices = decimate_for_view(x, y, *key)
+                x, y = x[indices], y[indices]
+            segments.append(np.column_stack((x, y)))
+            colors.append(color)
+        self.set_segments(segments)
+        self.set_color(colors)
+
+    def draw(self, renderer):
+        if self.axes is not None:
+            self._update_segments()
+        super().draw(renderer)
+
+
+class CollectionLine:
+    """
+    Una línea de un DecimatedLineCollection con la parte de la interfaz de
+    DecimatedLine que usa la gráfica. Para la leyenda lleva un Line2D vacío
+    con su color y su nombre.
+    """
+
+    def __init__(self, collection, x, y, label, color):
+        self.collection = collection
+        self.index = collection.add_line(x, y, color)
+        self.legend_proxy = Line2D([], [], color=color, label=label)
+
+    def set_full_data(self, x, y):
+        self.collection.set_line_data(self.index, x, y)
+
+    def get_full_data(self):
+        return self.collection.line_data(self.index)
+
+    def set_visible(self, is_visible):
+        self.collection.set_line_visible(self.index, is_visible)
+
+    def get_visible(self):
+        return self.collection.line_visible(self.index)
+
+    def get_label(self):
+        return self.legend_proxy.get_label()
@@ -0,0 +1,41 @@
+# spectraconverter_v4/src/plot_style.py
+#
+# Aspecto común de las gráficas de espectros: lo comparten la gráfica de la
+# interfaz (data_plotter) y el renderizado de imágenes sin pantalla
+# (figure_export), que no puede importar tkinter.
+
+import numpy as np
+from matplotlib import rcParams
+
+FIGURE_SIZE = (7, 5)
+FIGURE_DPI = 100
+X_LABEL = "Longitud de onda (nm)"
+
+
+def y_label(use_processed):
+    return "Intensidad (procesado)" if use_processed else "Intensidad (crudo)"
+
+
+def style_grid(ax):
+    ax.grid(True, linestyle='--', alpha=0.6)
+
+
+def style_axes(ax, use_processed):
+    """Rejilla y etiquetas de los ejes, como en la gráfica de la interfaz."""
+    style_grid(ax)
+    ax.set_xlabel(X_LABEL)
+    ax.set_ylabel(y_label(use_processed))
+
+
+def line_color(index):
+    """Color de la línea número index: el mismo ciclo que usa ax.plot."""
+    colors = rcParams['axes.prop_cycle'].by_key()['color']
+    return colors[index % len(colors)]
+
+
+def y_magnitudes(ax):
+    """
+    Orden de magnitud y signo de los límites Y: lo que decide la anchura de
+    las marcas del eje, y con ella los márgenes de tight_layout.
+    """
+    return tuple((int(np.floor(np.log10(abs(v)))) if v else 0, v < 0) for v in ax.get_ylim())
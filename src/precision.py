@@ -0,0 +1,70 @@
+# spectraconverter_v4/src/precision.py
+#
+# Precisión de almacenamiento: por defecto todo se guarda en float64; en
+# sesiones grandes se puede guardar en float32 (la mitad de memoria). Los
+# cálculos que lo necesitan (airPLS, suavizados...) siempre trabajan en float64.
+
+import numpy as np
+
+# Precisiones de almacenamiento admitidas, por nombre.
+STORAGE_DTYPES = {'float64': np.dtype(np.float64), 'float32': np.dtype(np.float32)}
+
+# Un eje solo se guarda en float32 si el redondeo es menor que esta fracción
+# de la separación mínima entre puntos (no se mueve ningún punto de forma apreciable).
+AXIS_ROUNDING_TOLERANCE = 1e-3
+
+
+def storage_dtype(name_or_dtype):
+    """
+    Devuelve el dtype de almacenamiento a partir de su nombre ('float32') o de un dtype.
+
+    Raises:
+        ValueError: Si no es una de las precisiones admitidas.
+    """
+    dtype = np.dtype(name_or_dtype)
+    if dtype not in STORAGE_DTYPES.values():
+        raise ValueError(f"Precisión de almacenamiento no admitida: {dtype}. Usa float64 o float32.")
+    return dtype
+
+
+def storage_axis(wavelength, dtype):
+    """
+    Eje de longitudes de onda tal como se guarda: en float32 si la precisión
+    es float32 y el redondeo es despreciable frente a la separación entre
+    puntos; en float64 en cualquier otro caso.
+    """
+    if np.dtype(dtype) == np.float32 and isinstance(wavelength, np.ndarray) and wavelength.dtype == np.float32:
+        return wavelength  # Ya decidido (p. ej. al parsear o en la caché).
+    wavelength = np.asarray(wavelength, dtype=np.float64)
+    if np.dtype(dtype) != np.float32 or wavelength.size == 0:
+        return wavelength
+    reduced = wavelength.astype(np.float32)
+    spacing = np.abs(np.diff(wavelength))
+    spacing = spacing[spacing > 0]
+    if not np.all(np.isfinite(reduced)):
+        return wavelength
+    error = np.max(np.abs(reduced - wavelength))
+    if error == 0 or (spacing.size and error <= AXIS_ROUNDING_TOLERANCE * spacing.min()):
+        return reduced
+    return wavelength
+
+
+def format_bytes(n_bytes):
+    if n_bytes >= 1024 * 1024 * 1024:
+        return f"{n_bytes / (1024 * 1024 * 1024):.2f} GB"
+    if n_bytes >= 1024 * 1024:
+        return f"{n_bytes / (1024 * 1024):.1f} MB"
+    return f"{n_bytes / 1024:.1f} KB"
+
+
+def memory_report(collection, result_cache=None, warm_start_cache=None):
+    """
+    Texto breve con la memoria que ocupan de verdad los arrays de la sesión
+    (medida con nbytes), para la barra de estado o la consola.
+    """
+    parts = [f"Memoria: espectros {format_bytes(collection.nbytes)} ({collection.dtype.name})"]
+    if result_cache is not None and len(result_cache):
+        parts.append(f"resultados guardados {format_bytes(result_cache.nbytes)}")
+    if warm_start_cache is not None and len(warm_start_cache):
+        parts.append(f"pesos airPLS {format_bytes(warm_start_cache.nbytes)}")
+    return ", ".join(parts)
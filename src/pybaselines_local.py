@@ -2,9 +2,17 @@
 # para ser usado localmente y evitar problemas de entorno.
 
 import numpy as np
+from scipy.linalg import LinAlgError, get_lapack_funcs, solve_banded, solveh_banded
 from scipy.sparse import spdiags
 from scipy.sparse.linalg import spsolve
 
+# Puntos de la malla gruesa que usa airpls_multires cuando no se indica el factor.
+MULTIRES_COARSE_POINTS = 20000
+
+# Puntos que airpls_batch resuelve de una vez: bastantes para repartir el coste
+# de cada llamada entre muchas filas y pocos para que los temporales quepan en caché.
+STACK_POINTS = 1 << 15
+
 def _whittaker_smooth(y, lam, d, w):
     """El algoritmo base de suavizado de Whittaker."""
     y_len = len(y)
@@ -13,47 +21,302 @@ def _whittaker_smooth(y, lam, d, w):
     # Resuelve el sistema de ecuaciones lineales para encontrar la línea base suavizada
     return spsolve(W + lam * (d.T @ d), W @ y)
 
-def airpls(data, lam=1e7, p=0.01, max_iter=50, tol=1e-3, weights=None):
-    """
-    Implementación local y funcional de airPLS.
-    Esta versión SÍ usa el parámetro 'p' correctamente.
-    """
-    y_len = len(data)
-    
-    # Construye la matriz de diferencias de segundo orden (D)
-    # Esta es la forma robusta y correcta de hacerlo.
-    D = spdiags(
+
+def _difference_matrix(y_len):
+    """Matriz de diferencias de segundo orden (D), de forma (y_len - 2, y_len)."""
+    return spdiags(
         np.vstack((np.ones(y_len), -2 * np.ones(y_len), np.ones(y_len))),
         [0, 1, 2],
         y_len - 2,
         y_len
     )
 
+
+def penalty_bands(y_len, lam):
+    """
+    Penalización lam * D'D en el formato de bandas superior de solveh_banded:
+    una matriz (3, y_len) con la segunda superdiagonal, la primera y la diagonal.
+    D'D es pentadiagonal, simétrica y solo depende de la longitud, así que se
+    calcula una vez por espectro (o por lote) y no en cada iteración.
+    """
+    penalty = (_difference_matrix(y_len).T @ _difference_matrix(y_len)).tocsr()
+    bands = np.zeros((3, y_len))
+    bands[0, 2:] = penalty.diagonal(2)
+    bands[1, 1:] = penalty.diagonal(1)
+    bands[2] = penalty.diagonal(0)
+    return lam * bands
+
+
+def _whittaker_smooth_banded(y, bands, w):
+    """
+    Suavizado de Whittaker con la penalización ya en bandas: (W + lam D'D) z = W y.
+    Solo cambia la diagonal, así que cada iteración es una factorización de
+    Cholesky en bandas, O(n), en lugar de un spsolve general.
+    """
+    system = bands.copy()
+    system[2] += w
+    try:
+        return solveh_banded(system, w * y, overwrite_ab=True, check_finite=False)
+    except LinAlgError:
+        return _whittaker_smooth_lu(y, bands, w)
+
+
+def _whittaker_smooth_lu(y, bands, w):
+    """
+    Respaldo de _whittaker_smooth_banded: con casi todos los pesos a cero el
+    sistema puede dejar de ser definido positivo en la práctica; la LU en
+    bandas lo resuelve igual que spsolve.
+    """
+    full = np.zeros((5, len(y)))
+    full[:3] = bands
+    full[3, :-1] = bands[1, 1:]
+    full[4, :-2] = bands[0, 2:]
+    full[2] += w
+    return solve_banded((2, 2), full, w * y, overwrite_ab=True, check_finite=False)
+
+
+def _whittaker_smooth_stack(data, bands, w):
+    """
+    _whittaker_smooth_banded para una pila 2D (n_espectros, n_puntos) con una
+    sola factorización: las filas se encadenan en un único sistema en bandas
+    diagonal por bloques. Las bandas de penalty_bands empiezan con ceros, así
+    que al repetirlas fila tras fila los bloques quedan desacoplados y cada
+    uno se factoriza igual que por separado.
+
+    Si la factorización de Cholesky falla en una fila, LAPACK dice en cuál: los
+    bloques anteriores ya están factorizados, esa fila pasa a la LU de
+    respaldo y se sigue con las siguientes.
+    """
+    n_spectra, y_len = data.shape
+    # Las bandas de cada punto, seguidas: es el formato (3, n_espectros * n_puntos)
+    # en orden de Fortran, así que cada tramo de filas es contiguo y LAPACK lo
+    # factoriza en su sitio.
+    stacked = np.empty((n_spectra, y_len, 3))
+    stacked[:] = bands.T
+    stacked[:, :, 2] += w
+    system = stacked.reshape(-1, 3).T
+    rhs = (w * data).ravel()
+    pbtrf, pbtrs = get_lapack_funcs(('pbtrf', 'pbtrs'), (system,))
+    baselines = np.empty_like(data)
+    start = 0
+    while start < n_spectra:
+        factor, info = pbtrf(system[:, start * y_len:], overwrite_ab=True)
+        if info < 0:
+            raise ValueError(f"Argumento {-info} no válido en pbtrf.")
+        stop = n_spectra if info == 0 else start + (info - 1) // y_len
+        if stop > start:
+            solved, info_trs = pbtrs(factor[:, :(stop - start) * y_len], rhs[start * y_len:stop * y_len])
+            if info_trs < 0:
+                raise ValueError(f"Argumento {-info_trs} no válido en pbtrs.")
+            baselines[start:stop] = solved.reshape(stop - start, y_len)
+        if stop < n_spectra:
+            baselines[stop] = _whittaker_smooth_lu(data[stop], bands, w[stop])
+        start = stop + 1
+    return baselines
+
+
+def _reweight_stack(data, baselines, w, i, tol):
+    """
+    Un paso de reponderación de airPLS para todas las filas de una pila a la vez.
+
+    Returns:
+        tuple: (pesos de la siguiente iteración, array booleano con True en las
+               filas que ya han convergido; sus pesos nuevos no se usan)
+    """
+    residual = data - baselines
+    negative = residual < 0
+
+    # Lógica para recalcular los pesos; sin residuales negativos la línea base
+    # está por debajo de la señal y la fila ha terminado.
+    d_sum = np.where(negative, -residual, 0).sum(axis=1, keepdims=True)
+    has_negative = d_sum[:, 0] > 0
+    d_sum[~has_negative] = 1
+    w_new = np.where(negative, np.exp(i * residual / d_sum), 0)
+
+    # Comprueba la convergencia
+    w_norm = np.linalg.norm(w - w_new, axis=1) / np.linalg.norm(w, axis=1)
+    return w_new, ~has_negative | (w_norm < tol)
+
+
+def _reweight(data, baseline, w, i, tol):
+    """
+    Un paso de reponderación de airPLS. Es _reweight_stack con una sola fila,
+    para que un espectro dé lo mismo solo que dentro de un lote.
+
+    Returns:
+        np.ndarray: Los pesos de la siguiente iteración, o None si ya ha convergido.
+    """
+    w_new, converged = _reweight_stack(data[np.newaxis], baseline[np.newaxis], w[np.newaxis], i, tol)
+    return None if converged[0] else w_new[0]
+
+
+def _airpls_iterations(data, smooth, max_iter, tol, weights):
+    """Bucle de reponderación de airPLS, común a los dos motores de resolución."""
+    y_len = len(data)
+
     if weights is None:
         w = np.ones(y_len)
     else:
         w = np.array(weights)
 
     for i in range(1, max_iter + 1):
-        baseline = _whittaker_smooth(data, lam, D, w)
-        residual = data - baseline
-        
-        # Encuentra los residuales negativos
-        residual_neg = residual[residual < 0]
-        
-        # Si no hay residuales negativos, la línea base está por debajo de la señal, hemos terminado.
-        if not residual_neg.any():
-            break
-        
-        # Lógica para recalcular los pesos
-        d_sum = np.sum(np.abs(residual_neg))
-        w_new = np.where(residual >= 0, 0, np.exp(i * residual / d_sum))
-
-        # Comprueba la convergencia
-        w_norm = np.linalg.norm(w - w_new) / np.linalg.norm(w)
-        if w_norm < tol:
+        baseline = smooth(w)
+        w_new = _reweight(data, baseline, w, i, tol)
+        if w_new is None:
             break
-        
         w = w_new
 
-    return baseline, {'weights': w}
\ No newline at end of file
+    return baseline, {'weights': w}
+
+
+def airpls(data, lam=1e7, p=0.01, max_iter=50, tol=1e-3, weights=None):
+    """
+    Implementación local y funcional de airPLS.
+    El parámetro 'p' se acepta por compatibilidad con pybaselines, pero no se
+    usa: airPLS repondera con los residuos negativos (ver _reweight).
+
+    Usa el motor en bandas: la penalización se construye una sola vez y en
+    cada iteración solo se actualizan los pesos de la diagonal.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    bands = penalty_bands(len(data), lam)
+    return _airpls_iterations(data, lambda w: _whittaker_smooth_banded(data, bands, w), max_iter, tol, weights)
+
+
+def airpls_sparse(data, lam=1e7, p=0.01, max_iter=50, tol=1e-3, weights=None):
+    """
+    airPLS con el motor original (spsolve sobre matrices dispersas en cada
+    iteración). Se conserva como referencia para validar y comparar el motor
+    en bandas.
+    """
+    # Construye la matriz de diferencias de segundo orden (D)
+    # Esta es la forma robusta y correcta de hacerlo.
+    D = _difference_matrix(len(data))
+    return _airpls_iterations(data, lambda w: _whittaker_smooth(data, lam, D, w), max_iter, tol, weights)
+
+
+def airpls_batch(data, lam=1e7, p=0.01, max_iter=50, tol=1e-3, weights=None, penalty=None):
+    """
+    airPLS sobre una pila de espectros que comparten eje: array 2D
+    (n_espectros, n_puntos). Da el mismo resultado que llamar a airpls fila
+    a fila, pero la penalización se calcula una única vez para toda la pila
+    y en cada iteración los espectros que aún no han convergido (el conjunto
+    activo) se resuelven en tandas de unos STACK_POINTS puntos, cada una con
+    una sola factorización en bandas (_whittaker_smooth_stack), y se reponderan
+    y prueban a la vez; los ya convergidos salen del lote.
+
+    Los pesos cambian en cada iteración, así que la factorización no se puede
+    compartir y su coste por punto es el mismo que fila a fila: lo que se
+    ahorra son las llamadas por espectro, que pesan con espectros cortos
+    (cientos de puntos) y apenas con los largos.
+
+    Con penalty = penalty_bands(n_puntos, 1.0) ya calculada, solo se escala por
+    lam (útil al probar muchos valores de lam sobre la misma pila).
+
+    Returns:
+        tuple: (líneas base 2D, {'weights': pesos 2D, 'iterations': iteraciones por espectro})
+    """
+    data = np.array(data, dtype=np.float64, ndmin=2)
+    n_spectra, y_len = data.shape
+    bands = penalty_bands(y_len, lam) if penalty is None else lam * penalty
+
+    if weights is None:
+        w = np.ones((n_spectra, y_len))
+    else:
+        w = np.array(np.broadcast_to(weights, data.shape), dtype=np.float64)
+
+    baselines = np.empty_like(data)
+    iterations = np.zeros(n_spectra, dtype=int)
+    active = np.arange(n_spectra)
+
+    for i in range(1, max_iter + 1):
+        if not len(active):
+            break
+        iterations[active] = i
+        still_active = []
+        for rows in np.array_split(active, -(-len(active) * y_len // STACK_POINTS)):
+            stack, stack_w = data[rows], w[rows]
+            stack_baselines = _whittaker_smooth_stack(stack, bands, stack_w)
+            baselines[rows] = stack_baselines
+            w_new, converged = _reweight_stack(stack, stack_baselines, stack_w, i, tol)
+            w[rows[~converged]] = w_new[~converged]
+            still_active.append(rows[~converged])
+        active = np.concatenate(still_active)
+
+    return baselines, {'weights': w, 'iterations': iterations}
+
+
+def _decimate(data, factor):
+    """
+    Media por bloques de `factor` puntos a lo largo del último eje (el último
+    bloque puede ser más corto). La media, y no un simple submuestreo, reduce
+    también el ruido de la malla gruesa.
+
+    Returns:
+        tuple: (datos decimados, posición de cada bloque en índices de la malla fina)
+    """
+    n_points = data.shape[-1]
+    n_full = n_points // factor * factor
+    coarse = data[..., :n_full].reshape(data.shape[:-1] + (-1, factor)).mean(axis=-1)
+    positions = np.arange(n_full // factor) * factor + (factor - 1) / 2
+    if n_full < n_points:
+        coarse = np.concatenate((coarse, data[..., n_full:].mean(axis=-1, keepdims=True)), axis=-1)
+        positions = np.append(positions, (n_full + n_points - 1) / 2)
+    return coarse, positions
+
+
+def _weights_from_baseline(data, baselines):
+    """Pesos de la primera iteración de airPLS respecto a unas líneas base dadas (fila a fila)."""
+    residual = data - baselines
+    negative = np.where(residual < 0, residual, 0)
+    d_sum = np.abs(negative).sum(axis=1, keepdims=True)
+    d_sum[d_sum == 0] = 1
+    return np.where(residual >= 0, 0, np.exp(residual / d_sum))
+
+
+def airpls_multires_batch(data, lam=1e7, p=0.01, max_iter=50, tol=1e-3, factor=0, refine_iter=3, weights=None):
+    """
+    airPLS de gruesa a fina para espectros muy largos, sobre una pila 2D
+    (n_espectros, n_puntos) que comparte eje.
+
+    La línea base es suave, así que se estima primero con airPLS completo en
+    una malla decimada por `factor` (con lam / factor**4, que da la misma
+    rigidez por unidad de longitud), se interpola a la malla fina y se refina
+    con como mucho `refine_iter` iteraciones a resolución completa. Con
+    factor=0 se elige para que la malla gruesa tenga unos
+    MULTIRES_COARSE_POINTS puntos; con factor 1 equivale a airpls_batch.
+
+    Los pesos de partida (p. ej. los convergidos en una ejecución anterior) se
+    deciman igual que los datos y arrancan la malla gruesa, que es donde se
+    hacen casi todas las iteraciones; el refinado parte siempre de la línea
+    base gruesa interpolada.
+
+    Returns:
+        tuple: (líneas base 2D, {'weights', 'iterations', 'coarse_iterations'})
+    """
+    data = np.array(data, dtype=np.float64, ndmin=2)
+    y_len = data.shape[1]
+    if not factor:
+        factor = -(-y_len // MULTIRES_COARSE_POINTS)
+    factor = int(factor)
+    if factor <= 1 or y_len // factor < 3:
+        baselines, info = airpls_batch(data, lam, p, max_iter, tol, weights)
+        info['coarse_iterations'] = np.zeros(len(data), dtype=int)
+        return baselines, info
+
+    coarse, positions = _decimate(data, factor)
+    if weights is not None:
+        weights = _decimate(np.broadcast_to(np.asarray(weights, dtype=np.float64), data.shape), factor)[0]
+    coarse_baselines, coarse_info = airpls_batch(coarse, lam / factor ** 4, p, max_iter, tol, weights)
+    grid = np.arange(y_len)
+    start = np.array([np.interp(grid, positions, row) for row in coarse_baselines])
+
+    baselines, info = airpls_batch(data, lam, p, refine_iter, tol, _weights_from_baseline(data, start))
+    info['coarse_iterations'] = coarse_info['iterations']
+    return baselines, info
+
+
+def airpls_multires(data, lam=1e7, p=0.01, max_iter=50, tol=1e-3, factor=0, refine_iter=3, weights=None):
+    """Versión para un único espectro de airpls_multires_batch."""
+    baselines, info = airpls_multires_batch(data, lam, p, max_iter, tol, factor, refine_iter, weights)
+    return baselines[0], {key: value[0] for key, value in info.items()}
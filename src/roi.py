@@ -0,0 +1,81 @@
+# spectraconverter_v4/src/roi.py
+#
+# Región de interés (ROI): intervalo de longitudes de onda [mínimo, máximo]
+# fuera del cual no se guardan, procesan, dibujan ni exportan datos.
+
+import re
+
+import numpy as np
+
+from .precision import format_bytes
+
+# Dos números (con punto o coma decimal) separados por un guion, un punto y
+# coma o espacios; se admiten espacios alrededor del guion.
+_ROI_NUMBER = r'([+-]?(?:\d+(?:[.,]\d*)?|[.,]\d+)(?:[eE][+-]?\d+)?)'
+_ROI_TEXT = re.compile(rf'^{_ROI_NUMBER}\s*(?:[-;]|\s)\s*{_ROI_NUMBER}$')
+
+
+def normalize_roi(roi):
+    """
+    Valida una ROI y la devuelve como tupla (mínimo, máximo) de floats,
+    o None si no hay ROI.
+
+    Raises:
+        ValueError: Si no son dos números finitos.
+    """
+    if roi is None:
+        return None
+    low, high = (float(v) for v in roi)
+    if not (np.isfinite(low) and np.isfinite(high)):
+        raise ValueError("Los límites de la región de interés deben ser números finitos.")
+    return (low, high) if low <= high else (high, low)
+
+
+def parse_roi_text(text):
+    """
+    Interpreta una ROI escrita por el usuario, p. ej. "300-800", "300 - 800",
+    "300;800" o "300,5-800,5" (la coma es la marca decimal, no un separador).
+    Un texto vacío significa sin ROI.
+    """
+    text = text.strip()
+    if not text:
+        return None
+    match = _ROI_TEXT.match(text)
+    if match is None:
+        raise ValueError("Escribe dos límites, por ejemplo: 300-800")
+    return normalize_roi([value.replace(',', '.') for value in match.groups()])
+
+
+def format_roi(roi):
+    return "" if roi is None else f"{roi[0]:g}-{roi[1]:g}"
+
+
+def roi_index(wavelength, roi):
+    """
+    Selección de los puntos de un eje que caen dentro de la ROI: un slice si
+    el eje es creciente (lo habitual, y así se obtienen vistas sin copia) o
+    una máscara booleana en otro caso. Con roi=None se seleccionan todos.
+    """
+    if roi is None:
+        return slice(None)
+    wavelength = np.asarray(wavelength)
+    if wavelength.size < 2 or np.all(wavelength[1:] >= wavelength[:-1]):
+        start, stop = np.searchsorted(wavelength, roi[0], 'left'), np.searchsorted(wavelength, roi[1], 'right')
+        return slice(int(start), int(stop))
+    return (wavelength >= roi[0]) & (wavelength <= roi[1])
+
+
+def crop(wavelength, intensities, roi):
+    """
+    Recorta un eje y sus intensidades (1D, o 2D con una fila por espectro) a la ROI.
+
+    Returns:
+        tuple: (wavelength, intensities) recortados.
+    """
+    selection = roi_index(wavelength, roi)
+    return np.asarray(wavelength)[selection], np.asarray(intensities)[..., selection]
+
+
+def format_crop_stats(rows_dropped, bytes_saved):
+    """Texto breve con lo que ha ahorrado la ROI, para la barra de estado o la consola."""
+    return f"ROI: {rows_dropped} filas descartadas ({format_bytes(bytes_saved)} ahorrados)"
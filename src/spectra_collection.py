@@ -0,0 +1,345 @@
+# spectraconverter_v4/src/spectra_collection.py
+
+import hashlib
+import re
+
+import numpy as np
+
+from .precision import storage_axis, storage_dtype
+
+# Sufijo que channel_names añade a cada canal de un archivo multicanal.
+_CHANNEL_SUFFIX = re.compile(r' \[canal \d+\]$')
+
+
+class SpectraCollection:
+    """
+    Conjunto de espectros cargados, guardado de forma compacta.
+
+    Mientras todos los espectros compartan el mismo eje de longitudes de onda se
+    guarda una única copia del eje y las intensidades en un array 2D contiguo
+    (una fila por espectro), tanto para los datos crudos como para los procesados.
+    En cuanto llega un espectro con otro eje, la colección pasa a modo irregular:
+    cada espectro conserva su propio eje y sus propios arrays.
+
+    Las intensidades se guardan en `dtype` (float64, o float32 para sesiones
+    grandes); con float32 los ejes también, siempre que el redondeo sea
+    despreciable (ver precision.storage_axis).
+    """
+
+    def __init__(self, dtype=np.float64):
+        self.dtype = storage_dtype(dtype)
+        self.clear()
+
+    def clear(self):
+        """Elimina todos los espectros."""
+        self.filenames = []
+        self._index = {}
+        self._ragged = False
+        # Modo alineado: eje compartido y bloques 2D con capacidad de sobra para crecer.
+        self._wavelength = None
+        self._raw = None
+        self._processed = None
+        self._has_processed = np.zeros(0, dtype=bool)
+        # Modo irregular: un array por espectro.
+        self._wavelengths = []
+        self._raw_list = []
+        self._processed_list = []
+        # Huella del contenido de cada espectro (eje + intensidades crudas), calculada bajo demanda.
+        self._content_keys = {}
+        # Lo que la región de interés evitó cargar.
+        self.rows_dropped = 0
+        self.bytes_saved = 0
+
+    def __len__(self):
+        return len(self.filenames)
+
+    @property
+    def is_aligned(self):
+        """True si todos los espectros comparten el eje de longitudes de onda."""
+        return not self._ragged
+
+    @property
+    def shared_wavelength(self):
+        """El eje común si la colección está alineada, o None."""
+        return None if self._ragged else self._wavelength
+
+    def index_of(self, filename):
+        return self._index[filename]
+
+    # --- Altas y bajas ---------------------------------------------------
+
+    def append(self, filename, wavelength, intensity):
+        """
+        Añade un espectro y devuelve su índice.
+
+        Args:
+            filename (str): Nombre único del espectro.
+            wavelength (array-like): Eje de longitudes de onda.
+            intensity (array-like): Intensidades, de la misma longitud que el eje.
+        """
+        if filename in self._index:
+            raise ValueError(f"Ya existe un espectro llamado '{filename}'.")
+        wavelength = storage_axis(wavelength, self.dtype)
+        intensity = np.asarray(intensity, dtype=self.dtype)
+        if wavelength.shape != intensity.shape or wavelength.ndim != 1:
+            raise ValueError(f"Eje e intensidades de '{filename}' no tienen la misma longitud.")
+
+        index = len(self.filenames)
+        if not self._ragged:
+            if self._wavelength is None:
+                self._wavelength = wavelength.copy()
+            elif not np.array_equal(wavelength, self._wavelength):
+                self._to_ragged()
+
+        if self._ragged:
+            self._wavelengths.append(wavelength)
+            self._raw_list.append(intensity.copy())
+            self._processed_list.append(None)
+        else:
+            self._ensure_capacity(index + 1)
+            self._raw[index] = intensity
+            self._has_processed[index] = False
+
+        self.filenames.append(filename)
+        self._index[filename] = index
+        return index
+
+    @classmethod
+    def from_matrix(cls, filenames, wavelength, intensities, dtype=np.float64):
+        """
+        Colección alineada a partir de un eje y un array 2D (una fila por
+        espectro), p. ej. el resultado de resampling.resample_collection.
+        """
+        collection = cls(dtype)
+        intensities = np.atleast_2d(np.asarray(intensities, dtype=collection.dtype))
+        if len(filenames) != len(intensities) or intensities.shape[1] != len(wavelength):
+            raise ValueError("Los nombres, el eje y la matriz de intensidades no tienen dimensiones compatibles.")
+        if len(set(filenames)) != len(filenames):
+            raise ValueError("Hay nombres de espectro repetidos.")
+        collection._wavelength = storage_axis(wavelength, collection.dtype).copy()
+        collection._raw = intensities.copy()
+        collection._has_processed = np.zeros(len(filenames), dtype=bool)
+        collection.filenames = list(filenames)
+        collection._index = {name: i for i, name in enumerate(filenames)}
+        return collection
+
+    @staticmethod
+    def channel_names(name, n_channels):
+        """Nombres con los que se registra cada canal de un archivo multicanal."""
+        if n_channels == 1:
+            return [name]
+        return [f"{name} [canal {k}]" for k in range(1, n_channels + 1)]
+
+    @staticmethod
+    def source_name(filename):
+        """Archivo del que procede un espectro (deshace channel_names)."""
+        match = _CHANNEL_SUFFIX.search(filename)
+        return filename[:match.start()] if match else filename
+
+    def add_channels(self, name, wavelength, intensities, rows_dropped=0):
+        """
+        Registra cada canal de un archivo como un espectro propio que comparte
+        el eje de longitudes de onda. Si un canal ya existe, se sustituyen sus datos.
+
+        Args:
+            name (str): Nombre del archivo.
+            wavelength (array-like): Eje común de todos los canales.
+            intensities (array-like): Array 2D (n_canales, n_puntos).
+            rows_dropped (int): Filas del archivo que quedaron fuera de la región
+                                de interés; solo se acumulan para las estadísticas.
+
+        Returns:
+            list: Tuplas (índice, es_nuevo) de cada canal, en orden.
+        """
+        intensities = np.atleast_2d(intensities)
+        # Un solo eje para todos los canales, también si se guarda en float32.
+        wavelength = storage_axis(wavelength, self.dtype)
+        self.rows_dropped += rows_dropped
+        self.bytes_saved += rows_dropped * (wavelength.dtype.itemsize + len(intensities) * self.dtype.itemsize)
+        result = []
+        for channel_name, intensity in zip(self.channel_names(name, len(intensities)), intensities):
+            if channel_name in self._index:
+                index = self._index[channel_name]
+                self.replace(index, wavelength, intensity)
+                result.append((index, False))
+            else:
+                result.append((self.append(channel_name, wavelength, intensity), True))
+        return result
+
+    def replace(self, index, wavelength, intensity):
+        """
+        Sustituye los datos crudos de un espectro (p. ej. si su archivo ha cambiado)
+        y descarta su resultado procesado.
+        """
+        wavelength = storage_axis(wavelength, self.dtype)
+        intensity = np.asarray(intensity, dtype=self.dtype)
+        if wavelength.shape != intensity.shape or wavelength.ndim != 1:
+            raise ValueError(f"Eje e intensidades de '{self.filenames[index]}' no tienen la misma longitud.")
+
+        if not self._ragged and not np.array_equal(wavelength, self._wavelength):
+            if len(self.filenames) == 1:
+                # Con un único espectro basta con cambiar el eje compartido.
+                self._wavelength = wavelength.copy()
+                self._raw = None
+                self._processed = None
+                self._ensure_capacity(1)
+            else:
+                self._to_ragged()
+
+        if self._ragged:
+            self._wavelengths[index] = wavelength
+            self._raw_list[index] = intensity.copy()
+            self._processed_list[index] = None
+        else:
+            self._raw[index] = intensity
+            self._has_processed[index] = False
+        self._content_keys.pop(index, None)
+
+    def set_dtype(self, dtype):
+        """
+        Cambia la precisión de almacenamiento de los espectros ya cargados.
+        Pasar a float32 libera memoria al momento; volver a float64 no
+        recupera la precisión perdida (para eso hay que recargar).
+        """
+        dtype = storage_dtype(dtype)
+        if dtype == self.dtype:
+            return
+        self.dtype = dtype
+        if self._ragged:
+            axes = {}
+            for i, wavelength in enumerate(self._wavelengths):
+                # Los espectros que compartían eje lo siguen compartiendo.
+                if id(wavelength) not in axes:
+                    axes[id(wavelength)] = storage_axis(wavelength, dtype)
+                self._wavelengths[i] = axes[id(wavelength)]
+            self._raw_list = [raw.astype(dtype) for raw in self._raw_list]
+            self._processed_list = [None if p is None else p.astype(dtype) for p in self._processed_list]
+        elif self._wavelength is not None:
+            self._wavelength = storage_axis(self._wavelength, dtype)
+            self._raw = self._raw.astype(dtype)
+            if self._processed is not None:
+                self._processed = self._processed.astype(dtype)
+        # Las huellas dependen de los bytes guardados.
+        self._content_keys = {}
+
+    def _ensure_capacity(self, size):
+        capacity = 0 if self._raw is None else self._raw.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, 2 * capacity, 8)
+        new_raw = np.empty((new_capacity, len(self._wavelength)), dtype=self.dtype)
+        new_flags = np.zeros(new_capacity, dtype=bool)
+        if capacity:
+            new_raw[:capacity] = self._raw
+            new_flags[:capacity] = self._has_processed
+        self._raw = new_raw
+        self._has_processed = new_flags
+        if self._processed is not None:
+            new_processed = np.empty_like(new_raw)
+            new_processed[:capacity] = self._processed
+            self._processed = new_processed
+
+    def _to_ragged(self):
+        """Pasa del bloque 2D a arrays independientes por espectro."""
+        n = len(self.filenames)
+        self._wavelengths = [self._wavelength] * n
+        self._raw_list = [self._raw[i].copy() for i in range(n)]
+        self._processed_list = [self._processed[i].copy() if self._has_processed[i] else None for i in range(n)]
+        self._ragged = True
+        self._wavelength = None
+        self._raw = None
+        self._processed = None
+        self._has_processed = np.zeros(0, dtype=bool)
+
+    # --- Acceso por espectro ---------------------------------------------
+
+    def content_key(self, index):
+        """
+        Huella (hex) del eje y las intensidades crudas de un espectro. Solo
+        cambia si cambian sus datos, así que sirve de clave para cachear resultados.
+        """
+        key = self._content_keys.get(index)
+        if key is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.ascontiguousarray(self.wavelength(index)).view(np.uint8))
+            digest.update(np.ascontiguousarray(self.raw(index)).view(np.uint8))
+            key = self._content_keys[index] = digest.hexdigest()
+        return key
+
+    def wavelength(self, index):
+        return self._wavelengths[index] if self._ragged else self._wavelength
+
+    def raw(self, index):
+        """Intensidades crudas del espectro (una vista, no una copia)."""
+        return self._raw_list[index] if self._ragged else self._raw[index]
+
+    def has_processed(self, index):
+        return self._processed_list[index] is not None if self._ragged else bool(self._has_processed[index])
+
+    def processed(self, index):
+        """Intensidades procesadas del espectro, o None si no se ha procesado."""
+        if not self.has_processed(index):
+            return None
+        return self._processed_list[index] if self._ragged else self._processed[index]
+
+    def intensity(self, index, use_processed=False):
+        """Intensidades procesadas si se piden y existen; si no, las crudas."""
+        if use_processed and self.has_processed(index):
+            return self.processed(index)
+        return self.raw(index)
+
+    # --- Acceso en bloque (solo modo alineado) ---------------------------
+
+    def raw_matrix(self):
+        """Vista 2D (n_espectros, n_puntos) de las intensidades crudas."""
+        if self._ragged:
+            raise ValueError("Los espectros no comparten eje; no hay matriz común.")
+        if self._raw is None:
+            return np.empty((0, 0), dtype=self.dtype)
+        return self._raw[:len(self.filenames)]
+
+    # --- Resultados del procesamiento ------------------------------------
+
+    def set_processed(self, indices, values):
+        """
+        Guarda los resultados procesados.
+
+        Args:
+            indices (list): Índices de los espectros procesados.
+            values: Array 2D (len(indices), n_puntos) en modo alineado, o una
+                    secuencia de arrays 1D en cualquier modo.
+        """
+        if self._ragged:
+            for index, row in zip(indices, values):
+                self._processed_list[index] = np.asarray(row, dtype=self.dtype)
+            return
+
+        if self._processed is None:
+            self._processed = np.empty_like(self._raw)
+        indices = np.asarray(indices, dtype=np.intp)
+        self._processed[indices] = values
+        self._has_processed[indices] = True
+
+    def clear_processed(self, indices=None):
+        """Descarta los datos procesados (de todos o de los índices indicados)."""
+        if indices is None:
+            indices = range(len(self.filenames))
+        if self._ragged:
+            for index in indices:
+                self._processed_list[index] = None
+        else:
+            self._has_processed[np.asarray(list(indices), dtype=np.intp)] = False
+
+    @property
+    def nbytes(self):
+        """Memoria ocupada por los arrays de la colección, en bytes."""
+        if self._ragged:
+            total = sum(w.nbytes for w in {id(w): w for w in self._wavelengths}.values())
+            total += sum(r.nbytes for r in self._raw_list)
+            total += sum(p.nbytes for p in self._processed_list if p is not None)
+            return total
+        total = 0
+        for array in (self._wavelength, self._raw, self._processed):
+            if array is not None:
+                total += array.nbytes
+        return total
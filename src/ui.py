@@ -1,17 +1,42 @@
 # spectraconverter_v4/src/ui.py
 
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 from tkinterdnd2 import DND_FILES
+import fnmatch
 import os
+import queue
+import threading
 import traceback
+import numpy as np
 from .utils import resource_path
 from PIL import Image, ImageTk, ImageEnhance
 
-from . import data_parser
+from . import archive_loader
+from . import data_loader
+from . import parse_cache
+from .folder_watcher import FolderWatcher
 from . import data_plotter
 from . import data_processor
 from . import data_exporter
+from . import figure_export
+from . import parameter_sweep
+from . import precision
+from . import resampling
+from .spectra_collection import SpectraCollection
+from .roi import parse_roi_text, format_roi, format_crop_stats
+
+# Cada cuánto se sondea la carpeta vigilada, en milisegundos.
+WATCH_INTERVAL_MS = 2000
+
+# Vista previa en vivo: espera tras el último cambio de parámetros antes de
+# recalcular, y espectros por bloque (entre bloques se puede cancelar).
+PREVIEW_DEBOUNCE_MS = 300
+PREVIEW_CHUNK_ROWS = 8
+
+# Espera tras la última tecla antes de filtrar la lista de espectros.
+LIST_FILTER_DEBOUNCE_MS = 150
+
 
 class MainAppWindow:
     def __init__(self, root):
@@ -25,6 +50,22 @@ class MainAppWindow:
         self.root.minsize(self.load_view_minsize[0], self.load_view_minsize[1])
         self.root.configure(bg='#E6E6FA')
         
+        self.max_workers = data_loader.default_workers()
+        self.parse_cache = parse_cache.ParseCache()
+        # Resultados ya calculados: volver a unos parámetros ya probados es inmediato.
+        self.result_cache = data_processor.ResultCache()
+        # Pesos convergidos de airPLS: al retocar lam o p se arranca desde ellos.
+        self.warm_start_cache = data_processor.WarmStartCache()
+        # Puntuaciones del barrido de lam: añadir valores solo calcula los nuevos.
+        self.sweep_cache = data_processor.ResultCache()
+        self.sweep_window = None
+        # Imágenes para informes que se están guardando (se cancelan al salir).
+        self.image_export_cancel_event = None
+        # Región de interés (mínimo, máximo) en nm, o None para todo el rango.
+        self.roi = None
+        # Antes del menú: la opción de precisión reducida parte de su dtype.
+        self.loaded_spectra = SpectraCollection()
+
         self._create_menu()
         self.set_window_icon()
         
@@ -37,17 +78,31 @@ class MainAppWindow:
         style.map('Drop.TLabel', background=[('active', '#F0E8FF')], bordercolor=[('active', '#4B0082')], foreground=[('active', '#4B0082')])
         style.configure('TButton', padding=6, font=('Arial', 10))
         style.configure('Big.TButton', font=('Arial', 12, 'bold'), padding=10)
-        style.configure('White.TFrame', background='white')
-        style.configure('White.TCheckbutton', background='white')
         
         self.original_watermark_img = self.load_original_image('assets/icono.png')
         self.watermark_photo = None
         self.resize_job = None
-        self.loaded_spectra = []
         self.plotter = None
         self.current_exp_type = None
         self.last_clicked_index = None
+        # Espectros de la lista (en orden de carga) y si están marcados.
+        self.ordered_filenames = []
+        self.spectra_checked = {}
+        self.list_filter_job = None
         self.processing_applied = False
+        self.load_cancel_event = None
+        self.load_queue = None
+        self.current_folder = None
+        self.current_processing_steps = None
+        self.folder_watcher = None
+        self.watch_job = None
+        self.watch_queue = None
+        self.preview_enabled = tk.BooleanVar(value=False)
+        self.preview_job = None
+        self.preview_cancel_event = None
+        self.preview_queue = None
+        self.preview_generation = 0
+        self.preview_warm_starts = []
 
         self.status_var = tk.StringVar(value="Listo para cargar archivos.")
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief="sunken", padding=5, style='Status.TLabel')
@@ -100,7 +155,7 @@ class MainAppWindow:
         self.root.after(10, self.center_window)
         self.load_frame.pack_forget()
         self.processing_frame.pack(expand=True, fill="both")
-        self.plotter.plot_spectra(self.loaded_spectra, use_processed=False)
+        self.plotter.plot_spectra(self.loaded_spectra, use_processed=False, roi=self.roi)
         self._populate_spectra_list()
         
     def create_load_widgets(self):
@@ -110,6 +165,13 @@ class MainAppWindow:
         self.drop_zone.pack(expand=True, fill="both", pady=10)
         self.setup_drop_zone_events()
 
+        # Barra de progreso y botón de cancelar; solo se muestran durante una carga.
+        self.load_progress_frame = ttk.Frame(main_frame_content, style='TFrame')
+        self.load_progress = ttk.Progressbar(self.load_progress_frame, orient="horizontal", mode="determinate")
+        self.load_progress.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        self.load_cancel_button = ttk.Button(self.load_progress_frame, text="Cancelar", command=self._on_cancel_loading)
+        self.load_cancel_button.pack(side="right")
+
     def create_processing_widgets(self):
         control_panel = ttk.Frame(self.processing_frame, width=350, style='TFrame', padding=10)
         control_panel.pack(side="left", fill="y", padx=(5,0), pady=5)
@@ -143,13 +205,26 @@ class MainAppWindow:
         list_frame = ttk.LabelFrame(scrollable_content_frame, text="2. Selecciona espectros", padding=10)
         list_frame.pack(fill="both", expand=True, pady=10)
         
-        self.spectra_list_canvas = tk.Canvas(list_frame, background="#FFFFFF", highlightthickness=0)
-        list_scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.spectra_list_canvas.yview)
-        self.scrollable_frame = ttk.Frame(self.spectra_list_canvas, style='White.TFrame')
-        self.spectra_list_canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.spectra_list_canvas.configure(yscrollcommand=list_scrollbar.set)
+        filter_frame = ttk.Frame(list_frame)
+        filter_frame.pack(side="top", fill="x", pady=(0, 5))
+        ttk.Label(filter_frame, text="Filtrar:").pack(side="left")
+        self.list_filter = tk.StringVar()
+        self.list_filter.trace_add('write', lambda *_: self._schedule_list_filter())
+        ttk.Entry(filter_frame, textvariable=self.list_filter).pack(side="left", fill="x", expand=True, padx=5)
+        ttk.Button(filter_frame, text="Todos", width=7, command=lambda: self._set_listed_checked(True)).pack(side="left")
+        ttk.Button(filter_frame, text="Ninguno", width=8, command=lambda: self._set_listed_checked(False)).pack(side="left", padx=(2, 0))
+        self.list_count_var = tk.StringVar()
+        ttk.Label(list_frame, textvariable=self.list_count_var, style='Status.TLabel').pack(side="bottom", anchor="w", pady=(5, 0))
+
+        # Un Treeview dibuja solo las filas visibles: el número de widgets no
+        # depende de cuántos espectros haya. La casilla es el texto de la fila.
+        self.spectra_tree = ttk.Treeview(list_frame, show='tree', selectmode='none')
+        self.spectra_tree.tag_configure('unchecked', foreground='#888888')
+        list_scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.spectra_tree.yview)
+        self.spectra_tree.configure(yscrollcommand=list_scrollbar.set)
         list_scrollbar.pack(side="right", fill="y")
-        self.spectra_list_canvas.pack(side="left", fill="both", expand=True)
+        self.spectra_tree.pack(side="left", fill="both", expand=True)
+        self.spectra_tree.bind("<Button-1>", self._on_spectrum_click)
         
         self.plotter = data_plotter.SpectraPlotter(plot_panel)
 
@@ -197,84 +272,286 @@ class MainAppWindow:
         if path: self.process_folder(path)
             
     def process_folder(self, folder_path):
+        if self.load_queue is not None:
+            self.status_var.set("Ya hay una carga en curso. Espera o cancélala primero."); return
+        if archive_loader.is_archive(folder_path):
+            self.process_archive(folder_path); return
         self.status_var.set(f"Analizando carpeta: {os.path.basename(folder_path)}...")
         self.root.update_idletasks()
         if not os.path.isdir(folder_path):
             self.status_var.set("Error: La ruta soltada no es una carpeta válida."); return
         
-        files_to_process = [f for f in os.listdir(folder_path) if f.lower().endswith(('.txt', '.asc'))]
+        files_to_process = data_loader.list_spectrum_files(folder_path)
         if not files_to_process:
             self.status_var.set(f"Aviso: No se encontraron archivos .txt o .asc."); return
 
+        self._stop_watching()
+        self.load_folder = folder_path
+        self.load_file_paths = files_to_process
+        workers, cancel_event, cache, roi = self.max_workers, threading.Event(), self.parse_cache, self.roi
+        dtype = self.loaded_spectra.dtype
+        self._start_loading(
+            lambda: data_loader.iter_load_files(files_to_process, workers, cancel_event, cache, roi=roi, dtype=dtype),
+            cancel_event, len(files_to_process)
+        )
+
+    def process_archive(self, archive_path):
+        """Carga los espectros de un .zip o .tar sin extraerlo a disco."""
+        if self.load_queue is not None:
+            self.status_var.set("Ya hay una carga en curso. Espera o cancélala primero."); return
+        self.status_var.set(f"Analizando archivo comprimido: {os.path.basename(archive_path)}...")
+        self.root.update_idletasks()
+        try:
+            total = archive_loader.count_members(archive_path)
+        except Exception as e:
+            self.status_var.set(f"Error: No se pudo abrir {os.path.basename(archive_path)}: {e}"); return
+        if total == 0:
+            self.status_var.set(f"Aviso: No se encontraron archivos .txt o .asc en el archivo comprimido."); return
+
+        self._stop_watching()
+        # Un archivo comprimido no se puede vigilar: no hay carpeta asociada.
+        self.load_folder = None
+        self.load_file_paths = []
+        workers, cancel_event, roi, dtype = self.max_workers, threading.Event(), self.roi, self.loaded_spectra.dtype
+        self._start_loading(
+            lambda: archive_loader.iter_load_archive(archive_path, workers, cancel_event, roi, dtype),
+            cancel_event, total
+        )
+
+    def _start_loading(self, make_iterator, cancel_event, total):
+        """
+        Lanza el parseo en segundo plano y empieza a sondear los resultados.
+
+        Args:
+            make_iterator (callable): Crea, ya en el hilo auxiliar, el iterador que
+                                      produce (índice, nombre, DataFrame).
+            cancel_event (threading.Event): El evento que ese iterador consulta.
+            total (int): Número de archivos esperados, o None si no se conoce.
+        """
+        self.load_results = {}
+        self.load_failed = []
+        self.load_completed = 0
+        self.load_total = total
+        self.load_cancel_event = cancel_event
+        self.load_queue = queue.Queue()
+
+        if total is None:
+            self.load_progress.configure(mode="indeterminate")
+            self.load_progress.start(20)
+        else:
+            self.load_progress.configure(mode="determinate", maximum=total, value=0)
+        self.load_cancel_button.state(['!disabled'])
+        self.load_progress_frame.pack(fill="x", pady=(0, 5))
+        self.status_var.set(f"Parseando con {self.max_workers} procesos...")
+
+        worker = threading.Thread(target=self._loading_worker, args=(make_iterator, self.load_queue), daemon=True)
+        worker.start()
+        self.root.after(50, self._poll_loading_queue)
+
+    @staticmethod
+    def _loading_worker(make_iterator, result_queue):
+        """Hilo auxiliar: nunca toca Tk, solo deja los resultados en la cola."""
+        try:
+            for index, name, parsed in make_iterator():
+                result_queue.put(('result', index, name, parsed))
+        except Exception as e:
+            result_queue.put(('error', e))
+        result_queue.put(('done',))
+
+    def _poll_loading_queue(self):
+        finished = False
+        try:
+            while True:
+                message = self.load_queue.get_nowait()
+                if message[0] == 'result':
+                    _, index, name, parsed = message
+                    self.load_results[index] = (name, parsed)
+                    if parsed is None:
+                        self.load_failed.append(os.path.basename(name))
+                    self.load_completed += 1
+                elif message[0] == 'error':
+                    print(f"Error durante la carga en paralelo: {message[1]}")
+                elif message[0] == 'done':
+                    finished = True
+        except queue.Empty:
+            pass
+
+        if not finished:
+            if self.load_total is None:
+                self.status_var.set(f"Parseando: {self.load_completed} archivos...")
+            else:
+                self.load_progress.configure(value=self.load_completed)
+                self.status_var.set(f"Parseando: {self.load_completed}/{self.load_total} archivos...")
+            self.root.after(50, self._poll_loading_queue)
+            return
+        self._finish_loading()
+
+    def _on_cancel_loading(self):
+        if self.load_cancel_event is not None:
+            self.load_cancel_event.set()
+            self.load_cancel_button.state(['disabled'])
+            self.status_var.set("Cancelando la carga...")
+
+    def _finish_loading(self):
+        cancelled = self.load_cancel_event.is_set()
+        self.load_progress.stop()
+        self.load_progress_frame.pack_forget()
+        self.load_queue = None
+        self.load_cancel_event = None
+
+        if cancelled:
+            self.load_results = {}
+            self.status_var.set("Carga cancelada.")
+            return
+
+        # Reconstruimos la lista en el orden de la carpeta, no en el de finalización.
         self.loaded_spectra.clear()
-        for filename in files_to_process:
-            full_path = os.path.join(folder_path, filename)
-            self.status_var.set(f"Parseando: {filename}...")
-            self.root.update_idletasks()
-            df = data_parser.parse_spectrum_file(full_path)
-            if df is not None:
-                self.loaded_spectra.append({'filename': filename, 'dataframe': df, 'processed_dataframe': None})
+        n_files = 0
+        for index in sorted(self.load_results):
+            name, parsed = self.load_results[index]
+            if parsed is not None:
+                # En una carpeta basta el nombre; en un archivo comprimido conservamos
+                # la ruta interna para no mezclar archivos homónimos de subcarpetas.
+                filename = os.path.basename(name) if self.load_folder else name
+                # Cada canal de un archivo multicanal se registra como un espectro propio.
+                self.loaded_spectra.add_channels(filename, *parsed)
+                n_files += 1
+        self.load_results = {}
+
+        if self.load_failed:
+            print(f"Aviso: No se pudieron cargar {len(self.load_failed)} archivos: {', '.join(sorted(self.load_failed))}")
 
         if not self.loaded_spectra:
             self.status_var.set("Proceso finalizado. No se pudieron cargar datos válidos.")
             messagebox.showwarning("Sin datos", "No se pudo extraer ningún espectro válido.")
             return
 
-        self.status_var.set(f"¡Éxito! Se cargaron {len(self.loaded_spectra)} espectros.")
+        status = f"¡Éxito! Se cargaron {len(self.loaded_spectra)} espectros de {n_files} archivos."
+        if self.load_failed:
+            status += f" {len(self.load_failed)} archivos no se pudieron leer."
+        if self.loaded_spectra.rows_dropped:
+            status += " " + format_crop_stats(self.loaded_spectra.rows_dropped, self.loaded_spectra.bytes_saved) + "."
+        status += " " + self._memory_report() + "."
+        self.status_var.set(status)
         self.processing_applied = False
+        self.current_processing_steps = None
+        self.current_folder = self.load_folder
+
+        # Fotografiamos la carpeta ya ahora para que la vigilancia detecte
+        # cualquier archivo que llegue después de esta carga.
+        self.folder_watcher = None
+        if self.current_folder:
+            self.folder_watcher = FolderWatcher(self.current_folder)
+            self.folder_watcher.prime(self.load_file_paths)
         self.show_processing_view()
 
     def _populate_spectra_list(self):
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-
-        self.spectra_vars = {}
-        self.ordered_filenames = [spec['filename'] for spec in self.loaded_spectra]
-
-        for filename in self.ordered_filenames:
-            var = tk.BooleanVar(value=True)
-            self.spectra_vars[filename] = var
-            cb = ttk.Checkbutton(self.scrollable_frame, text=filename, variable=var, style='White.TCheckbutton')
-            cb.bind("<Button-1>", lambda e, f=filename: self._on_spectrum_click(e, f))
-            cb.pack(anchor="w", padx=5, pady=2)
-
-        self.scrollable_frame.update_idletasks()
-        self.spectra_list_canvas.config(scrollregion=self.spectra_list_canvas.bbox("all"))
+        self._clear_spectra_list()
+        for filename in self.loaded_spectra.filenames:
+            self._add_spectrum_list_row(filename)
+        self._update_list_count()
+
+    def _clear_spectra_list(self):
+        # Se borran también las filas ocultas por el filtro (no salen en get_children).
+        self.spectra_tree.delete(*[str(i) for i in range(len(self.ordered_filenames))])
+        self.ordered_filenames = []
+        self.spectra_checked = {}
         self.last_clicked_index = None
+        self.list_count_var.set("")
+
+    def _add_spectrum_list_row(self, filename):
+        iid = str(len(self.ordered_filenames))
+        self.ordered_filenames.append(filename)
+        self.spectra_checked[filename] = True
+        self.spectra_tree.insert('', 'end', iid=iid)
+        self._render_spectrum_row(iid)
+        if not self._matches_list_filter(filename):
+            self.spectra_tree.detach(iid)
+
+    def _render_spectrum_row(self, iid):
+        filename = self.ordered_filenames[int(iid)]
+        checked = self.spectra_checked[filename]
+        self.spectra_tree.item(iid, text=f"{'☑' if checked else '☐'} {filename}",
+                               tags=() if checked else ('unchecked',))
+
+    def _update_list_count(self):
+        total = len(self.ordered_filenames)
+        text = f"{sum(self.spectra_checked.values())} de {total} marcados"
+        listed = len(self.spectra_tree.get_children())
+        if listed != total:
+            text += f" ({listed} en la lista)"
+        self.list_count_var.set(text)
+
+    def _matches_list_filter(self, filename):
+        pattern = self.list_filter.get().strip().lower()
+        if not pattern:
+            return True
+        if any(c in pattern for c in '*?['):
+            return fnmatch.fnmatch(filename.lower(), pattern)
+        return pattern in filename.lower()
+
+    def _schedule_list_filter(self):
+        if self.list_filter_job is not None:
+            self.root.after_cancel(self.list_filter_job)
+        self.list_filter_job = self.root.after(LIST_FILTER_DEBOUNCE_MS, self._apply_list_filter)
+
+    def _apply_list_filter(self):
+        """Deja en la lista los espectros cuyo nombre contiene el texto (o encaja con el patrón *, ?)."""
+        self.list_filter_job = None
+        listed = [str(i) for i, filename in enumerate(self.ordered_filenames) if self._matches_list_filter(filename)]
+        # set_children vuelve a colgar esas filas en orden y desengancha las demás.
+        self.spectra_tree.set_children('', *listed)
+        self._update_list_count()
+
+    def _set_listed_checked(self, checked):
+        """Marca o desmarca todos los espectros que muestra la lista (con el filtro aplicado)."""
+        for iid in self.spectra_tree.get_children():
+            self.spectra_checked[self.ordered_filenames[int(iid)]] = checked
+            self._render_spectrum_row(iid)
+        self._update_list_count()
+        self._update_full_plot_visibility()
 
-    def _on_spectrum_click(self, event, filename):
-        current_index = self.ordered_filenames.index(filename)
-
-        def process_click():
-            var = self.spectra_vars[filename]
-            new_state = var.get()
-            is_shift = (event.state & 0x0001) != 0
-            is_ctrl = (event.state & 0x0004) != 0
-
-            if is_shift and self.last_clicked_index is not None:
-                start = min(self.last_clicked_index, current_index)
-                end = max(self.last_clicked_index, current_index)
-                for i in range(start, end + 1):
-                    self.spectra_vars[self.ordered_filenames[i]].set(new_state)
-                self._update_full_plot_visibility()
-            elif is_ctrl:
-                self._update_single_line_visibility(filename)
-            else:
-                self._update_single_line_visibility(filename)
-                self.last_clicked_index = current_index
-        
-        event.widget.after_idle(process_click)
+    def _selected_indices(self):
+        """Índices (en orden de carga) de los espectros marcados en la lista."""
+        return [index for index, filename in enumerate(self.loaded_spectra.filenames)
+                if self.spectra_checked.get(filename, False)]
+
+    def _on_spectrum_click(self, event):
+        iid = self.spectra_tree.identify_row(event.y)
+        if not iid:
+            return "break"
+        filename = self.ordered_filenames[int(iid)]
+        new_state = not self.spectra_checked[filename]
+        is_shift = (event.state & 0x0001) != 0
+        is_ctrl = (event.state & 0x0004) != 0
+
+        # El rango con mayúsculas va sobre la lista tal como se ve (filtrada).
+        listed = self.spectra_tree.get_children()
+        if is_shift and self.last_clicked_index in listed:
+            start, end = sorted((listed.index(self.last_clicked_index), listed.index(iid)))
+            for row in listed[start:end + 1]:
+                self.spectra_checked[self.ordered_filenames[int(row)]] = new_state
+                self._render_spectrum_row(row)
+            self._update_full_plot_visibility()
+        else:
+            self.spectra_checked[filename] = new_state
+            self._render_spectrum_row(iid)
+            self._update_single_line_visibility(filename)
+            if not is_ctrl:
+                self.last_clicked_index = iid
+        self._update_list_count()
+        return "break"
 
     def _update_single_line_visibility(self, filename):
         if not self.plotter: return
-        is_visible = self.spectra_vars[filename].get()
+        is_visible = self.spectra_checked[filename]
         self.plotter.toggle_spectrum_visibility(filename, is_visible)
-        self.plotter.canvas.draw()
+        self.plotter.refresh_visibility()
 
     def _update_full_plot_visibility(self):
         if not self.plotter: return
-        for filename, var in self.spectra_vars.items():
-            self.plotter.toggle_spectrum_visibility(filename, var.get())
+        for filename, is_visible in self.spectra_checked.items():
+            self.plotter.toggle_spectrum_visibility(filename, is_visible)
         self.plotter.redraw_legend_and_canvas()
     
     def _show_processing_options(self, exp_type):
@@ -349,10 +626,23 @@ class MainAppWindow:
             ttk.Label(self.airpls_params_frame, text="Asimetría (p):").grid(row=0, column=2, padx=(15, 5), sticky="w")
             self.airpls_p = tk.DoubleVar(value=0.01)
             ttk.Entry(self.airpls_params_frame, textvariable=self.airpls_p, width=10).grid(row=0, column=3, sticky="ew", padx=(0,10))
+
+            # De gruesa a fina: mucho más rápido en espectros de cientos de miles de puntos.
+            self.airpls_multires = tk.BooleanVar(value=False)
+            ttk.Checkbutton(self.airpls_params_frame, text="Multirresolución (espectros muy largos)",
+                            variable=self.airpls_multires).grid(row=1, column=0, columnspan=4, padx=(10, 0), sticky="w")
+            ttk.Button(self.airpls_params_frame, text="Barrido de λ...",
+                       command=self._open_parameter_sweep).grid(row=2, column=0, columnspan=2, padx=(10, 0), pady=(5, 0), sticky="w")
             # --- FIN DE TU SOLUCIÓN ---
             
             self.airpls_params_frame.grid(row=3, column=1, sticky="ew", pady=2)
 
+        ttk.Checkbutton(options_frame, text="Vista previa en vivo", variable=self.preview_enabled,
+                        command=self._on_toggle_preview).grid(row=5, column=0, columnspan=2, sticky="w", pady=(10, 0))
+        # Cualquier cambio de parámetros relanza la vista previa (con retardo).
+        for var in self._processing_option_vars():
+            var.trace_add('write', lambda *_: self._schedule_preview())
+
         self._update_options_visibility()
 
     def _update_options_visibility(self):
@@ -371,58 +661,327 @@ class MainAppWindow:
             if is_uvvis and self.baseline_method.get() == 'airpls': self.airpls_params_frame.grid()
             else: self.airpls_params_frame.grid_remove()
         
-    def _on_apply_processing(self):
-        if not self.loaded_spectra or self.current_exp_type is None:
-            messagebox.showwarning("Sin Selección", "Por favor, carga datos y selecciona un tipo de experimento primero.")
-            return
-
-        processing_steps = {}
+    def _processing_option_vars(self):
+        """Variables del panel de opciones que definen la cadena de procesamiento."""
+        if self.current_exp_type == 'lumi':
+            return [self.lumi_normalize, self.smoothing_method, self.ma_window, self.sg_window, self.sg_order]
+        if self.current_exp_type == 'uvvis':
+            return [self.baseline_method, self.airpls_lam, self.airpls_p, self.airpls_multires]
+        return []
+
+    def _build_pipeline(self, quiet=False):
+        """
+        Construye la cadena de procesamiento a partir del panel de opciones.
+        Con quiet=True no se muestra ningún diálogo si algo no es válido
+        (p. ej. mientras se está escribiendo un número).
+
+        Returns:
+            ProcessingPipeline: La cadena (vacía si no hay nada seleccionado),
+                                o None si algún parámetro no es válido.
+        """
+        steps = []
         try:
             if self.current_exp_type == 'lumi':
-                processing_steps['normalize'] = self.lumi_normalize.get()
+                if self.lumi_normalize.get():
+                    steps.append('normalize')
                 method = self.smoothing_method.get()
-                if method != 'none':
-                    processing_steps['method'] = method
-                    if method == 'moving_average':
-                        processing_steps['params'] = {'window': self.ma_window.get()}
-                    elif method == 'savgol':
-                        if self.sg_window.get() <= self.sg_order.get():
-                            messagebox.showwarning("Parámetro Inválido", "En Savitzky-Golay, la 'Ventana' debe ser mayor que el 'Orden Pol.'")
-                            return
-                        processing_steps['params'] = {'window': self.sg_window.get(), 'order': self.sg_order.get()}
+                if method == 'moving_average':
+                    steps.append(('moving_average', {'window': self.ma_window.get()}))
+                elif method == 'savgol':
+                    steps.append(('savgol', {'window': self.sg_window.get(), 'order': self.sg_order.get()}))
 
             elif self.current_exp_type == 'uvvis':
                 method = self.baseline_method.get()
-                if method != 'none':
-                    processing_steps['method'] = method
-                    if method == 'airpls':
-                        processing_steps['params'] = {'lam': self.airpls_lam.get(), 'p': self.airpls_p.get()}
-        
+                if method == 'min':
+                    steps.append('min')
+                elif method == 'airpls':
+                    name = 'airpls_multires' if self.airpls_multires.get() else 'airpls'
+                    steps.append((name, {'lam': self.airpls_lam.get(), 'p': self.airpls_p.get()}))
+
+            return data_processor.ProcessingPipeline(steps)
+
         except (ValueError, tk.TclError) as e:
-            messagebox.showerror("Error de Parámetro", f"Valor de parámetro inválido: {e}")
+            if not quiet:
+                messagebox.showerror("Error de Parámetro", f"Valor de parámetro inválido: {e}")
+            return None
+
+    def _on_toggle_preview(self):
+        if self.preview_enabled.get():
+            self._schedule_preview()
             return
-        
-        if not any(processing_steps.values()):
+        self._cancel_preview()
+        if self.loaded_spectra and self.plotter:
+            # Volvemos a lo que había antes de la vista previa.
+            self.plotter.plot_spectra(self.loaded_spectra, use_processed=self.plotter.use_processed, roi=self.roi)
+            self._update_full_plot_visibility()
+        self.status_var.set("Vista previa desactivada.")
+
+    def _cancel_preview(self):
+        """Descarta la vista previa pendiente o en curso."""
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+            self.preview_job = None
+        if self.preview_cancel_event is not None:
+            self.preview_cancel_event.set()
+            self.preview_cancel_event = None
+        # Los resultados que aún lleguen de un trabajo anterior se ignoran.
+        self.preview_generation += 1
+        self.preview_queue = None
+
+    def _schedule_preview(self):
+        if not self.preview_enabled.get() or not self.loaded_spectra:
+            return
+        self._cancel_preview()
+        self.preview_job = self.root.after(PREVIEW_DEBOUNCE_MS, self._start_preview)
+
+    def _start_preview(self):
+        self.preview_job = None
+        pipeline = self._build_pipeline(quiet=True)
+        if pipeline is None:
+            self.status_var.set("Vista previa: parámetros no válidos.")
+            return
+        indices = self._selected_indices()
+        if not pipeline or not indices:
+            self.plotter.plot_spectra(self.loaded_spectra, use_processed=False, roi=self.roi)
+            self._update_full_plot_visibility()
+            return
+
+        spectra = self.loaded_spectra
+        pipeline_key = (pipeline.key(), self.roi)
+        updates, pending = [], []
+        for index in indices:
+            cached = self.result_cache.get((spectra.content_key(index), pipeline_key))
+            if cached is not None:
+                updates.append((spectra.filenames[index], spectra.wavelength(index), cached))
+            else:
+                pending.append(index)
+        if updates:
+            self.plotter.preview_spectra(updates)
+        if not pending:
+            self.status_var.set(f"Vista previa: {pipeline.describe()}.")
+            return
+
+        # El hilo trabaja sobre copias: la vigilancia de carpeta puede sustituir datos mientras tanto.
+        shared_wavelength = spectra.shared_wavelength
+        jobs = [(index, spectra.filenames[index], spectra.content_key(index), spectra.wavelength(index), spectra.raw(index).copy())
+                for index in pending]
+        warm_start = self.warm_start_cache.prepare([content_key for _, _, content_key, _, _ in jobs], pipeline, self.roi)
+        generation = self.preview_generation
+        self.preview_cancel_event = threading.Event()
+        self.preview_queue = queue.Queue()
+        self.preview_warm_starts = []
+        worker = threading.Thread(
+            target=self._preview_worker,
+            args=(jobs, shared_wavelength, pipeline, self.roi, warm_start, self.preview_cancel_event, generation,
+                  self.preview_queue),
+            daemon=True
+        )
+        worker.start()
+        self.status_var.set(f"Vista previa: calculando {len(pending)} espectros...")
+        self.root.after(50, self._poll_preview_queue, generation, pipeline_key, pipeline.describe())
+
+    @staticmethod
+    def _preview_worker(jobs, shared_wavelength, pipeline, roi, warm_start, cancel_event, generation, result_queue):
+        """Hilo auxiliar de la vista previa: procesa por bloques y se detiene si se cancela."""
+        try:
+            for start in range(0, len(jobs), PREVIEW_CHUNK_ROWS):
+                if cancel_event.is_set():
+                    return
+                chunk = jobs[start:start + PREVIEW_CHUNK_ROWS]
+                if shared_wavelength is not None:
+                    stack = np.array([raw for *_, raw in chunk])
+                    runs = [warm_start.rows(start, start + len(chunk))]
+                    processed = data_processor.process_stack(stack, shared_wavelength, pipeline, roi, 1, runs[0])
+                else:
+                    runs = [warm_start.rows(start + k, start + k + 1) for k in range(len(chunk))]
+                    processed = [data_processor.process_stack(raw, wavelength, pipeline, roi, 1, run)[0]
+                                 for (_, _, _, wavelength, raw), run in zip(chunk, runs)]
+                result_queue.put((generation, chunk, processed, runs))
+        except Exception as e:
+            print(f"Error en la vista previa: {e}")
+        result_queue.put((generation, None, None, None))
+
+    def _poll_preview_queue(self, generation, pipeline_key, description):
+        if generation != self.preview_generation or self.preview_queue is None:
+            return  # Trabajo obsoleto: los parámetros han cambiado o se ha cancelado.
+        finished = False
+        updates = []
+        try:
+            while True:
+                message_generation, chunk, processed, runs = self.preview_queue.get_nowait()
+                if message_generation != generation:
+                    continue
+                if chunk is None:
+                    finished = True
+                    break
+                for run in runs:
+                    self.warm_start_cache.save(run)
+                self.preview_warm_starts.extend(runs)
+                for (_, filename, content_key, wavelength, _), result in zip(chunk, processed):
+                    self.result_cache.put((content_key, pipeline_key), result)
+                    updates.append((filename, wavelength, result))
+        except queue.Empty:
+            pass
+
+        if updates:
+            self.plotter.preview_spectra(updates)
+        if finished:
+            self.preview_queue = None
+            self.preview_cancel_event = None
+            report = data_processor.describe_iterations(self.preview_warm_starts)
+            report = f" {report}." if report else ""
+            self.status_var.set(f"Vista previa: {description}.{report} Pulsa «Aplicar Cambios» para conservarla.")
+        else:
+            self.root.after(50, self._poll_preview_queue, generation, pipeline_key, description)
+
+    def _open_parameter_sweep(self):
+        """Ventana para probar varios valores de lam sobre los espectros seleccionados."""
+        if not self.loaded_spectra:
+            self.status_var.set("Carga espectros antes de buscar los parámetros de airPLS.")
+            return
+        if self.sweep_window is not None and self.sweep_window.winfo_exists():
+            self.sweep_window.lift()
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("Barrido de parámetros de airPLS")
+        window.transient(self.root)
+        window.columnconfigure(1, weight=1)
+        window.rowconfigure(2, weight=1)
+        self.sweep_window = window
+
+        lams_var = tk.StringVar(value=" ".join(f"{v:g}" for v in parameter_sweep.DEFAULT_LAMS))
+        ttk.Label(window, text="Valores de λ:").grid(row=0, column=0, padx=10, pady=(10, 2), sticky="w")
+        ttk.Entry(window, textvariable=lams_var, width=50).grid(row=0, column=1, columnspan=2, padx=(0, 10), pady=(10, 2), sticky="ew")
+
+        status_var = tk.StringVar(value="Se usan los espectros seleccionados (o todos si no hay selección). Menor puntuación es mejor.")
+        ttk.Label(window, textvariable=status_var, wraplength=480).grid(row=1, column=0, columnspan=3, padx=10, pady=5, sticky="w")
+
+        columns = ('lam', 'score', 'overshoot', 'roughness')
+        table = ttk.Treeview(window, columns=columns, show='headings', height=12, selectmode='browse')
+        for column, heading in zip(columns, ("λ", "Puntuación", "Desbordamiento", "Rugosidad")):
+            table.heading(column, text=heading)
+            table.column(column, width=95, anchor='e')
+        table.grid(row=2, column=0, columnspan=3, padx=10, sticky="nsew")
+
+        state = {'cancel_event': None, 'points': []}
+
+        def run():
+            try:
+                lams = parameter_sweep.parse_values(lams_var.get())
+            except ValueError as e:
+                messagebox.showwarning("Barrido de parámetros", f"Valor inválido: {e}", parent=window)
+                return
+            if state['cancel_event'] is not None:
+                state['cancel_event'].set()
+            # Copias hechas en el hilo principal: el hilo no toca la colección.
+            indices = self._selected_indices() or range(len(self.loaded_spectra))
+            spectra = parameter_sweep.collection_sweep_inputs(self.loaded_spectra, indices)
+            cancel_event = threading.Event()
+            result_queue = queue.Queue()
+            state['cancel_event'] = cancel_event
+            status_var.set(f"Calculando {len(lams)} valores de λ sobre {len(spectra)} espectros...")
+            threading.Thread(
+                target=self._sweep_worker,
+                args=(spectra, lams, self.roi, self.max_workers, self.sweep_cache, cancel_event, result_queue),
+                daemon=True
+            ).start()
+            window.after(100, poll, cancel_event, result_queue)
+
+        def poll(cancel_event, result_queue):
+            if cancel_event.is_set() or not window.winfo_exists():
+                return
+            try:
+                result = result_queue.get_nowait()
+            except queue.Empty:
+                window.after(100, poll, cancel_event, result_queue)
+                return
+            state['cancel_event'] = None
+            if isinstance(result, Exception):
+                status_var.set(f"Error en el barrido: {result}")
+                return
+            points, n_computed = result
+            state['points'] = points
+            table.delete(*table.get_children())
+            for i, point in enumerate(points):
+                table.insert('', 'end', iid=str(i), values=(f"{point.lam:g}", f"{point.score:.4g}",
+                                                            f"{point.overshoot:.3e}", f"{point.roughness:.3e}"))
+            if points:
+                table.selection_set('0')
+                status_var.set(f"Mejor: λ={points[0].lam:g} "
+                               f"({n_computed} cálculos nuevos; el resto, de la caché).")
+            else:
+                status_var.set("Ningún espectro tiene puntos suficientes en la región de interés.")
+
+        def use_selected():
+            selection = table.selection()
+            if not selection:
+                return
+            point = state['points'][int(selection[0])]
+            self.airpls_lam.set(point.lam)
+            self.status_var.set(f"Parámetros de airPLS: λ={point.lam:g}.")
+
+        def close():
+            if state['cancel_event'] is not None:
+                state['cancel_event'].set()
+            self.sweep_window = None
+            window.destroy()
+
+        buttons = ttk.Frame(window)
+        buttons.grid(row=3, column=0, columnspan=3, padx=10, pady=10, sticky="e")
+        ttk.Button(buttons, text="Calcular", command=run).pack(side="left", padx=(0, 5))
+        ttk.Button(buttons, text="Usar seleccionado", command=use_selected).pack(side="left", padx=(0, 5))
+        ttk.Button(buttons, text="Cerrar", command=close).pack(side="left")
+        table.bind('<Double-1>', lambda _: use_selected())
+        window.protocol("WM_DELETE_WINDOW", close)
+
+    @staticmethod
+    def _sweep_worker(spectra, lams, roi, max_workers, cache, cancel_event, result_queue):
+        """Hilo auxiliar del barrido de parámetros."""
+        try:
+            result = parameter_sweep.sweep_airpls(spectra, lams, roi=roi, max_workers=max_workers, cache=cache,
+                                                  cancel_event=cancel_event)
+        except Exception as e:
+            result = e
+        if result is not None:
+            result_queue.put(result)
+
+    def _on_apply_processing(self):
+        if not self.loaded_spectra or self.current_exp_type is None:
+            messagebox.showwarning("Sin Selección", "Por favor, carga datos y selecciona un tipo de experimento primero.")
+            return
+        self._cancel_preview()
+
+        pipeline = self._build_pipeline()
+        if pipeline is None:
+            return
+
+        if not pipeline:
             self._on_reset_processing()
             self.status_var.set("Ningún procesamiento seleccionado.")
             return
 
-        selected_filenames = {filename for filename, var in self.spectra_vars.items() if var.get()}
-        if not selected_filenames:
+        selected_indices = self._selected_indices()
+        if not selected_indices:
             messagebox.showinfo("Sin Selección", "Ningún espectro está seleccionado para procesar.")
             return
 
-        self.status_var.set(f"Aplicando procesamiento a {len(selected_filenames)} espectros...")
+        self.status_var.set(f"Aplicando procesamiento a {len(selected_indices)} espectros...")
         self.root.update_idletasks()
         
-        for spectrum in self.loaded_spectra:
-            if spectrum['filename'] in selected_filenames:
-                spectrum['processed_dataframe'] = data_processor.process_spectrum(spectrum['dataframe'], processing_steps)
-                self.root.update_idletasks()
+        hits = data_processor.process_collection(self.loaded_spectra, pipeline, selected_indices, roi=self.roi,
+                                                 max_workers=self.max_workers, cache=self.result_cache,
+                                                 warm_start=self.warm_start_cache)
+        self.current_processing_steps = pipeline
 
-        self.plotter.plot_spectra(self.loaded_spectra, use_processed=True)
+        self.plotter.plot_spectra(self.loaded_spectra, use_processed=True, roi=self.roi)
         self._update_full_plot_visibility()
-        self.status_var.set("Procesamiento aplicado con éxito.")
+        status = f"Procesamiento aplicado con éxito: {pipeline.describe()}."
+        if hits:
+            status += f" {hits} de {len(selected_indices)} espectros ya estaban calculados."
+        if hits < len(selected_indices) and self.warm_start_cache.last_report:
+            status += f" {self.warm_start_cache.last_report}."
+        self.status_var.set(status)
         self.processing_applied = True
 
     def _on_export(self):
@@ -430,10 +989,7 @@ class MainAppWindow:
             messagebox.showwarning("Sin Datos", "No hay datos cargados para exportar.")
             return False
         
-        spectra_to_export = []
-        for spectrum in self.loaded_spectra:
-            if self.spectra_vars.get(spectrum['filename']) and self.spectra_vars[spectrum['filename']].get():
-                spectra_to_export.append(spectrum)
+        spectra_to_export = self._selected_indices()
 
         if not spectra_to_export:
             messagebox.showwarning("Sin Selección", "No has seleccionado ningún espectro para exportar.")
@@ -457,11 +1013,11 @@ class MainAppWindow:
         try:
             self.status_var.set(f"Exportando {len(spectra_to_export)} espectros a Excel...")
             self.root.update_idletasks()
-            data_exporter.export_to_excel(spectra_to_export, excel_path)
+            data_exporter.export_to_excel(self.loaded_spectra, excel_path, spectra_to_export, roi=self.roi)
 
             self.status_var.set(f"Generando archivo de datos para SciDAVis...")
             self.root.update_idletasks()
-            data_exporter.export_to_scidavis(spectra_to_export, scidavis_tsv_path)
+            data_exporter.export_to_scidavis(self.loaded_spectra, scidavis_tsv_path, spectra_to_export, roi=self.roi)
 
             self.status_var.set("¡Exportación completada con éxito!")
             messagebox.showinfo("Éxito", 
@@ -477,6 +1033,75 @@ class MainAppWindow:
             self.show_error(e)
             return False
 
+    def _on_export_images(self, fmt):
+        """
+        Guarda una imagen por espectro seleccionado, tal como se ve en la
+        gráfica (crudo o procesado, con la ROI), y opcionalmente una por
+        archivo multicanal con sus canales superpuestos. Se dibujan en
+        procesos aparte sin bloquear la interfaz.
+        """
+        if not self.loaded_spectra:
+            messagebox.showwarning("Sin Datos", "No hay datos cargados para exportar.")
+            return
+        indices = self._selected_indices()
+        if not indices:
+            messagebox.showwarning("Sin Selección", "No has seleccionado ningún espectro para exportar.")
+            return
+        if self.image_export_cancel_event is not None:
+            self.status_var.set("Ya se están guardando imágenes; espera a que terminen.")
+            return
+        output_dir = filedialog.askdirectory(title=f"Carpeta para las imágenes {fmt.upper()}")
+        if not output_dir:
+            self.status_var.set("Exportación cancelada.")
+            return
+
+        groups = figure_export.group_indices(self.loaded_spectra.filenames, indices)
+        if groups and not messagebox.askyesno(
+                "Imágenes", f"Hay {len(groups)} archivos con varios canales.\n"
+                            "¿Guardar también una imagen de cada uno con sus canales superpuestos?"):
+            groups = None
+        # Copias hechas en el hilo principal: el hilo no toca la colección.
+        use_processed = self.plotter.use_processed
+        jobs = figure_export.image_jobs(self.loaded_spectra, output_dir, fmt, indices, use_processed, self.roi, groups)
+        cancel_event = threading.Event()
+        result_queue = queue.Queue()
+        self.image_export_cancel_event = cancel_event
+        self.status_var.set(f"Guardando {len(jobs)} imágenes {fmt.upper()} con {self.max_workers} procesos...")
+        threading.Thread(
+            target=self._image_export_worker,
+            args=(jobs, fmt, use_processed, self.max_workers, cancel_event, result_queue),
+            daemon=True
+        ).start()
+        self.root.after(100, self._poll_image_export, output_dir, result_queue)
+
+    @staticmethod
+    def _image_export_worker(jobs, fmt, use_processed, max_workers, cancel_event, result_queue):
+        """Hilo auxiliar de las imágenes: nunca toca Tk, solo deja el progreso en la cola."""
+        try:
+            result = figure_export.render_image_jobs(
+                jobs, fmt, use_processed, max_workers=max_workers, cancel_event=cancel_event,
+                progress_callback=lambda done, total: result_queue.put(('progress', done, total)))
+            result_queue.put(('done', result))
+        except Exception as e:
+            result_queue.put(('error', e))
+
+    def _poll_image_export(self, output_dir, result_queue):
+        try:
+            while True:
+                message = result_queue.get_nowait()
+                if message[0] == 'progress':
+                    self.status_var.set(f"Guardando imágenes: {message[1]}/{message[2]}...")
+                    continue
+                self.image_export_cancel_event = None
+                if message[0] == 'error':
+                    self.status_var.set(f"Error al guardar las imágenes: {message[1]}")
+                elif message[1] is not None:
+                    self.status_var.set(f"Guardadas {len(message[1])} imágenes en {output_dir}.")
+                return
+        except queue.Empty:
+            pass
+        self.root.after(100, self._poll_image_export, output_dir, result_queue)
+
     def show_error(self, *args):
         err = traceback.format_exc()
         messagebox.showerror("Error Inesperado", "Ha ocurrido un error inesperado...\n\n" + str(err))
@@ -488,26 +1113,175 @@ class MainAppWindow:
         file_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Archivo", menu=file_menu)
         file_menu.add_command(label="Cargar Nueva Carpeta", command=self._return_to_load_view)
+        file_menu.add_command(label="Cargar Archivo Comprimido...", command=self._on_open_archive)
+        self.watch_enabled = tk.BooleanVar(value=False)
+        file_menu.add_checkbutton(label="Vigilar carpeta (archivos nuevos)", variable=self.watch_enabled, command=self._on_toggle_watch)
+        file_menu.add_separator()
+        file_menu.add_command(label="Guardar imágenes PNG...", command=lambda: self._on_export_images('png'))
+        file_menu.add_command(label="Guardar imágenes SVG...", command=lambda: self._on_export_images('svg'))
         file_menu.add_separator()
         file_menu.add_command(label="Salir", command=self.root.quit)
 
+        options_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Opciones", menu=options_menu)
+        options_menu.add_command(label="Procesos de carga...", command=self._ask_max_workers)
+        options_menu.add_command(label="Región de interés...", command=self._ask_roi)
+        options_menu.add_command(label="Remuestrear a un eje común...", command=self._ask_resample)
+        self.reduced_precision = tk.BooleanVar(value=self.loaded_spectra.dtype == np.float32)
+        options_menu.add_checkbutton(label="Precisión reducida (float32, mitad de memoria)", variable=self.reduced_precision,
+                                     command=self._on_toggle_precision)
+        options_menu.add_command(label="Uso de memoria", command=lambda: self.status_var.set(self._memory_report() + "."))
+        options_menu.add_command(label="Tiempos de dibujo", command=self._show_frame_times)
+        self.use_parse_cache = tk.BooleanVar(value=self.parse_cache.enabled)
+        options_menu.add_checkbutton(label="Usar caché de parseo", variable=self.use_parse_cache, command=self._on_toggle_parse_cache)
+        options_menu.add_command(label="Vaciar caché de parseo", command=self._on_clear_parse_cache)
+        options_menu.add_command(label="Vaciar resultados guardados", command=self._on_clear_result_cache)
+
         help_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Ayuda", menu=help_menu)
         help_menu.add_command(label="Acerca de...", command=self._show_about_dialog)
 
+    def _on_open_archive(self):
+        if self.load_queue is not None:
+            self.status_var.set("Ya hay una carga en curso. Espera o cancélala primero."); return
+        if self.processing_applied:
+            if not messagebox.askokcancel("Confirmar", "Hay cambios sin exportar. ¿Seguro que quieres descartarlos y cargar otro archivo?"):
+                return
+        path = filedialog.askopenfilename(
+            title="Selecciona el archivo comprimido con los espectros",
+            filetypes=[("Archivos comprimidos", "*.zip *.tar *.tar.gz *.tgz *.tar.bz2 *.tbz2 *.tar.xz *.txz"),
+                       ("Todos los archivos", "*.*")]
+        )
+        if not path:
+            return
+        self.show_load_view()
+        self.process_archive(path)
+
+    def _ask_max_workers(self):
+        value = simpledialog.askinteger(
+            "Procesos de carga",
+            "Número de procesos para parsear archivos en paralelo:",
+            initialvalue=self.max_workers, minvalue=1, maxvalue=max(64, os.cpu_count() or 1),
+            parent=self.root
+        )
+        if value:
+            self.max_workers = value
+            self.status_var.set(f"La carga usará {value} procesos.")
+
+    def _ask_roi(self):
+        text = simpledialog.askstring(
+            "Región de interés",
+            "Rango de longitudes de onda en nm (p. ej. 300-800).\nDéjalo vacío para usar el rango completo:",
+            initialvalue=format_roi(self.roi), parent=self.root
+        )
+        if text is None:
+            return
+        try:
+            new_roi = parse_roi_text(text)
+        except ValueError as e:
+            messagebox.showwarning("Región de interés", f"Valor inválido: {e}")
+            return
+
+        previous_roi = self.roi
+        self.roi = new_roi
+        if new_roi is None:
+            self.status_var.set("Región de interés desactivada: se usará el rango completo.")
+        else:
+            self.status_var.set(f"Región de interés: {format_roi(new_roi)} nm.")
+
+        if self.loaded_spectra and self.plotter:
+            self.plotter.plot_spectra(self.loaded_spectra, use_processed=self.plotter.use_processed, roi=self.roi)
+            self._update_full_plot_visibility()
+            # Lo que se descartó al parsear ya no está en memoria: ampliar el rango exige recargar.
+            widened = previous_roi is not None and (new_roi is None or new_roi[0] < previous_roi[0] or new_roi[1] > previous_roi[1])
+            if widened:
+                self.status_var.set(self.status_var.get() + " Vuelve a cargar la carpeta para recuperar los puntos de fuera de la ROI anterior.")
+
+    def _ask_resample(self):
+        if not self.loaded_spectra:
+            self.status_var.set("Carga espectros antes de remuestrearlos.")
+            return
+        text = simpledialog.askstring(
+            "Eje común",
+            "Modo: union (rango de todos) o intersection (solo el tramo común),\n"
+            "y opcionalmente un paso en nm. P. ej.: «intersection 0.5»:",
+            initialvalue="union", parent=self.root
+        )
+        if text is None:
+            return
+        parts = text.split()
+        try:
+            if not parts or len(parts) > 2:
+                raise ValueError("Escribe el modo y, si quieres, el paso.")
+            step = float(parts[1].replace(',', '.')) if len(parts) == 2 else None
+            aligned = resampling.align_collection(self.loaded_spectra, parts[0].lower(), step, self.roi)
+        except ValueError as e:
+            messagebox.showwarning("Eje común", f"Valor inválido: {e}")
+            return
+
+        # La colección nueva solo tiene datos crudos: el procesamiento se vuelve a aplicar aparte.
+        self._cancel_preview()
+        self.loaded_spectra = aligned
+        self.current_processing_steps = None
+        self.plotter.plot_spectra(self.loaded_spectra, use_processed=False, roi=self.roi)
+        self._update_full_plot_visibility()
+        self.status_var.set(f"{len(aligned)} espectros remuestreados a un eje común de "
+                            f"{len(aligned.shared_wavelength)} puntos.")
+
+    def _memory_report(self):
+        return precision.memory_report(self.loaded_spectra, self.result_cache, self.warm_start_cache)
+
+    def _show_frame_times(self):
+        if not self.plotter:
+            self.status_var.set("Todavía no hay ninguna gráfica.")
+            return
+        self.status_var.set(self.plotter.frame_time_report() + ".")
+
+    def _on_toggle_precision(self):
+        dtype = np.dtype(np.float32 if self.reduced_precision.get() else np.float64)
+        self._cancel_preview()
+        self.loaded_spectra.set_dtype(dtype)
+        self.parse_cache.dtype = dtype
+        # Las huellas de los espectros cambian con la precisión: lo guardado ya no se reutilizaría.
+        self.result_cache.clear()
+        self.warm_start_cache.clear()
+        self.sweep_cache.clear()
+        self.result_cache.dtype = dtype
+        self.warm_start_cache.dtype = dtype
+        if self.loaded_spectra and self.plotter:
+            self.plotter.plot_spectra(self.loaded_spectra, use_processed=self.plotter.use_processed, roi=self.roi)
+            self._update_full_plot_visibility()
+        self.status_var.set(f"Precisión de almacenamiento: {dtype.name}. {self._memory_report()}.")
+
+    def _on_toggle_parse_cache(self):
+        self.parse_cache.enabled = self.use_parse_cache.get()
+        estado = "activada" if self.parse_cache.enabled else "desactivada"
+        self.status_var.set(f"Caché de parseo {estado}.")
+
+    def _on_clear_parse_cache(self):
+        self.parse_cache.clear()
+        self.status_var.set("Caché de parseo vaciada.")
+
+    def _on_clear_result_cache(self):
+        self.result_cache.clear()
+        self.warm_start_cache.clear()
+        self.sweep_cache.clear()
+        self.status_var.set("Resultados de procesamiento guardados eliminados.")
+
     def _return_to_load_view(self):
         if self.processing_applied:
             if not messagebox.askokcancel("Confirmar", "Hay cambios sin exportar. ¿Seguro que quieres descartarlos y cargar una nueva carpeta?"):
                 return
 
+        self._stop_watching()
+        self._cancel_preview()
+        self.folder_watcher = None
+        self.current_processing_steps = None
         self.loaded_spectra.clear()
         if self.plotter:
-            self.plotter.ax.clear()
-            self.plotter.ax.grid(True, linestyle='--', alpha=0.6)
-            self.plotter.canvas.draw()
-        if hasattr(self, 'scrollable_frame'):
-            for widget in self.scrollable_frame.winfo_children():
-                widget.destroy()
+            self.plotter.clear()
+        if hasattr(self, 'spectra_tree'):
+            self._clear_spectra_list()
         if hasattr(self, 'options_container'):
             for widget in self.options_container.winfo_children():
                 widget.destroy()
@@ -519,6 +1293,93 @@ class MainAppWindow:
         
         self.root.after(100, lambda: self.on_drop_zone_click(None))
 
+    def _on_toggle_watch(self):
+        if not self.watch_enabled.get():
+            self._stop_watching()
+            self.status_var.set("Vigilancia de carpeta desactivada.")
+            return
+        if self.folder_watcher is None:
+            self.watch_enabled.set(False)
+            self.status_var.set("Carga una carpeta antes de activar la vigilancia.")
+            return
+        self.watch_job = self.root.after(WATCH_INTERVAL_MS, self._watch_tick)
+        self.status_var.set(f"Vigilando {os.path.basename(self.current_folder)} en busca de archivos nuevos...")
+
+    def _stop_watching(self):
+        if self.watch_job is not None:
+            self.root.after_cancel(self.watch_job)
+            self.watch_job = None
+        self.watch_queue = None
+        self.watch_enabled.set(False)
+
+    def _watch_tick(self):
+        self.watch_job = None
+        if self.folder_watcher is None:
+            return
+
+        if self.watch_queue is None:
+            new_paths, modified_paths = self.folder_watcher.poll()
+            changed_paths = new_paths + modified_paths
+            if changed_paths:
+                self.status_var.set(f"Vigilancia: parseando {len(changed_paths)} archivos nuevos o modificados...")
+                self.watch_queue = queue.Queue()
+                worker = threading.Thread(
+                    target=self._watch_worker,
+                    args=(changed_paths, self.max_workers, self.watch_queue, self.parse_cache, self.roi),
+                    daemon=True
+                )
+                worker.start()
+        else:
+            try:
+                loaded, failed = self.watch_queue.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                self.watch_queue = None
+                self._ingest_watched_files(loaded, failed)
+
+        delay = 100 if self.watch_queue is not None else WATCH_INTERVAL_MS
+        self.watch_job = self.root.after(delay, self._watch_tick)
+
+    @staticmethod
+    def _watch_worker(file_paths, max_workers, result_queue, cache, roi):
+        try:
+            result_queue.put(data_loader.load_files(file_paths, min(max_workers, len(file_paths)), cache=cache, roi=roi,
+                                                    dtype=cache.dtype))
+        except Exception as e:
+            print(f"Error al parsear archivos de la carpeta vigilada: {e}")
+            result_queue.put(([], list(file_paths)))
+
+    def _ingest_watched_files(self, loaded, failed):
+        """Añade o actualiza solo los espectros que han cambiado, sin redibujar el resto."""
+        changed_indices = []
+        added = 0
+        for file_path, parsed in loaded:
+            for index, is_new in self.loaded_spectra.add_channels(os.path.basename(file_path), *parsed):
+                if is_new:
+                    self._add_spectrum_list_row(self.loaded_spectra.filenames[index])
+                    added += 1
+                changed_indices.append(index)
+
+        if changed_indices and self.current_processing_steps:
+            data_processor.process_collection(self.loaded_spectra, self.current_processing_steps, changed_indices, roi=self.roi,
+                                              max_workers=self.max_workers, cache=self.result_cache,
+                                              warm_start=self.warm_start_cache)
+
+        if changed_indices:
+            use_processed = self.plotter.use_processed
+            self.plotter.update_spectra([
+                (self.loaded_spectra.filenames[i], self.loaded_spectra.wavelength(i),
+                 self.loaded_spectra.intensity(i, use_processed))
+                for i in changed_indices
+            ])
+            self._update_list_count()
+
+        status = f"Vigilancia: {added} espectros nuevos, {len(changed_indices) - added} actualizados."
+        if failed:
+            status += f" {len(failed)} archivos no se pudieron leer."
+        self.status_var.set(status)
+
     def _show_about_dialog(self):
         messagebox.showinfo(
             "Acerca de Spectra Converter",
@@ -526,15 +1387,22 @@ class MainAppWindow:
         )
 
     def _on_reset_processing(self):
-        for spec in self.loaded_spectra:
-            spec['processed_dataframe'] = None
+        self._cancel_preview()
+        self.preview_enabled.set(False)
+        self.loaded_spectra.clear_processed()
+        self.current_processing_steps = None
         
-        self.plotter.plot_spectra(self.loaded_spectra, use_processed=False)
+        self.plotter.plot_spectra(self.loaded_spectra, use_processed=False, roi=self.roi)
         self._update_full_plot_visibility()
         self.status_var.set("Procesamiento restablecido a los datos originales.")
         self.processing_applied = False
 
     def _on_closing(self):
+        if self.load_cancel_event is not None:
+            self.load_cancel_event.set()
+        if self.image_export_cancel_event is not None:
+            self.image_export_cancel_event.set()
+
         if not self.processing_applied:
             self.root.destroy()
             return
@@ -0,0 +1,50 @@
+# spectraconverter_v4/tests/test_ui_smoke.py
+#
+# Prueba de humo de la interfaz: construir MainAppWindow no debe fallar.
+# Sin pantalla (o sin tkinterdnd2) se construye sobre tkinter simulado, que
+# basta para detectar errores de orden en el constructor (atributos usados
+# antes de crearse); con pantalla, además, sobre una ventana Tk de verdad.
+
+import importlib
+import sys
+import types
+import unittest
+from unittest import mock
+
+
+def _import_ui():
+    """Importa src.ui aunque falte tkinterdnd2 (solo se usa su constante DND_FILES)."""
+    try:
+        importlib.import_module('tkinterdnd2')
+    except ImportError:
+        sys.modules['tkinterdnd2'] = types.SimpleNamespace(DND_FILES='DND_Files')
+    return importlib.import_module('src.ui')
+
+
+class MainAppWindowSmokeTest(unittest.TestCase):
+
+    def test_builds_with_simulated_tk(self):
+        ui = _import_ui()
+        with mock.patch.object(ui, 'tk'), mock.patch.object(ui, 'ttk'), \
+                mock.patch.object(ui.data_plotter, 'SpectraPlotter'):
+            window = ui.MainAppWindow(mock.MagicMock())
+        self.assertEqual(len(window.loaded_spectra), 0)
+        self.assertIsNotNone(window.plotter)
+
+    def test_builds_with_real_tk(self):
+        try:
+            from tkinterdnd2 import TkinterDnD
+            root = TkinterDnD.Tk()
+        except Exception as e:
+            self.skipTest(f"Sin pantalla o sin tkinterdnd2: {e}")
+        try:
+            root.withdraw()
+            window = _import_ui().MainAppWindow(root)
+            root.update_idletasks()
+            self.assertEqual(len(window.loaded_spectra), 0)
+        finally:
+            root.destroy()
+
+
+if __name__ == '__main__':
+    unittest.main()